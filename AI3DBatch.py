@@ -0,0 +1,295 @@
+# AI3DBatch.py
+"""
+Headless batch generation for the AI 3D Generator.
+
+Reads a file of prompts, generates the scripts with the OpenAI API (several
+requests in flight at once), runs each script in a sandboxed FreeCADCmd worker,
+and exports the results. It uses the same client, extraction, execution and
+report logic as the AI3DGenerator widget, without any Qt widget.
+
+The prompt file is either JSONL, one {"id": ..., "prompt": ...} object per line,
+or CSV with "id" and "prompt" columns. The id is optional.
+
+Usage:
+    python AI3DBatch.py prompts.jsonl --output-dir parts --concurrency 8 --formats FCStd,step
+
+For each prompt the output folder receives <id>.py (the script), <id>.md (the run
+report), and <id>.FCStd and the requested exports when the script ran. The
+results manifest is written to manifest.json.
+"""
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+from AIClient import AIClient
+from ResponseCache import ResponseCache, CACHE_FILENAME, CACHE_MODES, CACHE_ALWAYS
+from RunReport import write_run_report
+from ScriptExecutor import ScriptExecutor
+from ScriptPatch import repair
+from ScriptValidator import ScriptValidator, SymbolTable, SYMBOLS_FILENAME
+from SnippetIndex import SnippetIndex, INDEX_FILENAME, with_references
+from StreamParser import extract_reasoning_and_code
+
+EXPORT_FORMATS = ("step", "stl", "iges", "brep", "obj", "3mf")
+
+
+def read_prompts(path):
+    """
+    Read the prompts of a JSONL or CSV file.
+
+    Returns:
+        list: The prompts as dicts with the keys "id" and "prompt".
+    """
+    with open(path, newline="", encoding="utf-8") as file:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(file))
+        else:
+            rows = [json.loads(line) for line in file if line.strip()]
+    prompts = []
+    for number, row in enumerate(rows, 1):
+        if not row.get("prompt"):
+            raise ValueError(f"{path}: entry {number} has no prompt")
+        prompts.append({"id": str(row.get("id") or number), "prompt": row["prompt"]})
+    return prompts
+
+
+def parse_formats(text):
+    """ Parse the comma-separated --formats argument, rejecting unknown formats. """
+    formats = [fmt.strip().lower() for fmt in text.split(",") if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt != "fcstd" and fmt not in EXPORT_FORMATS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"unknown format {', '.join(unknown)} (choose from fcstd, {', '.join(EXPORT_FORMATS)})")
+    return formats
+
+
+def safe_name(text):
+    """ Turn a prompt id into a file name. """
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", text).strip("._") or "prompt"
+
+
+class BatchRunner:
+    """
+    Generates, runs and exports a list of prompts concurrently.
+
+    Attributes:
+        client (AIClient): The AI client.
+        executor (ScriptExecutor): The sandbox worker pool running the scripts.
+        pre_prompt (str): The system pre-prompt sent with every prompt.
+        output_dir (str): The folder receiving the results.
+        concurrency (int): The maximum number of prompts processed at once. At most as many
+            scripts as the executor has workers run at once; the others wait for a worker.
+        formats (list): The export formats, e.g. ["fcstd", "step"].
+        repairs (int): The number of repair attempts for a failing script.
+        snippet_index (SnippetIndex): The FreeCAD API references sent with the prompts, or None.
+        reference_budget (int): The maximum number of tokens of the references of a request.
+        reference_top_k (int): The maximum number of references of a request.
+        validator (ScriptValidator): Checks the scripts before they run, or None.
+        patch_repairs (bool): Whether repairs ask for a patch of the failing lines first, rather than the full script.
+    """
+    def __init__(self, client, executor, pre_prompt, output_dir, concurrency=4, formats=("fcstd", "step"), repairs=1,
+                 snippet_index=None, reference_budget=800, reference_top_k=4, validator=None, patch_repairs=True):
+        self.client = client
+        self.executor = executor
+        self.pre_prompt = pre_prompt
+        self.output_dir = output_dir
+        self.concurrency = concurrency
+        self.formats = [fmt.lower() for fmt in formats]
+        self.repairs = repairs
+        self.snippet_index = snippet_index
+        self.reference_budget = reference_budget
+        self.reference_top_k = reference_top_k
+        self.validator = validator
+        self.patch_repairs = patch_repairs
+        self._lock = threading.Lock()
+        self._done = 0
+        # Waiting for a worker must not count against the time limit of the run
+        self._workers = threading.Semaphore(executor.pool_size)
+
+    def run(self, prompts):
+        """
+        Process every prompt and write the results manifest.
+
+        Returns:
+            dict: The manifest.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.executor.start()
+        start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = list(pool.map(lambda item: self.process(item, len(prompts)), prompts))
+        manifest = {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "model": self.client.model,
+            "temperature": self.client.temperature,
+            "max_tokens": self.client.max_tokens,
+            "total": len(results),
+            "succeeded": sum(1 for result in results if result["ok"]),
+            "elapsed": round(time.perf_counter() - start, 3),
+            "results": results,
+        }
+        with open(os.path.join(self.output_dir, "manifest.json"), "w", encoding="utf-8") as file:
+            json.dump(manifest, file, indent=2)
+        return manifest
+
+    def process(self, item, total):
+        """ Generate, run and export a single prompt. Returns its manifest entry. """
+        name = safe_name(item["id"])
+        entry = {"id": item["id"], "prompt": item["prompt"], "ok": False, "attempts": 0,
+                 "script": "", "report": "", "files": {}, "error": "", "timings": {}, "repair_formats": []}
+        messages = [{"role": "system", "content": self.pre_prompt}, {"role": "user", "content": item["prompt"]}]
+        start = time.perf_counter()
+        response = self.client.complete(with_references(messages, self.references(item["prompt"])))
+        entry["timings"]["generation"] = round(time.perf_counter() - start, 3)
+        if not response:
+            entry["error"] = "Failed to fetch response."
+            self.report_progress(entry, total)
+            return entry
+        messages.append({"role": "assistant", "content": response})
+        script = extract_reasoning_and_code(response)[1]
+
+        error_traceback = None
+        for attempt in range(self.repairs + 1):
+            entry["attempts"] = attempt + 1
+            validation = self.validator.validate(script) if self.validator is not None else None
+            if validation is not None:
+                entry["timings"][f"validation_{attempt + 1}"] = round(validation.elapsed, 3)
+            if validation is not None and not validation.ok:
+                result = None
+                error_traceback = validation.format()
+            else:
+                with self._workers:
+                    start = time.perf_counter()
+                    result = self.executor.execute(
+                        script,
+                        output_path=os.path.abspath(os.path.join(self.output_dir, f"{name}.FCStd")),
+                        exports={fmt: os.path.abspath(os.path.join(self.output_dir, f"{name}.{fmt}"))
+                                 for fmt in self.formats if fmt in EXPORT_FORMATS}
+                    )
+                    entry["timings"][f"execution_{attempt + 1}"] = round(time.perf_counter() - start, 3)
+            if result is not None and result.ok:
+                error_traceback = None
+                entry["ok"] = True
+                entry["files"] = dict(result.exports)
+                if "fcstd" in self.formats:
+                    entry["files"]["fcstd"] = result.output_path
+                elif os.path.exists(result.output_path):
+                    os.remove(result.output_path)
+                break
+            if result is not None:
+                error_traceback = result.traceback
+            # A script that never reached a worker has nothing to repair
+            if attempt == self.repairs or (result is not None and result.infrastructure):
+                break
+            start = time.perf_counter()
+            responses = []
+            fix, repair_format = repair(lambda request: self.complete_into(request, responses), script, error_traceback,
+                                        self.references(f"{error_traceback}\n{script}"), self.patch_repairs)
+            entry["timings"][f"repair_{attempt + 1}"] = round(time.perf_counter() - start, 3)
+            entry["repair_formats"].append(repair_format)
+            messages.extend({"role": "assistant", "content": response} for response in responses)
+            if fix is None:
+                break
+            script = fix
+
+        entry["script"] = os.path.join(self.output_dir, f"{name}.py")
+        with open(entry["script"], "w", encoding="utf-8") as file:
+            file.write(script)
+        entry["report"] = write_run_report(self.output_dir, messages, self.client.model, self.client.temperature,
+                                           self.client.max_tokens, error_traceback, name=name)
+        entry["error"] = error_traceback or ""
+        self.report_progress(entry, total)
+        return entry
+
+    def complete_into(self, messages, responses):
+        """ Send a request, appending its response to responses for the run report. """
+        response = self.client.complete(messages)
+        if response:
+            responses.append(response)
+        return response
+
+    def references(self, query):
+        """ Return the message of the API references relevant to a query, or None. """
+        if self.snippet_index is None:
+            return None
+        return self.snippet_index.references(query, self.reference_budget, self.reference_top_k)
+
+    def report_progress(self, entry, total):
+        with self._lock:
+            self._done += 1
+            status = "ok" if entry["ok"] else "FAILED"
+            sys.stderr.write(f"[{self._done}/{total}] {entry['id']}: {status}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate FreeCAD parts from a file of prompts, without the GUI.")
+    parser.add_argument("prompts", help="JSONL or CSV file of prompts")
+    parser.add_argument("--output-dir", default="AI3DGenerator_batch", help="folder receiving the results")
+    parser.add_argument("--pre-prompt", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "pre_prompt_example.txt"),
+                        help="file holding the system pre-prompt")
+    parser.add_argument("--api-key", default=os.environ.get("OPENAI_API_KEY", ""), help="OpenAI API key (default: $OPENAI_API_KEY)")
+    parser.add_argument("--model", default="gpt-4")
+    parser.add_argument("--temperature", type=float, default=1.0)
+    parser.add_argument("--max-tokens", type=int, default=2048)
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--retries", type=int, default=4, help="retries of a request failing with a transient error")
+    parser.add_argument("--api-concurrency", type=int, default=4, help="maximum number of requests in flight with the API key")
+    parser.add_argument("--cache", choices=CACHE_MODES, default=CACHE_ALWAYS, help="response cache mode")
+    parser.add_argument("--concurrency", type=int, default=4, help="maximum number of prompts processed at once")
+    parser.add_argument("--workers", type=int, default=2, help="number of sandbox FreeCADCmd workers")
+    parser.add_argument("--freecadcmd", default="", help="path of FreeCADCmd (found automatically by default)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="time limit of a script run, in seconds")
+    parser.add_argument("--memory", type=int, default=2048, help="memory limit of a worker, in MB (0 for none)")
+    parser.add_argument("--formats", type=parse_formats, default="fcstd,step", help="comma-separated exports: fcstd, " + ", ".join(EXPORT_FORMATS))
+    parser.add_argument("--repairs", type=int, default=1, help="repair attempts for a failing script")
+    parser.add_argument("--references-budget", type=int, default=800,
+                        help="tokens of FreeCAD API references sent with each request (0 for none)")
+    parser.add_argument("--references-top-k", type=int, default=4, help="maximum number of references per request")
+    parser.add_argument("--repair-format", choices=("patch", "full"), default="patch",
+                        help="ask repairs for a patch of the failing lines (falling back to the full script), or the full script")
+    parser.add_argument("--skip-validation", action="store_true", help="run the scripts without checking them statically first")
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("an OpenAI API key is required (--api-key or $OPENAI_API_KEY)")
+    executor = ScriptExecutor.for_freecadcmd(args.freecadcmd, pool_size=args.workers, timeout=args.timeout,
+                                             memory_limit_mb=args.memory)
+    if executor is None:
+        parser.error("FreeCADCmd was not found, use --freecadcmd")
+    with open(args.pre_prompt, encoding="utf-8") as file:
+        pre_prompt = file.read()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    cache = ResponseCache(os.path.join(args.output_dir, CACHE_FILENAME))
+    client = AIClient(args.api_key, args.model, args.temperature, args.max_tokens, args.request_timeout, args.cache, cache,
+                      max_retries=args.retries, max_concurrent_requests=args.api_concurrency)
+    snippet_index = None
+    if args.references_budget > 0:
+        # The FreeCAD API can only be introspected inside FreeCAD; an index cached by the
+        # plugin in the output folder is reused, otherwise only the curated snippets are sent
+        snippet_index = SnippetIndex(os.path.join(args.output_dir, INDEX_FILENAME))
+        snippet_index.update()
+    validator = None
+    if not args.skip_validation:
+        # Like the references, the FreeCAD symbols come from the table cached by the plugin, if any
+        validator = ScriptValidator(SymbolTable.load(os.path.join(args.output_dir, SYMBOLS_FILENAME)), ("FreeCAD", "App"))
+    runner = BatchRunner(client, executor, pre_prompt, args.output_dir, args.concurrency,
+                         args.formats, args.repairs,
+                         snippet_index, args.references_budget, args.references_top_k, validator,
+                         args.repair_format == "patch")
+    try:
+        manifest = runner.run(read_prompts(args.prompts))
+    finally:
+        executor.shutdown()
+        cache.close()
+    sys.stderr.write(f"{manifest['succeeded']}/{manifest['total']} parts generated in {manifest['elapsed']:.1f} s\n")
+    return 0 if manifest["succeeded"] == manifest["total"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
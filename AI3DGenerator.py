@@ -1,12 +1,18 @@
 # AI3DGenerator.py
+import time
+
+import FreeCAD
 import FreeCADGui
 from PySide2 import QtWidgets, QtCore
-from AI3DGeneratorWidget import AI3DGeneratorWidget
+
+# Startup costs in milliseconds, logged to the report view and read by the benchmarks
+STARTUP_TIMINGS = {}
 
 
 class AI3DGeneratorCommand:
     """
     A command to open the AI 3D Generator widget.
+    The widget module, and the modules it depends on, are imported on the first activation.
     """
     def GetResources(self):
         return {
@@ -22,13 +28,26 @@ class AI3DGeneratorCommand:
         """
         if FreeCADGui.getMainWindow().findChild(QtWidgets.QDockWidget, "AI3DGeneratorDock"):
             return
+        start = time.perf_counter()
+        from SessionTabs import SessionTabs
         dock = QtWidgets.QDockWidget("AI 3D Generator", FreeCADGui.getMainWindow())
         dock.setObjectName("AI3DGeneratorDock")
-        dock.setWidget(AI3DGeneratorWidget())
+        dock.setWidget(SessionTabs())
         FreeCADGui.getMainWindow().addDockWidget(QtCore.Qt.RightDockWidgetArea, dock)
         dock.setFloating(False)
+        record_startup_time("widget", start)
 
     def IsActive(self):
         return True
 
-FreeCADGui.addCommand('AI3DGenerator', AI3DGeneratorCommand())
\ No newline at end of file
+
+def record_startup_time(stage, start):
+    """ Record and log the time spent since start (a time.perf_counter() value) on a startup stage. """
+    STARTUP_TIMINGS[stage] = (time.perf_counter() - start) * 1000
+    FreeCAD.Console.PrintLog(f"AI3DGenerator: {stage} startup took {STARTUP_TIMINGS[stage]:.1f} ms\n")
+
+
+def register_command():
+    """ Register the AI3DGenerator command, unless it is already registered. """
+    if 'AI3DGenerator' not in FreeCADGui.listCommands():
+        FreeCADGui.addCommand('AI3DGenerator', AI3DGeneratorCommand())
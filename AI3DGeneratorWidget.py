@@ -2,49 +2,194 @@
 from PySide2 import QtWidgets, QtGui, QtCore
 import FreeCAD
 import FreeCADGui
-import openai
 import os
 import time
 import traceback
 
+from AIClient import AIClient, build_repair_messages
 from ChatWindow import ChatWindow
-from CommandHelper import CommandHelper
+from ConversationContext import ConversationContext, count_tokens, warm_up as warm_up_tokenizer
+from ExportPipeline import ExportPipeline, EXPORT_FOLDER, EXPORT_FORMATS
+from GeometryCache import GeometryCache, GEOMETRY_FOLDER
+from IncrementalRunner import IncrementalRunner
+from Metrics import Metrics, REQUEST, DEBUG, REPAIR, RUN, ROUTE, EXPORT
+from ModelRouter import ModelRouter, Tier, classify, DEFAULT_TIERS, TIER_KINDS, STRONG, REPAIR as REPAIR_KIND
+from RequestEngine import RequestEngine
+from ParallelRepair import ParallelRepair
+from ScriptExecutor import ScriptExecutor
+from ScriptValidator import ScriptValidator, SymbolTable, SYMBOLS_FILENAME
+from ResponseCache import ResponseCache, CACHE_FILENAME, CACHE_MODES, CACHE_ALWAYS
+from ScriptPatch import PatchError, apply_response, build_patch_messages, repair, saved_tokens
+from SessionStore import SessionStore, export_markdown, load_session
+from SnippetIndex import SnippetIndex, INDEX_FILENAME, with_references
+from StreamParser import FencedBlockParser, is_code_language, extract_reasoning_and_code
+
+EXECUTION_IN_PROCESS = "in_process"
+EXECUTION_SANDBOX = "sandbox"
+EXECUTION_MODES = (EXECUTION_IN_PROCESS, EXECUTION_SANDBOX)
+
+REPAIR_SERIAL = "serial"
+REPAIR_PARALLEL = "parallel"
+REPAIR_MODES = (REPAIR_SERIAL, REPAIR_PARALLEL)
+
+REPAIR_PATCH = "patch"
+REPAIR_REWRITE = "rewrite"
+REPAIR_FORMATS = (REPAIR_PATCH, REPAIR_REWRITE)
 
 class AI3DGeneratorWidget(QtWidgets.QWidget):
     """
     Main widget for the AI 3D Generator tool.
     This widget provides a chat interface for interacting with the AI model and generating 3D models.
 
+    Each widget is a design session. Several sessions can be open in the tabs of a
+    SessionTabs widget: the first one is the primary session, which owns the
+    settings, the caches, the metrics and the sandbox workers shared by the others.
+
+    Signals:
+        settings_saved: Emitted when the settings dialog saved new settings.
+        session_changed: Emitted when the name or the overrides of the session changed.
+
     Attributes:
 
         conversation_history (list): A list of messages exchanged in the chat.
+        primary (AI3DGeneratorWidget): The session whose settings and caches are shared, or None for the primary session.
+        scheduler (SessionTabs): Grants the sessions their turn to generate, or None to generate at once.
+        session_name (str): The name of the session, shown in its tab.
+        overrides (dict): The "model", "temperature" and "max_tokens" used by this session instead of the settings.
+        target_document (str): The FreeCAD document the scripts of the session run in, or empty for the active document.
+        offloaded (bool): Whether the conversation was dropped from memory, to be reloaded from the session file.
+        queued (bool): Whether a prompt waits for a free generation slot.
         settings (QtCore.QSettings): The settings object for storing user settings.
         pre_prompt (str): The pre-prompt text to start the conversation.
         model (str): The AI model to use for generating responses.
         temperature (float): The temperature parameter for response generation.
         max_tokens (int): The maximum number of tokens for response generation.
         api_key (str): The OpenAI API key for accessing the model.
+        request_timeout (float): The number of seconds after which an AI request is abandoned.
+        api_max_retries (int): The number of retries of an AI request failing with a transient error.
+        api_max_concurrency (int): The maximum number of AI requests in flight with the API key.
+        stream (bool): Whether responses are streamed into the chat and the code editor as they arrive.
+        context_token_budget (int): The maximum number of prompt tokens sent with each request.
+        references_enabled (bool): Whether FreeCAD API references are sent with the prompts.
+        references_token_budget (int): The maximum number of tokens of the references of a request.
+        references_top_k (int): The maximum number of references of a request.
+        snippet_index (SnippetIndex): The search index of the FreeCAD API references, built on first use.
+        cache_mode (str): When to use the response cache: "always", "deterministic" (temperature 0 only) or "off".
         save_folder (str): The folder path to save generated scripts.
+        session_store (SessionStore): Records the messages, scripts and runs of the session in the save folder.
+        execution_mode (str): Where scripts run: "in_process" (inside FreeCAD) or "sandbox" (FreeCADCmd workers).
+        sandbox_timeout (float): The wall-clock limit of a sandboxed run, in seconds.
+        sandbox_memory_mb (int): The memory limit of a sandbox worker, in megabytes.
+        sandbox_workers (int): The number of warm sandbox workers.
+        freecadcmd_path (str): The FreeCADCmd executable, found automatically when empty.
+        validation_enabled (bool): Whether scripts are checked statically before they run.
+        geometry_cache_enabled (bool): Whether the documents built by scripts are cached and restored on later runs.
+        geometry_cache_mb (int): The maximum size of the geometry cache, in megabytes.
+        geometry_cache (GeometryCache): The cache of the documents built by scripts, in the save folder.
+        incremental_enabled (bool): Whether revised scripts re-run only their changed steps inside FreeCAD.
+        incremental_runner (IncrementalRunner): Runs the scripts step by step inside FreeCAD, or None if this
+            FreeCAD version has no application-wide transactions.
+        symbol_table (SymbolTable): The FreeCAD names the scripts are checked against, loaded on first use.
+        script_executor (ScriptExecutor): The sandbox worker pool, created on first use.
+        export_enabled (bool): Whether the results of successful runs are exported in the background.
+        export_formats (list): The formats the results are exported to, among "step", "stl" and "3mf".
+        export_thumbnail_size (int): The size of the thumbnails of the results in pixels, 0 for none.
+        export_deflection (float): The linear deflection of the tessellation of the mesh exports, in millimeters.
+        export_workers (int): The number of exports running at once, each in a FreeCADCmd worker.
+        export_pipeline (ExportPipeline): Exports the results in the save folder, created on first use.
+        export_engine (RequestEngine): The background engine waiting on the exports, apart from the requests
+            so that exports never keep the session busy.
+        repair_mode (str): How failing scripts are debugged: "serial" (one fix at a time) or "parallel".
+        repair_format (str): How fixes are requested: "patch" (a diff of the lines around the error,
+            falling back to the full script when it does not apply) or "rewrite" (the full script).
+        repair_candidates (int): The number of fixes requested per round in parallel repair.
+        repair_max_rounds (int): The maximum number of rounds of parallel repair.
+        repair_time_budget (float): The total time allowed for a parallel repair, in seconds.
+        max_parallel_sessions (int): The maximum number of sessions generating a response at once.
+        session_offload_minutes (int): The idle time after which a hidden session is offloaded to disk, 0 for never.
+        routing_enabled (bool): Whether requests are routed to a model tier by kind (new design, edit or repair).
+        routing_tiers (dict): The Tier of each request kind, as set; a tier without a model uses the settings model.
+        model_router (ModelRouter): Routes the requests of the session, and escalates them to the settings model.
+        code_tier (Tier): The tier that wrote the script last put in the code editor, or None.
+        parallel_repair (ParallelRepair): The parallel repair in progress, if any.
+        metrics_enabled (bool): Whether the per-stage metrics of the requests and runs are collected.
+        metrics_file (str): A JSONL file every metrics entry is appended to, or empty for none.
+        metrics (Metrics): The per-stage timers and counters of the requests and runs.
+        request_engine (RequestEngine): The background engine running the AI requests.
+        response_cache (ResponseCache): The cache of AI responses, persisted in the save folder.
+        ai_client (AIClient): The client sending the requests to the OpenAI API.
+        context (ConversationContext): Builds the token-budgeted messages sent from the conversation history.
         settings_button (QtWidgets.QPushButton): A button to open the settings dialog.
+        session_button (QtWidgets.QPushButton): A button to open the overrides of the session.
         chat_window (ChatWindow): The chat window widget for displaying messages.
+        status_label (QtWidgets.QLabel): A label showing the prompt token counts of the last request.
         prompt_input (QtWidgets.QPlainTextEdit): The input box for user prompts.
+        send_button (QtWidgets.QPushButton): A button to send the prompt to the AI.
+        cancel_button (QtWidgets.QPushButton): A button to cancel the in-flight AI request.
         code_editor (QtWidgets.QPlainTextEdit): The code editor for displaying generated code.
         helper_button (QtWidgets.QPushButton): A button to open the command helper popup.
-        command_helper (CommandHelper): The command helper popup widget.
+        command_helper (CommandHelper): The command helper popup widget, built when it is first opened.
+        stats_panel (StatsPanel): The panel showing the metrics, built when it is first shown.
 
     """
-    def __init__(self):
+    settings_saved = QtCore.Signal()
+    session_changed = QtCore.Signal()
+
+    def __init__(self, primary=None, scheduler=None):
         super().__init__()
         self.conversation_history = []
-        
+        self.primary = primary
+        self.scheduler = scheduler
+        self.session_name = ""
+        self.overrides = {}
+        self.target_document = ""
+        self.offloaded = False
+        self.queued = False
+
         # Load settings
         self.settings = QtCore.QSettings("FreeCAD", "AI3DGenerator")
-        self.pre_prompt = self.settings.value("pre_prompt", "Default pre-prompt text here")
-        self.model = self.settings.value("model", "gpt-4")
-        self.temperature = float(self.settings.value("temperature", 1.0))
-        self.max_tokens = int(self.settings.value("max_tokens", 2048))
-        self.api_key = self.settings.value("api_key", "")
-        self.save_folder = self.settings.value("save_folder", os.path.join(os.path.expanduser("~"), "Downloads"))
+        self.load_settings()
+        self.snippet_index = None
+        if primary is not None:
+            # The caches and the metrics are shared by every session
+            self.response_cache = primary.response_cache
+            self.geometry_cache = primary.geometry_cache
+            self.metrics = primary.metrics
+        else:
+            self.response_cache = self.open_response_cache()
+            self.geometry_cache = self.open_geometry_cache()
+            self.metrics = Metrics(self.metrics_enabled, self.metrics_file or None)
+            warm_up_tokenizer()  # Ready before the first prompt's context is counted
+            if self.references_enabled:
+                self.prepare_snippet_index().warm_up()  # Built before the first prompt's references are searched
+        self.session_store = SessionStore(self.save_folder)
+        self.ai_client = AIClient()
+        self.configure_ai_client()
+        self.context = ConversationContext(self.context_token_budget)
+        self.script_executor = None
+        self.export_pipeline = None
+        # Exports do not count as requests of the session, which stays free for the next prompt
+        self.export_engine = primary.export_engine if primary is not None else RequestEngine(self, self.export_workers)
+        self.symbol_table = None
+        self.incremental_runner = IncrementalRunner(FreeCAD) if IncrementalRunner.supported(FreeCAD) else None
+        self.parallel_repair = None
+        self._repair_thread_count = None  # The thread count of the request pool before the parallel repair
+        self.code_tier = None
+        self._request_tier = None
+        self._tier_script = None  # The script code_tier wrote, to tell it from the user's edits
+        self._run_after_response = False
+        self._context_stats = None
+        if self.execution_mode == EXECUTION_SANDBOX:
+            self.get_script_executor()  # Warm up the workers ahead of the first run
+
+        # Background engine for the AI requests, so the GUI stays responsive
+        self.request_engine = RequestEngine(self)
+        self.request_engine.busy_changed.connect(self.on_busy_changed)
+        self._thinking_index = None
+        self._stream_parser = None
+        self._stream_text_index = None
+        self._stream_code_index = None
+        self._stream_has_code = False
 
         layout = QtWidgets.QVBoxLayout()
 
@@ -53,6 +198,10 @@ class AI3DGeneratorWidget(QtWidgets.QWidget):
         self.settings_button.clicked.connect(self.open_settings)
         layout.addWidget(self.settings_button)
 
+        self.session_button = QtWidgets.QPushButton("Session")
+        self.session_button.clicked.connect(self.open_session_settings)
+        layout.addWidget(self.session_button)
+
         clear_button = QtWidgets.QPushButton("Clear Chat")
         clear_button.clicked.connect(self.clear_chat)
         layout.addWidget(clear_button)
@@ -60,18 +209,26 @@ class AI3DGeneratorWidget(QtWidgets.QWidget):
         self.chat_window = ChatWindow()
         layout.addWidget(self.chat_window)
 
+        self.status_label = QtWidgets.QLabel()
+        self.status_label.setStyleSheet("color: #666;")
+        layout.addWidget(self.status_label)
+
         # 3 lines high chat input
         self.prompt_input = QtWidgets.QPlainTextEdit()
         self.prompt_input.setPlaceholderText("Enter your prompt (e.g., 'Create a box')")
         self.prompt_input.setFixedHeight(50)
         self.prompt_input.setStyleSheet("background-color: #f0f0f0; color: #333;")
         self.prompt_input.setTabChangesFocus(True)
-        send_button = QtWidgets.QPushButton("Send")
-        send_button.clicked.connect(self.prompt_ai)
+        self.send_button = QtWidgets.QPushButton("Send")
+        self.send_button.clicked.connect(self.prompt_ai)
+        self.cancel_button = QtWidgets.QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel_request)
+        self.cancel_button.setEnabled(False)
 
         prompt_layout = QtWidgets.QHBoxLayout()
         prompt_layout.addWidget(self.prompt_input)
-        prompt_layout.addWidget(send_button)
+        prompt_layout.addWidget(self.send_button)
+        prompt_layout.addWidget(self.cancel_button)
         layout.addLayout(prompt_layout)
 
         self.code_editor = QtWidgets.QPlainTextEdit()
@@ -85,12 +242,17 @@ class AI3DGeneratorWidget(QtWidgets.QWidget):
         play_button = QtWidgets.QPushButton("Play Code")
         play_button.clicked.connect(self.run_script)
 
+        stats_button = QtWidgets.QPushButton("Stats")
+        stats_button.clicked.connect(self.toggle_stats_view)
+
         button_layout = QtWidgets.QHBoxLayout()
         button_layout.addWidget(expand_button)
         button_layout.addWidget(play_button)
+        button_layout.addWidget(stats_button)
 
         layout.addLayout(button_layout)
         layout.addWidget(self.code_editor)
+        self.stats_panel = None
         self.setLayout(layout)
 
         self.toggle_chat_input(bool(self.api_key))
@@ -99,14 +261,90 @@ class AI3DGeneratorWidget(QtWidgets.QWidget):
         self.helper_button = QtWidgets.QPushButton("Command Helper")
         self.helper_button.clicked.connect(self.show_command_helper)
         layout.addWidget(self.helper_button)
-        
-        # Instantiate the helper popup (without showing it yet)
-        self.command_helper = CommandHelper(self)
+        self.command_helper = None
+
+    def load_settings(self):
+        """ Read the settings, which every session shares, from the FreeCAD settings. """
+        self.pre_prompt = self.settings.value("pre_prompt", "Default pre-prompt text here")
+        self.model = self.settings.value("model", "gpt-4")
+        self.temperature = float(self.settings.value("temperature", 1.0))
+        self.max_tokens = int(self.settings.value("max_tokens", 2048))
+        self.api_key = self.settings.value("api_key", "")
+        self.request_timeout = float(self.settings.value("request_timeout", 120.0))
+        self.api_max_retries = int(self.settings.value("api_max_retries", 4))
+        self.api_max_concurrency = int(self.settings.value("api_max_concurrency", 4))
+        self.stream = self.settings.value("stream", True, type=bool)
+        self.context_token_budget = int(self.settings.value("context_token_budget", 6000))
+        self.references_enabled = self.settings.value("references_enabled", True, type=bool)
+        self.references_token_budget = int(self.settings.value("references_token_budget", 800))
+        self.references_top_k = int(self.settings.value("references_top_k", 4))
+        self.cache_mode = self.settings.value("cache_mode", CACHE_ALWAYS)
+        self.save_folder = self.settings.value("save_folder", os.path.join(os.path.expanduser("~"), "Downloads"))
+        self.execution_mode = self.settings.value("execution_mode", EXECUTION_IN_PROCESS)
+        self.sandbox_timeout = float(self.settings.value("sandbox_timeout", 60.0))
+        self.sandbox_memory_mb = int(self.settings.value("sandbox_memory_mb", 2048))
+        self.sandbox_workers = int(self.settings.value("sandbox_workers", 2))
+        self.freecadcmd_path = self.settings.value("freecadcmd_path", "")
+        self.validation_enabled = self.settings.value("validation_enabled", True, type=bool)
+        self.geometry_cache_enabled = self.settings.value("geometry_cache_enabled", True, type=bool)
+        self.geometry_cache_mb = int(self.settings.value("geometry_cache_mb", 512))
+        self.incremental_enabled = self.settings.value("incremental_enabled", True, type=bool)
+        self.repair_mode = self.settings.value("repair_mode", REPAIR_SERIAL)
+        self.repair_format = self.settings.value("repair_format", REPAIR_PATCH)
+        self.repair_candidates = int(self.settings.value("repair_candidates", 3))
+        self.repair_max_rounds = int(self.settings.value("repair_max_rounds", 3))
+        self.repair_time_budget = float(self.settings.value("repair_time_budget", 180.0))
+        self.max_parallel_sessions = int(self.settings.value("max_parallel_sessions", 2))
+        self.session_offload_minutes = int(self.settings.value("session_offload_minutes", 10))
+        self.routing_enabled = self.settings.value("routing_enabled", False, type=bool)
+        self.routing_tiers = {
+            kind: Tier(kind, self.settings.value(f"tier_{kind}_model", model),
+                       float(self.settings.value(f"tier_{kind}_temperature", temperature)),
+                       int(self.settings.value(f"tier_{kind}_max_tokens", max_tokens)))
+            for kind, (model, temperature, max_tokens) in DEFAULT_TIERS.items()
+        }
+        self.metrics_enabled = self.settings.value("metrics_enabled", True, type=bool)
+        self.metrics_file = self.settings.value("metrics_file", "")
+        self.export_enabled = self.settings.value("export_enabled", False, type=bool)
+        self.export_formats = [fmt for fmt in self.settings.value("export_formats", "step,stl").split(",") if fmt in EXPORT_FORMATS]
+        self.export_thumbnail_size = int(self.settings.value("export_thumbnail_size", 256))
+        self.export_deflection = float(self.settings.value("export_deflection", 0.1))
+        self.export_workers = int(self.settings.value("export_workers", 1))
+
+    def sync_settings(self):
+        """
+        Apply the settings saved from the primary session to this one, and use the
+        caches, the metrics and the sandbox workers of the primary session again.
+        """
+        save_folder = self.save_folder
+        self.load_settings()
+        self.response_cache = self.primary.response_cache
+        self.geometry_cache = self.primary.geometry_cache
+        self.metrics = self.primary.metrics
+        self.snippet_index = self.primary.snippet_index
+        self.symbol_table = self.primary.symbol_table
+        self.context.token_budget = self.context_token_budget
+        if self.save_folder != save_folder:
+            # Keep the conversation, but record the rest of the session in the new folder
+            self.reload_history()
+            self.start_session()
+            self.session_store.record_messages(self.conversation_history)
+        if self.stats_panel is not None:
+            self.stats_panel.metrics = self.metrics
+            self.stats_panel.folder = self.save_folder
+            self.stats_panel.refresh()
+        self.configure_ai_client()
+        self.toggle_chat_input(bool(self.api_key))
 
     def show_command_helper(self):
         """
-        Show the command helper popup below the chat input.
+        Show the command helper popup below the chat input, building it on first use.
         """
+        if self.command_helper is None:
+            from CommandHelper import CommandHelper
+            self.command_helper = CommandHelper(self, self.pre_prompt)
+        else:
+            self.command_helper.update_command_list(self.pre_prompt)
         pos = self.prompt_input.mapToGlobal(QtCore.QPoint(0, 0))
         self.command_helper.move(pos + QtCore.QPoint(0, self.prompt_input.height()))
         self.command_helper.show()
@@ -118,11 +356,205 @@ class AI3DGeneratorWidget(QtWidgets.QWidget):
         self.prompt_input.setEnabled(enable)
         self.chat_window.setEnabled(enable)
         self.settings_button.setEnabled(True)
+        self.send_button.setEnabled(enable and not self.request_engine.is_busy() and not self.queued)
+
+    def on_busy_changed(self, busy):
+        """
+        Update the Send and Cancel buttons when a request starts or completes, or a prompt is queued.
+        """
+        self.send_button.setEnabled(not busy and not self.queued and bool(self.api_key))
+        self.cancel_button.setEnabled(busy or self.queued)
+
+    def cancel_request(self):
+        """ Cancel the in-flight or queued AI request. The late result, if any, is discarded. """
+        if self.queued:
+            self.scheduler.cancel_slot(self)
+            self.chat_window.add_message("AI", "Request cancelled.", is_user=False)
+            self.restore_prompt()
+        if self.parallel_repair is not None and self.parallel_repair.is_running():
+            self.parallel_repair.cancel()
+        if self.request_engine.is_busy():
+            self.request_engine.cancel()
+            self.chat_window.add_message("AI", "Request cancelled.", is_user=False)
+
+    def open_response_cache(self):
+        """ Open the response cache stored in the save folder. """
+        path = os.path.join(self.save_folder, CACHE_FILENAME) if os.path.isdir(self.save_folder) else None
+        return ResponseCache(path)
+
+    def open_geometry_cache(self):
+        """ Open the geometry cache stored in the save folder, or a disabled cache. """
+        folder = os.path.join(self.save_folder, GEOMETRY_FOLDER) \
+            if self.geometry_cache_enabled and os.path.isdir(self.save_folder) else None
+        return GeometryCache(folder, max_bytes=self.geometry_cache_mb * 1024 * 1024)
+
+    def prepare_snippet_index(self):
+        """
+        Open the index of the FreeCAD API references cached in the save folder, and
+        introspect the FreeCAD API if it changed since it was indexed. Runs on the GUI
+        thread, where the FreeCAD modules are introspected; this is only slow the first
+        time for a FreeCAD version. The snippets are read and the index is built by
+        reference_message, on a worker thread.
+        """
+        if not self.references_enabled:
+            return None
+        if self.primary is not None:
+            self.snippet_index = self.primary.prepare_snippet_index()
+            return self.snippet_index
+        if self.snippet_index is None:
+            path = os.path.join(self.save_folder, INDEX_FILENAME) if os.path.isdir(self.save_folder) else None
+            self.snippet_index = SnippetIndex(path)
+        self.snippet_index.collect_api()
+        return self.snippet_index
+
+    def reference_message(self, query):
+        """
+        Return the message holding the FreeCAD API references relevant to a query, or
+        None. Brings the index prepared by prepare_snippet_index up to date first, which
+        reads the changed snippets; call it from a worker thread.
+        """
+        index = self.snippet_index
+        if not self.references_enabled or index is None:
+            return None
+        start = time.perf_counter()
+        changed = index.update(introspect=False)
+        if changed:
+            FreeCAD.Console.PrintLog(f"AI3DGenerator: indexed {changed} reference sources "
+                                     f"({len(index)} entries) in {(time.perf_counter() - start) * 1000:.0f} ms\n")
+        return index.references(query, self.references_token_budget, self.references_top_k)
+
+    def add_references(self, messages, query, request):
+        """
+        Add the FreeCAD API references relevant to a query to the messages of a request,
+        and record their token count in the request info. Call it from a worker thread.
+        """
+        reference = self.reference_message(query)
+        if reference is None:
+            return messages
+        request.info["reference_tokens"] = count_tokens(reference["content"])
+        return with_references(messages, reference)
+
+    def start_session(self):
+        """ Close the session file and start recording a new session in the save folder. """
+        self.session_store.close()
+        self.session_store = SessionStore(self.save_folder)
+
+    def export_session(self):
+        """ Render the markdown reports of the runs of the current session into the save folder. """
+        self.session_store.flush()
+        if not os.path.exists(self.session_store.path):
+            QtWidgets.QMessageBox.information(self, "Export Session", "No script has been run in this session yet.")
+            return
+        reports = export_markdown(self.session_store.path, self.save_folder)
+        QtWidgets.QMessageBox.information(self, "Export Session", f"{len(reports)} run reports saved to {self.save_folder}.")
+
+    def configure_ai_client(self):
+        """ Apply the current settings, and the overrides of the session, to the AI client. """
+        self.ai_client.api_key = self.api_key
+        self.ai_client.model = self.overrides.get("model", self.model)
+        self.ai_client.temperature = self.overrides.get("temperature", self.temperature)
+        self.ai_client.max_tokens = self.overrides.get("max_tokens", self.max_tokens)
+        self.ai_client.request_timeout = self.request_timeout
+        self.ai_client.cache_mode = self.cache_mode
+        self.ai_client.response_cache = self.response_cache
+        self.ai_client.max_retries = self.api_max_retries
+        self.ai_client.max_concurrent_requests = self.api_max_concurrency
+        strong = Tier(STRONG, self.ai_client.model, self.ai_client.temperature, self.ai_client.max_tokens)
+        tiers = {kind: Tier(kind, tier.model or strong.model, tier.temperature, tier.max_tokens)
+                 for kind, tier in self.routing_tiers.items()}
+        # A session with a model of its own sends every request to it
+        self.model_router = ModelRouter(tiers, strong, enabled=self.routing_enabled and "model" not in self.overrides)
+
+    def get_script_executor(self):
+        """
+        Return the sandbox worker pool, starting it on first use.
+        Returns None if FreeCADCmd cannot be found. The sessions share the workers of the primary session.
+        """
+        if self.primary is not None:
+            self.script_executor = self.primary.get_script_executor()
+            return self.script_executor
+        if self.script_executor is None:
+            self.script_executor = ScriptExecutor.for_freecadcmd(
+                self.freecadcmd_path,
+                pool_size=self.sandbox_workers,
+                timeout=self.sandbox_timeout,
+                memory_limit_mb=self.sandbox_memory_mb
+            )
+            if self.script_executor is None:
+                FreeCAD.Console.PrintWarning("FreeCADCmd was not found, scripts will run inside FreeCAD.\n")
+                return None
+            self.script_executor.start()
+        return self.script_executor
+
+    def get_export_pipeline(self):
+        """
+        Return the background export pipeline, starting its workers on first use.
+        Returns None if FreeCADCmd cannot be found. The sessions share the pipeline of the primary session.
+        """
+        if self.primary is not None:
+            self.export_pipeline = self.primary.get_export_pipeline()
+            return self.export_pipeline
+        if self.export_pipeline is None:
+            self.export_pipeline = ExportPipeline.for_freecadcmd(
+                os.path.join(self.save_folder, EXPORT_FOLDER),
+                self.freecadcmd_path,
+                workers=self.export_workers,
+                memory_limit_mb=self.sandbox_memory_mb,
+                formats=self.export_formats,
+                thumbnail_size=self.export_thumbnail_size,
+                deflection=self.export_deflection
+            )
+            if self.export_pipeline is None:
+                FreeCAD.Console.PrintWarning("FreeCADCmd was not found, the results will not be exported.\n")
+                return None
+            self.export_pipeline.executor.start()
+        return self.export_pipeline
+
+    def validate_script(self, script, sandbox=False):
+        """
+        Check a script statically against the FreeCAD modules, loading their symbol
+        table from the save folder on first use.
+
+        Args:
+            script (str): The script to check.
+            sandbox (bool): Whether the script runs in a sandbox worker, whose namespace
+                only defines FreeCAD and App, instead of the globals of this module.
+
+        Returns:
+            ValidationResult: The issues found, or None if validation is turned off.
+        """
+        if not self.validation_enabled:
+            return None
+        predefined = {"FreeCAD", "App"} if sandbox else set(globals())
+        return ScriptValidator(self.get_symbol_table(), predefined).validate(script)
+
+    def get_symbol_table(self):
+        """ Return the symbol table of the FreeCAD modules, loading it from the save folder on first use. """
+        if self.primary is not None:
+            self.symbol_table = self.primary.get_symbol_table()
+        elif self.symbol_table is None:
+            path = os.path.join(self.save_folder, SYMBOLS_FILENAME) if os.path.isdir(self.save_folder) else None
+            self.symbol_table = SymbolTable.load(path)
+        return self.symbol_table
+
+    def validation_error(self, script):
+        """ Return the validation report of a fix that would fail in the sandbox, or None. """
+        validation = self.validate_script(script, sandbox=True)
+        return validation.format() if validation is not None and not validation.ok else None
 
     def toggle_code_view(self):
         """ Toggle the visibility of the code editor. """
         self.code_editor.setVisible(not self.code_editor.isVisible())
 
+    def toggle_stats_view(self):
+        """ Toggle the visibility of the stats panel, building it on first use. """
+        if self.stats_panel is None:
+            from StatsPanel import StatsPanel
+            self.stats_panel = StatsPanel(self.metrics, self.save_folder)
+            self.stats_panel.setVisible(False)
+            self.layout().insertWidget(self.layout().indexOf(self.code_editor) + 1, self.stats_panel)
+        self.stats_panel.setVisible(not self.stats_panel.isVisible())
+
     def open_settings(self):
         """
         Open the settings dialog to configure the AI model and other settings.
@@ -132,9 +564,24 @@ class AI3DGeneratorWidget(QtWidgets.QWidget):
             - Model selection
             - Temperature
             - Max tokens
-            - Save folder
+            - Context token budget
+            - FreeCAD API references
+            - Request timeout, retries and concurrency
+            - Streaming
+            - Response cache
+            - Script execution (in-process or sandboxed)
+            - Debugging (serial or parallel repair)
+            - Sessions (generations at once, offloading of idle sessions)
+            - Model routing (the tier of each request kind)
+            - Metrics
+            - Save folder and export of the session reports
             - API key
+
+        The settings are shared by every session, and edited from the primary session.
         """
+        if self.primary is not None:
+            self.primary.open_settings()
+            return
         dialog = QtWidgets.QDialog(self)
         dialog.setWindowTitle("Settings")
         layout = QtWidgets.QVBoxLayout(dialog)
@@ -168,6 +615,214 @@ class AI3DGeneratorWidget(QtWidgets.QWidget):
         max_tokens_input.setValue(self.max_tokens)
         layout.addWidget(max_tokens_input)
 
+        # Context Token Budget
+        budget_label = QtWidgets.QLabel("Context Token Budget:")
+        layout.addWidget(budget_label)
+        budget_input = QtWidgets.QSpinBox()
+        budget_input.setRange(500, 128000)
+        budget_input.setSingleStep(500)
+        budget_input.setValue(self.context_token_budget)
+        layout.addWidget(budget_input)
+
+        # FreeCAD API references
+        references_checkbox = QtWidgets.QCheckBox("Send relevant FreeCAD API references and examples")
+        references_checkbox.setChecked(self.references_enabled)
+        layout.addWidget(references_checkbox)
+        references_layout = QtWidgets.QFormLayout()
+        references_budget_input = QtWidgets.QSpinBox()
+        references_budget_input.setRange(100, 8000)
+        references_budget_input.setSingleStep(100)
+        references_budget_input.setValue(self.references_token_budget)
+        references_layout.addRow("Reference token budget:", references_budget_input)
+        references_top_k_input = QtWidgets.QSpinBox()
+        references_top_k_input.setRange(1, 20)
+        references_top_k_input.setValue(self.references_top_k)
+        references_layout.addRow("References per request:", references_top_k_input)
+        layout.addLayout(references_layout)
+
+        # Request Timeout
+        timeout_label = QtWidgets.QLabel("Request Timeout (seconds):")
+        layout.addWidget(timeout_label)
+        timeout_input = QtWidgets.QSpinBox()
+        timeout_input.setRange(5, 600)
+        timeout_input.setValue(int(self.request_timeout))
+        layout.addWidget(timeout_input)
+        api_layout = QtWidgets.QFormLayout()
+        retries_input = QtWidgets.QSpinBox()
+        retries_input.setRange(0, 10)
+        retries_input.setValue(self.api_max_retries)
+        api_layout.addRow("Retries on rate limits and server errors:", retries_input)
+        concurrency_input = QtWidgets.QSpinBox()
+        concurrency_input.setRange(1, 32)
+        concurrency_input.setValue(self.api_max_concurrency)
+        api_layout.addRow("Concurrent requests per API key:", concurrency_input)
+        layout.addLayout(api_layout)
+
+        # Streaming
+        stream_input = QtWidgets.QCheckBox("Stream responses as they are generated")
+        stream_input.setChecked(self.stream)
+        layout.addWidget(stream_input)
+
+        # Response Cache
+        cache_label = QtWidgets.QLabel("Response Cache:")
+        layout.addWidget(cache_label)
+        cache_input = QtWidgets.QComboBox()
+        cache_input.addItems(["Always", "Only when temperature is 0", "Off"])
+        cache_input.setCurrentIndex(CACHE_MODES.index(self.cache_mode) if self.cache_mode in CACHE_MODES else 0)
+        layout.addWidget(cache_input)
+        clear_cache_button = QtWidgets.QPushButton("Clear Response Cache")
+        clear_cache_button.clicked.connect(self.response_cache.clear)
+        layout.addWidget(clear_cache_button)
+
+        # Script Execution
+        execution_label = QtWidgets.QLabel("Script Execution:")
+        layout.addWidget(execution_label)
+        execution_input = QtWidgets.QComboBox()
+        execution_input.addItems(["Inside FreeCAD", "Sandboxed FreeCADCmd workers"])
+        execution_input.setCurrentIndex(EXECUTION_MODES.index(self.execution_mode) if self.execution_mode in EXECUTION_MODES else 0)
+        layout.addWidget(execution_input)
+        sandbox_layout = QtWidgets.QFormLayout()
+        sandbox_timeout_input = QtWidgets.QSpinBox()
+        sandbox_timeout_input.setRange(1, 3600)
+        sandbox_timeout_input.setValue(int(self.sandbox_timeout))
+        sandbox_layout.addRow("Time limit (seconds):", sandbox_timeout_input)
+        sandbox_memory_input = QtWidgets.QSpinBox()
+        sandbox_memory_input.setRange(0, 65536)
+        sandbox_memory_input.setSingleStep(256)
+        sandbox_memory_input.setValue(self.sandbox_memory_mb)
+        sandbox_layout.addRow("Memory limit (MB, 0 for none):", sandbox_memory_input)
+        sandbox_workers_input = QtWidgets.QSpinBox()
+        sandbox_workers_input.setRange(1, 16)
+        sandbox_workers_input.setValue(self.sandbox_workers)
+        sandbox_layout.addRow("Warm workers:", sandbox_workers_input)
+        freecadcmd_input = QtWidgets.QLineEdit(self.freecadcmd_path)
+        freecadcmd_input.setPlaceholderText("Found automatically")
+        sandbox_layout.addRow("FreeCADCmd path:", freecadcmd_input)
+        layout.addLayout(sandbox_layout)
+        validation_input = QtWidgets.QCheckBox("Check scripts statically before running them")
+        validation_input.setChecked(self.validation_enabled)
+        layout.addWidget(validation_input)
+        incremental_input = QtWidgets.QCheckBox("Re-run only the changed steps of revised scripts (inside FreeCAD)")
+        incremental_input.setChecked(self.incremental_enabled)
+        incremental_input.setEnabled(self.incremental_runner is not None)
+        layout.addWidget(incremental_input)
+        geometry_cache_input = QtWidgets.QCheckBox("Restore the geometry of scripts that already ran")
+        geometry_cache_input.setChecked(self.geometry_cache_enabled)
+        layout.addWidget(geometry_cache_input)
+        geometry_layout = QtWidgets.QFormLayout()
+        geometry_cache_size_input = QtWidgets.QSpinBox()
+        geometry_cache_size_input.setRange(16, 65536)
+        geometry_cache_size_input.setSingleStep(128)
+        geometry_cache_size_input.setValue(self.geometry_cache_mb)
+        geometry_layout.addRow("Geometry cache size (MB):", geometry_cache_size_input)
+        layout.addLayout(geometry_layout)
+        clear_geometry_button = QtWidgets.QPushButton("Clear Geometry Cache")
+        clear_geometry_button.clicked.connect(lambda: self.geometry_cache.clear())
+        layout.addWidget(clear_geometry_button)
+
+        # Background export
+        export_input = QtWidgets.QCheckBox("Export the results of successful runs in the background")
+        export_input.setChecked(self.export_enabled)
+        layout.addWidget(export_input)
+        export_layout = QtWidgets.QFormLayout()
+        export_formats_layout = QtWidgets.QHBoxLayout()
+        export_format_inputs = {}
+        for fmt in EXPORT_FORMATS:
+            export_format_inputs[fmt] = QtWidgets.QCheckBox(fmt.upper())
+            export_format_inputs[fmt].setChecked(fmt in self.export_formats)
+            export_formats_layout.addWidget(export_format_inputs[fmt])
+        export_layout.addRow("Formats:", export_formats_layout)
+        export_thumbnail_input = QtWidgets.QSpinBox()
+        export_thumbnail_input.setRange(0, 1024)
+        export_thumbnail_input.setSingleStep(64)
+        export_thumbnail_input.setValue(self.export_thumbnail_size)
+        export_layout.addRow("Thumbnail size (pixels, 0 for none):", export_thumbnail_input)
+        export_deflection_input = QtWidgets.QDoubleSpinBox()
+        export_deflection_input.setRange(0.001, 10.0)
+        export_deflection_input.setDecimals(3)
+        export_deflection_input.setSingleStep(0.05)
+        export_deflection_input.setValue(self.export_deflection)
+        export_layout.addRow("Mesh deflection (mm):", export_deflection_input)
+        export_workers_input = QtWidgets.QSpinBox()
+        export_workers_input.setRange(1, 8)
+        export_workers_input.setValue(self.export_workers)
+        export_layout.addRow("Exports at once:", export_workers_input)
+        layout.addLayout(export_layout)
+
+        # Debugging
+        repair_label = QtWidgets.QLabel("Debugging:")
+        layout.addWidget(repair_label)
+        repair_input = QtWidgets.QComboBox()
+        repair_input.addItems(["One fix at a time", "Parallel candidate fixes (uses the sandbox)"])
+        repair_input.setCurrentIndex(REPAIR_MODES.index(self.repair_mode) if self.repair_mode in REPAIR_MODES else 0)
+        layout.addWidget(repair_input)
+        repair_format_input = QtWidgets.QComboBox()
+        repair_format_input.addItems(["Ask for patches of the failing lines", "Ask for full scripts"])
+        repair_format_input.setCurrentIndex(REPAIR_FORMATS.index(self.repair_format) if self.repair_format in REPAIR_FORMATS else 0)
+        layout.addWidget(repair_format_input)
+        repair_layout = QtWidgets.QFormLayout()
+        repair_candidates_input = QtWidgets.QSpinBox()
+        repair_candidates_input.setRange(1, 8)
+        repair_candidates_input.setValue(self.repair_candidates)
+        repair_layout.addRow("Candidates per round:", repair_candidates_input)
+        repair_rounds_input = QtWidgets.QSpinBox()
+        repair_rounds_input.setRange(1, 10)
+        repair_rounds_input.setValue(self.repair_max_rounds)
+        repair_layout.addRow("Maximum rounds:", repair_rounds_input)
+        repair_budget_input = QtWidgets.QSpinBox()
+        repair_budget_input.setRange(10, 3600)
+        repair_budget_input.setValue(int(self.repair_time_budget))
+        repair_layout.addRow("Time budget (seconds):", repair_budget_input)
+        layout.addLayout(repair_layout)
+
+        # Sessions
+        sessions_label = QtWidgets.QLabel("Sessions:")
+        layout.addWidget(sessions_label)
+        sessions_layout = QtWidgets.QFormLayout()
+        parallel_sessions_input = QtWidgets.QSpinBox()
+        parallel_sessions_input.setRange(1, 16)
+        parallel_sessions_input.setValue(self.max_parallel_sessions)
+        sessions_layout.addRow("Sessions generating at once:", parallel_sessions_input)
+        offload_input = QtWidgets.QSpinBox()
+        offload_input.setRange(0, 1440)
+        offload_input.setValue(self.session_offload_minutes)
+        sessions_layout.addRow("Offload idle sessions after (minutes, 0 for never):", offload_input)
+        layout.addLayout(sessions_layout)
+
+        # Model routing
+        routing_input = QtWidgets.QCheckBox("Route requests to a model tier by kind, escalating failures to the model above")
+        routing_input.setChecked(self.routing_enabled)
+        layout.addWidget(routing_input)
+        routing_layout = QtWidgets.QGridLayout()
+        for column, title in enumerate(("Tier", "Model", "Temperature", "Max tokens")):
+            routing_layout.addWidget(QtWidgets.QLabel(title), 0, column)
+        tier_inputs = {}
+        for row, kind in enumerate(TIER_KINDS, 1):
+            tier = self.routing_tiers[kind]
+            tier_model_input = QtWidgets.QLineEdit(tier.model)
+            tier_model_input.setPlaceholderText(self.model)
+            tier_temp_input = QtWidgets.QDoubleSpinBox()
+            tier_temp_input.setRange(0.0, 2.0)
+            tier_temp_input.setSingleStep(0.1)
+            tier_temp_input.setValue(tier.temperature)
+            tier_max_tokens_input = QtWidgets.QSpinBox()
+            tier_max_tokens_input.setRange(1, 32768)
+            tier_max_tokens_input.setValue(tier.max_tokens)
+            routing_layout.addWidget(QtWidgets.QLabel({"design": "New design", "edit": "Edit", "repair": "Repair"}[kind]), row, 0)
+            routing_layout.addWidget(tier_model_input, row, 1)
+            routing_layout.addWidget(tier_temp_input, row, 2)
+            routing_layout.addWidget(tier_max_tokens_input, row, 3)
+            tier_inputs[kind] = (tier_model_input, tier_temp_input, tier_max_tokens_input)
+        layout.addLayout(routing_layout)
+
+        # Metrics
+        metrics_input = QtWidgets.QCheckBox("Collect request and run metrics")
+        metrics_input.setChecked(self.metrics_enabled)
+        layout.addWidget(metrics_input)
+        metrics_file_input = QtWidgets.QLineEdit(self.metrics_file)
+        metrics_file_input.setPlaceholderText("Metrics file (JSONL), empty for none")
+        layout.addWidget(metrics_file_input)
+
         # Save Folder Selection
         save_folder_button = QtWidgets.QPushButton("Select Save Folder")
         save_folder_label = QtWidgets.QLabel(self.save_folder)
@@ -182,6 +837,10 @@ class AI3DGeneratorWidget(QtWidgets.QWidget):
         
         save_folder_button.clicked.connect(select_save_folder)
 
+        export_button = QtWidgets.QPushButton("Export Session Reports")
+        export_button.clicked.connect(self.export_session)
+        layout.addWidget(export_button)
+
         # API Key
         api_key_label = QtWidgets.QLabel("API Key:")
         layout.addWidget(api_key_label)
@@ -196,14 +855,126 @@ class AI3DGeneratorWidget(QtWidgets.QWidget):
             self.model = model_input.text()
             self.temperature = temp_input.value()
             self.max_tokens = max_tokens_input.value()
+            self.context_token_budget = budget_input.value()
+            self.context.token_budget = self.context_token_budget
+            self.references_enabled = references_checkbox.isChecked()
+            self.references_token_budget = references_budget_input.value()
+            self.references_top_k = references_top_k_input.value()
+            self.request_timeout = float(timeout_input.value())
+            self.api_max_retries = retries_input.value()
+            self.api_max_concurrency = concurrency_input.value()
+            self.stream = stream_input.isChecked()
+            self.cache_mode = CACHE_MODES[cache_input.currentIndex()]
+            sandbox_settings = (self.sandbox_timeout, self.sandbox_memory_mb, self.sandbox_workers, self.freecadcmd_path)
+            export_settings = (self.export_workers, self.sandbox_memory_mb, self.freecadcmd_path)
+            self.execution_mode = EXECUTION_MODES[execution_input.currentIndex()]
+            self.sandbox_timeout = float(sandbox_timeout_input.value())
+            self.sandbox_memory_mb = sandbox_memory_input.value()
+            self.sandbox_workers = sandbox_workers_input.value()
+            self.freecadcmd_path = freecadcmd_input.text()
+            self.validation_enabled = validation_input.isChecked()
+            self.incremental_enabled = incremental_input.isChecked()
+            geometry_settings = (self.geometry_cache_enabled, self.geometry_cache_mb)
+            self.geometry_cache_enabled = geometry_cache_input.isChecked()
+            self.geometry_cache_mb = geometry_cache_size_input.value()
+            self.repair_mode = REPAIR_MODES[repair_input.currentIndex()]
+            self.repair_format = REPAIR_FORMATS[repair_format_input.currentIndex()]
+            self.repair_candidates = repair_candidates_input.value()
+            self.repair_max_rounds = repair_rounds_input.value()
+            self.repair_time_budget = float(repair_budget_input.value())
+            self.max_parallel_sessions = parallel_sessions_input.value()
+            self.session_offload_minutes = offload_input.value()
+            self.routing_enabled = routing_input.isChecked()
+            self.routing_tiers = {kind: Tier(kind, inputs[0].text().strip(), inputs[1].value(), inputs[2].value())
+                                  for kind, inputs in tier_inputs.items()}
+            self.metrics_enabled = metrics_input.isChecked()
+            self.metrics_file = metrics_file_input.text().strip()
+            self.export_enabled = export_input.isChecked()
+            self.export_formats = [fmt for fmt, checkbox in export_format_inputs.items() if checkbox.isChecked()]
+            self.export_thumbnail_size = export_thumbnail_input.value()
+            self.export_deflection = export_deflection_input.value()
+            self.export_workers = export_workers_input.value()
+            self.metrics.enabled = self.metrics_enabled
+            self.metrics.set_path(self.metrics_file or None)
             self.api_key = api_key_input.text()
             self.settings.setValue("pre_prompt", self.pre_prompt)
             self.settings.setValue("model", self.model)
             self.settings.setValue("temperature", self.temperature)
             self.settings.setValue("max_tokens", self.max_tokens)
+            self.settings.setValue("context_token_budget", self.context_token_budget)
+            self.settings.setValue("references_enabled", self.references_enabled)
+            self.settings.setValue("references_token_budget", self.references_token_budget)
+            self.settings.setValue("references_top_k", self.references_top_k)
+            self.settings.setValue("request_timeout", self.request_timeout)
+            self.settings.setValue("api_max_retries", self.api_max_retries)
+            self.settings.setValue("api_max_concurrency", self.api_max_concurrency)
+            self.settings.setValue("stream", self.stream)
+            self.settings.setValue("cache_mode", self.cache_mode)
+            self.settings.setValue("execution_mode", self.execution_mode)
+            self.settings.setValue("sandbox_timeout", self.sandbox_timeout)
+            self.settings.setValue("sandbox_memory_mb", self.sandbox_memory_mb)
+            self.settings.setValue("sandbox_workers", self.sandbox_workers)
+            self.settings.setValue("freecadcmd_path", self.freecadcmd_path)
+            self.settings.setValue("validation_enabled", self.validation_enabled)
+            self.settings.setValue("incremental_enabled", self.incremental_enabled)
+            self.settings.setValue("geometry_cache_enabled", self.geometry_cache_enabled)
+            self.settings.setValue("geometry_cache_mb", self.geometry_cache_mb)
+            self.settings.setValue("repair_mode", self.repair_mode)
+            self.settings.setValue("repair_format", self.repair_format)
+            self.settings.setValue("repair_candidates", self.repair_candidates)
+            self.settings.setValue("repair_max_rounds", self.repair_max_rounds)
+            self.settings.setValue("repair_time_budget", self.repair_time_budget)
+            self.settings.setValue("max_parallel_sessions", self.max_parallel_sessions)
+            self.settings.setValue("session_offload_minutes", self.session_offload_minutes)
+            self.settings.setValue("routing_enabled", self.routing_enabled)
+            for kind, tier in self.routing_tiers.items():
+                self.settings.setValue(f"tier_{kind}_model", tier.model)
+                self.settings.setValue(f"tier_{kind}_temperature", tier.temperature)
+                self.settings.setValue(f"tier_{kind}_max_tokens", tier.max_tokens)
+            self.settings.setValue("metrics_enabled", self.metrics_enabled)
+            self.settings.setValue("metrics_file", self.metrics_file)
+            self.settings.setValue("export_enabled", self.export_enabled)
+            self.settings.setValue("export_formats", ",".join(self.export_formats))
+            self.settings.setValue("export_thumbnail_size", self.export_thumbnail_size)
+            self.settings.setValue("export_deflection", self.export_deflection)
+            self.settings.setValue("export_workers", self.export_workers)
             self.settings.setValue("api_key", self.api_key)
+            # Restart the sandbox workers with the new limits
+            if self.script_executor is not None and sandbox_settings != (self.sandbox_timeout, self.sandbox_memory_mb, self.sandbox_workers, self.freecadcmd_path):
+                self.script_executor.shutdown()
+                self.script_executor = None
+            if self.execution_mode == EXECUTION_SANDBOX:
+                self.get_script_executor()
+            # Restart the export workers with the new limits, exports in flight are lost
+            if self.export_pipeline is not None and export_settings != (self.export_workers, self.sandbox_memory_mb, self.freecadcmd_path):
+                self.export_pipeline.shutdown()
+                self.export_pipeline = None
+            self.export_engine.pool.setMaxThreadCount(self.export_workers)
+            if self.export_pipeline is not None:
+                self.export_pipeline.folder = os.path.join(self.save_folder, EXPORT_FOLDER)
+                self.export_pipeline.formats = tuple(self.export_formats)
+                self.export_pipeline.thumbnail_size = self.export_thumbnail_size
+                self.export_pipeline.deflection = self.export_deflection
+            if self.save_folder != self.settings.value("save_folder") \
+                    or geometry_settings != (self.geometry_cache_enabled, self.geometry_cache_mb):
+                self.geometry_cache.close()
+                self.geometry_cache = self.open_geometry_cache()
+            if self.save_folder != self.settings.value("save_folder"):
+                self.response_cache.close()
+                self.response_cache = self.open_response_cache()
+                self.snippet_index = None
+                self.symbol_table = None
+                # Keep the conversation, but record the rest of the session in the new folder
+                self.reload_history()
+                self.start_session()
+                self.session_store.record_messages(self.conversation_history)
             self.settings.setValue("save_folder", self.save_folder)
+            if self.stats_panel is not None:
+                self.stats_panel.folder = self.save_folder
+                self.stats_panel.refresh()
+            self.configure_ai_client()
             self.toggle_chat_input(bool(self.api_key))
+            self.settings_saved.emit()
             dialog.accept()
 
         save_button = QtWidgets.QPushButton("Save")
@@ -212,148 +983,955 @@ class AI3DGeneratorWidget(QtWidgets.QWidget):
         dialog.setLayout(layout)
         dialog.exec_()
 
+    def open_session_settings(self):
+        """
+        Open the dialog of the session: its name, the model, temperature and max tokens
+        used instead of the settings, and the FreeCAD document its scripts run in.
+        """
+        dialog = QtWidgets.QDialog(self)
+        dialog.setWindowTitle("Session")
+        layout = QtWidgets.QFormLayout(dialog)
+        name_input = QtWidgets.QLineEdit(self.session_name)
+        layout.addRow("Name:", name_input)
+        model_input = QtWidgets.QLineEdit(self.overrides.get("model", ""))
+        model_input.setPlaceholderText(self.model)
+        layout.addRow("Model:", model_input)
+        temp_input = QtWidgets.QDoubleSpinBox()
+        temp_input.setRange(-0.1, 2.0)
+        temp_input.setSingleStep(0.1)
+        temp_input.setSpecialValueText(f"Settings ({self.temperature:g})")  # Shown for the minimum, -0.1
+        temp_input.setValue(self.overrides.get("temperature", -0.1))
+        layout.addRow("Temperature:", temp_input)
+        max_tokens_input = QtWidgets.QSpinBox()
+        max_tokens_input.setRange(0, 4096)
+        max_tokens_input.setSpecialValueText(f"Settings ({self.max_tokens})")
+        max_tokens_input.setValue(self.overrides.get("max_tokens", 0))
+        layout.addRow("Max Tokens:", max_tokens_input)
+        document_input = QtWidgets.QComboBox()
+        document_input.setEditable(True)
+        document_input.addItem("Active document", "")
+        for name in FreeCAD.listDocuments():
+            document_input.addItem(name, name)
+        index = document_input.findData(self.target_document)
+        if index >= 0:
+            document_input.setCurrentIndex(index)
+        else:
+            document_input.setEditText(self.target_document)
+        document_input.lineEdit().setPlaceholderText("A new document is created if needed")
+        layout.addRow("Target document:", document_input)
+
+        def save_session():
+            self.session_name = name_input.text().strip() or self.session_name
+            self.overrides = {}
+            if model_input.text().strip():
+                self.overrides["model"] = model_input.text().strip()
+            if temp_input.value() >= 0:
+                self.overrides["temperature"] = temp_input.value()
+            if max_tokens_input.value() > 0:
+                self.overrides["max_tokens"] = max_tokens_input.value()
+            text = document_input.currentText().strip()
+            index = document_input.findText(text)
+            self.target_document = (document_input.itemData(index) if index >= 0 else text) or ""
+            self.configure_ai_client()
+            self.session_changed.emit()
+            dialog.accept()
+
+        save_button = QtWidgets.QPushButton("Save")
+        save_button.clicked.connect(save_session)
+        layout.addRow(save_button)
+        dialog.exec_()
+
+    def activate_target_document(self):
+        """
+        Make the target document of the session the active document, creating it if it
+        is not open. Without a target document, the active document is left as is.
+
+        Returns:
+            App.Document: The active document, or None.
+        """
+        if self.target_document:
+            if self.target_document not in FreeCAD.listDocuments():
+                self.target_document = FreeCAD.newDocument(self.target_document).Name
+            FreeCAD.setActiveDocument(self.target_document)
+        return FreeCAD.ActiveDocument
+
     def prompt_ai(self):
         """
         Prompt the AI model with the user's message and display the response.
-        If the response contains code, display the reasoning and code separately.
+        The request runs in the background; the response is handled by handle_ai_response.
         If the response is empty, display an error message.
         If the response is successful, add the message to the conversation history.
         """
         user_message = self.prompt_input.toPlainText()
-        if user_message:
+        if user_message and not self.request_engine.is_busy() and not self.queued:
+            self.reload_history()
             self.chat_window.add_message("User", user_message, is_user=True)
             self.prompt_input.clear()
             if not self.conversation_history:
                 self.conversation_history.append({"role": "system", "content": self.pre_prompt})
 
             self.conversation_history.append({"role": "user", "content": user_message})
-            self.chat_window.add_message("AI", "AI is thinking...", is_user=False)
+            self.session_store.record_messages(self.conversation_history)
+            self._thinking_index = self.chat_window.add_message("AI", "AI is thinking...", is_user=False)
+
+            self.code_tier = None
+            self._tier_script = None
+            self.start_generation()
 
-            QtCore.QTimer.singleShot(100, self.get_ai_response_thread)
+    def start_generation(self, tier=None):
+        """ Answer the last prompt, at once or when the scheduler gives the session a generation slot. """
+        if self.scheduler is not None:
+            # Wait for a free slot when other sessions are already generating
+            self.scheduler.request_slot(self, lambda: self.get_ai_response_thread(tier))
+        else:
+            self.get_ai_response_thread(tier)
+
+    def get_ai_response_thread(self, tier=None):
+        """
+        Run the AI request on a background thread to avoid blocking the UI.
+        Only the token-budgeted context built from the conversation history is sent.
 
-    def get_ai_response_thread(self):
-        """ Run the AI response in a separate thread to avoid blocking the UI. !FIXME: This method is not working as expected. """
-        response = self.get_openai_response(self.conversation_history)
+        Args:
+            tier (Tier): The model tier answering the prompt; by default the tier of its kind.
+        """
+        if tier is None:
+            tier = self.model_router.route(classify(self.conversation_history))
+        self._request_tier = tier
+        messages, stats = self.context.build(self.conversation_history)
+        self.prepare_snippet_index()
+        query = self.conversation_history[-1]["content"]
+        self.show_context_stats(stats)
+        self._context_stats = stats
+        stream = self.stream
+        self._stream_parser = FencedBlockParser()
+        self._stream_text_index = None
+        self._stream_code_index = None
+        self._stream_has_code = False
+        self.request_engine.submit(
+            lambda request: self.get_openai_response(self.add_references(messages, query, request), request,
+                                                     stream=stream, tier=tier),
+            timeout=self.request_timeout,
+            on_finished=self.handle_ai_response,
+            on_failed=self.handle_ai_error,
+            on_progress=self.handle_ai_chunk
+        )
+
+    def show_context_stats(self, stats):
+        """ Show the prompt token count of the request next to the size of the full history. """
+        text = f"Prompt: {stats['tokens']} tokens (full history: {stats['full_tokens']})"
+        if stats["omitted_code"]:
+            text += f", {stats['omitted_code']} old code revisions omitted"
+        if stats["dropped"]:
+            text += f", {stats['dropped']} older messages summarized"
+        if stats.get("references"):
+            text += f", {stats['references']} tokens of API references"
+        self.status_label.setText(text)
+        FreeCAD.Console.PrintLog(f"AI3DGenerator: {text}\n")
+
+    def show_reference_stats(self, request):
+        """ Add the API references sent with a completed request, searched on its worker thread, to the context stats. """
+        references = request.info.get("reference_tokens")
+        if references:
+            self._context_stats["references"] = references
+            self._context_stats["tokens"] += references
+            self.show_context_stats(self._context_stats)
+
+    def show_usage(self, request):
+        """ Show the token usage reported by the API for a completed request. """
+        usage = request.info.get("usage")
+        if usage:
+            self.status_label.setText(
+                f"{self.status_label.text()} | API usage: {usage.get('prompt_tokens')} prompt + "
+                f"{usage.get('completion_tokens')} completion tokens"
+            )
+
+    def handle_ai_chunk(self, request, chunk):
+        """
+        Render a streamed chunk of the AI response.
+        Reasoning goes to the current chat bubble and code goes live into the code editor.
+        """
+        self.render_stream_events(self._stream_parser.feed(chunk))
+
+    def render_stream_events(self, events):
+        """ Route the events of the streaming parser to the chat window and the code editor. """
+        for kind, text in events:
+            if kind == "text":
+                if self._stream_text_index is None:
+                    if self._thinking_index is not None:
+                        # The first reasoning tokens replace the "AI is thinking..." bubble
+                        self._stream_text_index = self._thinking_index
+                        self._thinking_index = None
+                        self.chat_window.set_message_text(self._stream_text_index, text.lstrip())
+                        continue
+                    if not text.strip():
+                        continue
+                    self._stream_text_index = self.chat_window.add_message("AI (Reasoning)", text.lstrip())
+                else:
+                    self.chat_window.append_to_message(self._stream_text_index, text)
+            elif kind == "code_start":
+                self._stream_text_index = None
+                self._stream_code_index = self.chat_window.add_message("AI (Code)", "")
+                if is_code_language(text):
+                    if self._stream_has_code:
+                        self.code_editor.moveCursor(QtGui.QTextCursor.End)
+                        self.code_editor.insertPlainText("\n\n")
+                    else:
+                        self.code_editor.clear()
+                    self._stream_has_code = True
+            elif kind == "code":
+                self.chat_window.append_to_message(self._stream_code_index, text)
+                if is_code_language(self._stream_parser.language):
+                    self.code_editor.moveCursor(QtGui.QTextCursor.End)
+                    self.code_editor.insertPlainText(text)
+            elif kind == "code_end":
+                self._stream_code_index = None
+
+    def handle_ai_response(self, request, response):
+        """ Display the AI response once the background request has completed. """
+        self.show_reference_stats(request)
+        self.show_usage(request)
+        parse_time = None
         if response:
-            self.conversation_history.append({"role": "assistant", "content": response})
+            parse_start = time.perf_counter()
             reasoning, code = self.extract_reasoning_and_code(response)
-            self.chat_window.add_message("AI (Reasoning)", reasoning)
+            parse_time = time.perf_counter() - parse_start
+        self.record_request_metrics(REQUEST, request, response, self._context_stats["tokens"], parse_time)
+        if response:
+            self.code_tier, self._tier_script = self._request_tier, code
+        if response and request.info.get("streamed"):
+            self.render_stream_events(self._stream_parser.close())
+            self.conversation_history.append({"role": "assistant", "content": response})
+            self.session_store.record_messages(self.conversation_history)
+            if self._thinking_index is not None:
+                self.chat_window.set_message_text(self._thinking_index, reasoning)
+                self._thinking_index = None
+            self.code_editor.setPlainText(code)
+        elif response:
+            self.conversation_history.append({"role": "assistant", "content": response})
+            self.session_store.record_messages(self.conversation_history)
+            if self._thinking_index is not None:
+                # Not streamed, e.g. served from the cache: the reasoning replaces the "AI is thinking..." bubble
+                self.chat_window.set_message_text(self._thinking_index, reasoning)
+                self._thinking_index = None
+            else:
+                self.chat_window.add_message("AI (Reasoning)", reasoning)
             self.chat_window.add_message("AI (Code)", code)
             self.code_editor.setPlainText(code)
         else:
+            self._run_after_response = False
             self.chat_window.add_message("AI", "Failed to fetch response. Try again.", is_user=False)
+            self.restore_prompt()
+            return
+        self.report_cache_hit(request)
+        if self._run_after_response:
+            # The answer of an escalation after a failed run: run it like the failed script
+            self._run_after_response = False
+            self.run_script()
+        elif code and self.model_router.escalation(self.code_tier) is not None:
+            validation = self.validate_script(code, sandbox=self.execution_mode == EXECUTION_SANDBOX
+                                              and self.get_script_executor() is not None)
+            if validation is not None and not validation.ok:
+                self.record_tier_outcome(self.code_tier, False)
+                self.escalate(f"The script of {self.code_tier.model} failed the validation")
+
+    def escalate(self, reason, run=False):
+        """
+        Ask the strong tier to answer the last prompt again, after the script of a fast
+        tier failed the validation or its run. The failed answer is dropped from the
+        conversation.
+
+        Args:
+            reason (str): Why the script is not kept, shown in the chat.
+            run (bool): Run the script of the strong tier as soon as it arrives.
+
+        Returns:
+            bool: True if the request was sent to the strong tier.
+        """
+        tier = self.model_router.escalation(self.code_tier)
+        history = self.conversation_history
+        if tier is None or self.request_engine.is_busy() or self.queued or not history \
+                or history[-1]["role"] != "assistant":
+            return False
+        history.pop()
+        self.session_store.record_messages(history)
+        self.code_tier = None
+        self._tier_script = None
+        self._run_after_response = run
+        self.chat_window.add_message("AI", f"{reason}, asking {tier.model} instead...", is_user=False)
+        self._thinking_index = self.chat_window.add_message("AI", "AI is thinking...", is_user=False)
+        self.start_generation(tier)
+        return True
+
+    def record_tier_outcome(self, tier, ok):
+        """ Record whether the script written by a model tier ran, for the per-tier statistics. """
+        if tier is not None and self.model_router.enabled:
+            self.metrics.record(ROUTE, ok=ok, tier=tier.name, model=tier.model)
+
+    def report_cache_hit(self, request):
+        """ Tell the user when a response was served from the cache. """
+        if request.info.get("cache_hit"):
+            elapsed = (time.monotonic() - request.submitted_at) * 1000
+            self.chat_window.add_message("AI (Cache)", f"Response served from the cache in {elapsed:.0f} ms.", is_user=False)
+
+    def handle_ai_error(self, request, message, restore=True):
+        """ Report a failed or timed out background request, restoring the prompt of a chat request. """
+        self.record_request_metrics(REQUEST, request, None)
+        FreeCAD.Console.PrintError(f"Error fetching response: {message}\n")
+        self.chat_window.add_message("AI", f"Failed to fetch response: {message.strip().splitlines()[-1]} Try again.", is_user=False)
+        if restore:
+            self.restore_prompt()
+
+    def restore_prompt(self):
+        """
+        Put the unanswered prompt back in the chat input after a failed request,
+        so it can be sent again without retyping it.
+        """
+        history = self.conversation_history
+        if history and history[-1]["role"] == "user" and not self.prompt_input.toPlainText():
+            self.prompt_input.setPlainText(history.pop()["content"])
+            self.session_store.record_messages(history)
+
+    def record_request_metrics(self, kind, request, response, prompt_tokens=None, parse_time=None, **values):
+        """
+        Record the stages of a completed AI request: the time spent in the queue, to the
+        first token, in the API call and in total, the parse time, the tokens and cache hits.
+        Completion tokens are estimated when the API does not report them (streamed responses).
+        With model routing, the tier of the request is recorded, and whether it was escalated.
+        """
+        if not self.metrics.enabled:
+            return
+        now = time.monotonic()
+        info = request.info
+        # Routed requests only reach the strong tier by escalation
+        tier = info.get("tier") if self.model_router.enabled else None
+        started = request.started_at if request.started_at is not None else now
+        usage = info.get("usage") or {}
+        completion_tokens = usage.get("completion_tokens")
+        if completion_tokens is None and response:
+            completion_tokens = count_tokens(response)
+        self.metrics.record(
+            kind,
+            ok=bool(response),
+            model=info.get("model", self.ai_client.model),
+            tier=tier,
+            escalated=True if tier == STRONG else None,
+            cache_hit=bool(info.get("cache_hit")),
+            streamed=bool(info.get("streamed")),
+            queue_ms=(started - request.submitted_at) * 1000,
+            ttft_ms=(info["first_token_at"] - request.submitted_at) * 1000 if "first_token_at" in info else None,
+            api_ms=(info.get("finished_at", now) - started) * 1000,
+            parse_ms=parse_time * 1000 if parse_time is not None else None,
+            latency_ms=(now - request.submitted_at) * 1000,
+            prompt_tokens=usage.get("prompt_tokens", prompt_tokens),
+            completion_tokens=completion_tokens,
+            retries=info.get("retries"),
+            **values
+        )
 
     def extract_reasoning_and_code(self, response):
-        """ Extract the reasoning and code from the AI response. """
-        reasoning = response.split("```python")[0]
-        code = response.split("```python")[1].split("```")[0] if "```python" in response else response
-        return reasoning.strip(), code.strip()
-
-    def get_openai_response(self, conversation_history):
-        """ Get the response from the OpenAI API based on the conversation history. """
-        openai.api_key = self.api_key
-        try:
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=conversation_history,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens
-            )
-            return response['choices'][0]['message']['content'].strip()
-        except Exception as e:
-            FreeCAD.Console.PrintError(f"Error fetching response: {str(e)}\n")
-            return None
+        """
+        Extract the reasoning and code from the AI response.
+        When the response holds several code blocks, they are joined in order.
+        """
+        return extract_reasoning_and_code(response)
+
+    def get_openai_response(self, conversation_history, request=None, stream=False, use_cache=True, temperature=None,
+                            tier=None):
+        """
+        Get the response from the OpenAI API based on the conversation history.
+        This is a blocking call; it is meant to run on a RequestEngine worker thread.
+        Responses are looked up in and stored to the response cache, according to the cache mode.
+
+        Args:
+            conversation_history (list): The messages to send.
+            request (Request): The background request handle, used for its timeout and cancellation.
+            stream (bool): Stream the response, sending each chunk through request.emit_progress.
+            use_cache (bool): Set to False to bypass the response cache for this call.
+            temperature (float): Overrides the temperature setting for this call.
+            tier (Tier): The model tier to send the request to, with its temperature and max tokens,
+                instead of the model of the settings.
+        """
+        if tier is None:
+            return self.ai_client.complete(conversation_history, request, stream=stream, use_cache=use_cache,
+                                           temperature=temperature)
+        if request is not None:
+            request.info.update(tier=tier.name, model=tier.model)
+        return self.ai_client.complete(conversation_history, request, stream=stream, use_cache=use_cache,
+                                       temperature=tier.temperature if temperature is None else temperature,
+                                       model=tier.model, max_tokens=tier.max_tokens)
 
     def run_script(self):
         """
-        Run the generated script and save it to a file.
+        Run the generated script and record the run in the session.
         If the script is empty or the save folder is not selected, display an error message.
-        If an error occurs while running the script, save the error traceback to a file and offer debugging options.
+        If an error occurs while running the script, record the error traceback and offer debugging options.
         """
         script = self.code_editor.toPlainText()
-        chat_history = "\n".join([f"{msg['role']}: {msg['content']}" for msg in self.conversation_history])
+        # The tier that wrote the script, unless the user edited it
+        tier = self.code_tier if script == self._tier_script else None
         if script and self.save_folder:
-            try:
-                exec(script, globals())
-                filename = f"AI3DGenerator_{time.strftime('%Y%m%d-%H%M%S')}.md"
-                save_path = os.path.join(self.save_folder, filename)
-                with open(save_path, 'w') as file:
-                    file.write(f"# Script generated by AI3DGenerator\n\n")
-                    file.write(f"## Run Date: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-                    file.write(f"## Settings:\n\n- Model: {self.model}\n- Temperature: {self.temperature}\n- Max Tokens: {self.max_tokens}\n\n")
-                    file.write(f"## Chat history:\n{chat_history}\n\n")
-                FreeCAD.Console.PrintMessage(f"Script saved as {save_path}\n")
-                if FreeCADGui.ActiveDocument:
-                    view = FreeCADGui.ActiveDocument.ActiveView
-                    view.setCameraType("Perspective")
-                    view.viewAxometric()
-                    view.fitAll()
-            except Exception as e:
-                error_traceback = traceback.format_exc()
-                filename = f"AI3DGenerator_{time.strftime('%Y%m%d-%H%M%S')}_error.md"
-                save_path = os.path.join(self.save_folder, filename)
-                with open(save_path, 'w') as file:
-                    file.write(f"# Script generated by AI3DGenerator\n\n")
-                    file.write(f"## Run Date: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-                    file.write(f"## Settings:\n\n- Model: {self.model}\n- Temperature: {self.temperature}\n- Max Tokens: {self.max_tokens}\n\n")
-                    file.write(f"# Chat history:\n{chat_history}\n\n")
-                    file.write(f"\n\n# Error running script:\n{error_traceback}")
-                FreeCAD.Console.PrintError(f"Error running script:\n{error_traceback}")
-                self.start_debugging_loop(error_traceback, script)
+            self.execute_script(
+                script,
+                on_success=lambda: self.on_script_succeeded(script, tier),
+                on_failure=lambda error_traceback: self.on_script_failed(script, error_traceback, tier)
+            )
         else:
             FreeCAD.Console.PrintError("Please paste a script and select a save folder.\n")
 
+    def execute_script(self, script, on_success, on_failure):
+        """
+        Execute a script with the configured backend.
+
+        In-process mode runs the script inside FreeCAD. Sandbox mode runs it in a
+        FreeCADCmd worker in the background, then merges the resulting document
+        into the active document. Falls back to in-process if FreeCADCmd is missing.
+        Either way, a script failing the static validation is reported without running,
+        and the document of a script that already ran is restored from the geometry
+        cache instead. A restored script does not define its variables in FreeCAD.
+        The script runs in the target document of the session, if it has one.
+        In incremental mode, a revision of the last script run inside FreeCAD only
+        re-runs the steps that changed (see run_incremental).
+
+        Args:
+            script (str): The script to execute.
+            on_success (callable): Called without arguments when the script ran.
+            on_failure (callable): Called with the error traceback when the script failed.
+        """
+        self.activate_target_document()
+        executor = self.get_script_executor() if self.execution_mode == EXECUTION_SANDBOX else None
+        mode = EXECUTION_SANDBOX if executor is not None else EXECUTION_IN_PROCESS
+        validation = self.validate_script(script, sandbox=executor is not None)
+        validate_ms = validation.elapsed * 1000 if validation is not None else None
+        if validation is not None and not validation.ok:
+            self.metrics.record(RUN, ok=False, mode=mode, validate_ms=validate_ms)
+            on_failure(validation.format())
+            return
+        incremental = executor is None and self.incremental_enabled and self.incremental_runner is not None
+        geometry_key = self.geometry_key(script, mode)
+        # Revising the last run in place beats restoring a copy of the whole document next to it
+        if not (incremental and self.incremental_runner.revises(script)) \
+                and self.restore_geometry(geometry_key, mode, validate_ms):
+            on_success()
+            return
+        if incremental:
+            self.run_incremental(script, on_success, on_failure, validate_ms, geometry_key)
+            return
+        if self.incremental_runner is not None:
+            self.incremental_runner.reset()  # This run is not tracked step by step
+        if executor is not None:
+            self.chat_window.add_message("AI", "Running the script in the sandbox...", is_user=False)
+            self.request_engine.submit(
+                lambda request: executor.execute(script, cancel_event=request.cancel_event),
+                on_finished=lambda request, result: self.handle_execution_result(result, on_success, on_failure, request,
+                                                                                 validate_ms, geometry_key),
+                on_failed=lambda request, message: on_failure(message)
+            )
+            return
+        documents = set(FreeCAD.listDocuments())
+        start = time.perf_counter()
+        try:
+            exec(script, globals())
+            exec_time = time.perf_counter() - start
+            # Bring the document up to date, most scripts recompute it themselves and this is then a no-op
+            recompute_start = time.perf_counter()
+            if FreeCAD.ActiveDocument is not None:
+                FreeCAD.ActiveDocument.recompute()
+            recompute_time = time.perf_counter() - recompute_start
+        except Exception:
+            self.metrics.record(RUN, ok=False, mode=EXECUTION_IN_PROCESS, validate_ms=validate_ms,
+                                exec_ms=(time.perf_counter() - start) * 1000)
+            on_failure(traceback.format_exc())
+            return
+        total_time = time.perf_counter() - start
+        self.metrics.record(RUN, ok=True, mode=EXECUTION_IN_PROCESS, validate_ms=validate_ms, exec_ms=exec_time * 1000,
+                            recompute_ms=recompute_time * 1000, total_ms=total_time * 1000)
+        self.store_geometry(geometry_key, documents, total_time)
+        on_success()
+
+    def run_incremental(self, script, on_success, on_failure, validate_ms=None, geometry_key=None):
+        """
+        Run a script inside FreeCAD step by step, each step in its own transaction.
+        If it revises the last script run this way, the steps shared with it are kept
+        and only the changed suffix is undone and run again. A failing run is undone.
+        """
+        documents = set(FreeCAD.listDocuments())
+        result = self.incremental_runner.run(script, globals())
+        values = {"mode": EXECUTION_IN_PROCESS, "validate_ms": validate_ms, "steps": result.steps,
+                  "steps_run": result.steps_run, "exec_ms": (result.elapsed - result.recompute_elapsed) * 1000,
+                  "recompute_ms": result.recompute_elapsed * 1000, "total_ms": result.elapsed * 1000}
+        if not result.ok:
+            self.metrics.record(RUN, ok=False, **values)
+            on_failure(result.traceback)
+            return
+        self.metrics.record(RUN, ok=True, **values)
+        if result.first_step:
+            self.chat_window.add_message("AI", f"Re-ran {result.steps_run} of {result.steps} steps in {result.elapsed:.2f} s, "
+                                               f"reusing the first {result.first_step}.", is_user=False)
+        else:
+            self.store_geometry(geometry_key, documents, result.elapsed)
+        on_success()
+
+    def geometry_key(self, script, mode):
+        """ Return the geometry cache key of a script run in the given mode, or None if it is not cached. """
+        if not self.geometry_cache.enabled:
+            return None
+        return self.geometry_cache.make_key(script, mode)
+
+    def restore_geometry(self, key, mode, validate_ms=None):
+        """
+        Merge the document cached for a script into FreeCAD, like a run would have built it.
+
+        Returns:
+            bool: True if the document was restored, False on a cache miss or failure.
+        """
+        entry = self.geometry_cache.get(key)
+        if entry is None:
+            return False
+        start = time.perf_counter()
+        try:
+            if entry.document:
+                document = FreeCAD.newDocument(entry.document)
+            else:
+                document = FreeCAD.ActiveDocument or FreeCAD.newDocument("AI3DGenerator")
+            # The shapes are restored from their BREP data, so there is nothing to recompute
+            document.mergeProject(entry.path)
+            if self.incremental_runner is not None:
+                self.incremental_runner.reset()
+        except Exception:
+            FreeCAD.Console.PrintWarning(f"Geometry cache entry could not be restored, running the script:\n{traceback.format_exc()}")
+            return False
+        restore_time = time.perf_counter() - start
+        self.metrics.record(RUN, ok=True, mode=mode, cache_hit=True, validate_ms=validate_ms,
+                            restore_ms=restore_time * 1000, total_ms=restore_time * 1000)
+        self.chat_window.add_message("AI", f"Restored {len(entry.objects)} objects from the geometry cache in "
+                                           f"{restore_time:.2f} s (the script took {entry.build_elapsed:.2f} s).", is_user=False)
+        return True
+
+    def store_geometry(self, key, documents, elapsed):
+        """
+        Cache the document created by a script run inside FreeCAD. Scripts that changed
+        documents that existed before they ran depend on them, and are not cached.
+
+        Args:
+            key (str): The geometry cache key of the script, or None.
+            documents (set): The names of the documents open before the run.
+            elapsed (float): The duration of the run, in seconds.
+        """
+        if key is None or elapsed < self.geometry_cache.min_elapsed:
+            return
+        created = set(FreeCAD.listDocuments()) - documents
+        document = FreeCAD.ActiveDocument
+        if len(created) != 1 or document is None or document.Name not in created:
+            return
+        path = os.path.join(self.geometry_cache.folder, f"{key}.tmp.FCStd")
+        try:
+            document.saveCopy(path)
+            self.geometry_cache.put(key, path, [obj.Name for obj in document.Objects], document.Name, elapsed)
+        except Exception as e:
+            FreeCAD.Console.PrintWarning(f"Geometry not cached: {e}\n")
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def handle_execution_result(self, result, on_success, on_failure, request=None, validate_ms=None, geometry_key=None):
+        """
+        Bring the document built by a sandbox worker into FreeCAD, or report its failure.
+
+        Args:
+            request (Request): The request that ran the script, for its queue and total time.
+            validate_ms (float): The duration of the static validation of the script, if any.
+            geometry_key (str): The geometry cache key the resulting document is stored under, if any.
+        """
+        values = {"mode": EXECUTION_SANDBOX, "exec_ms": (result.elapsed - result.recompute_elapsed) * 1000,
+                  "recompute_ms": result.recompute_elapsed * 1000, "validate_ms": validate_ms}
+        if request is not None:
+            values["queue_ms"] = ((request.started_at or request.submitted_at) - request.submitted_at) * 1000
+            values["total_ms"] = (time.monotonic() - request.submitted_at) * 1000
+        if not result.ok:
+            self.metrics.record(RUN, ok=False, **values)
+            on_failure(result.traceback)
+            return
+        self.geometry_cache.put(geometry_key, result.output_path, result.objects, "", result.elapsed)
+        merge_start = time.perf_counter()
+        try:
+            # Other sessions may have changed the active document while the script ran
+            document = self.activate_target_document() or FreeCAD.newDocument("AI3DGenerator")
+            document.mergeProject(result.output_path)
+            document.recompute()
+            if self.incremental_runner is not None:
+                self.incremental_runner.reset()
+        except Exception:
+            self.metrics.record(RUN, ok=False, **values)
+            on_failure(traceback.format_exc())
+            return
+        finally:
+            if result.output_path and os.path.exists(result.output_path):
+                os.remove(result.output_path)
+        self.metrics.record(RUN, ok=True, merge_ms=(time.perf_counter() - merge_start) * 1000, **values)
+        FreeCAD.Console.PrintMessage(f"Sandboxed script ran in {result.elapsed:.2f} s\n")
+        on_success()
+
+    def on_script_succeeded(self, script, tier=None):
+        """
+        Record the successful run in the session and fit the view on the result.
+        The first run of the script of a model tier is recorded in the per-tier statistics.
+        """
+        self.record_first_outcome(tier, True)
+        used = tier or self.model_router.strong
+        run = self.session_store.record_run(self.conversation_history, script, used.model, used.temperature, used.max_tokens)
+        FreeCAD.Console.PrintMessage(f"Script run recorded in {self.session_store.path}\n")
+        if FreeCADGui.ActiveDocument:
+            view = FreeCADGui.ActiveDocument.ActiveView
+            view.setCameraType("Perspective")
+            view.viewAxometric()
+            view.fitAll()
+        if self.export_enabled:
+            self.start_export(run)
+
+    def start_export(self, run):
+        """
+        Export the result of a run in the background, and attach the files and the
+        thumbnail to the run in the session when they are written. Only the shapes are
+        serialized here; the export workers tessellate and write the files, so the
+        session stays free for the next prompt. The export is skipped when too many
+        exports are already pending.
+
+        Args:
+            run (int): The number of the run in the session, as returned by record_run.
+        """
+        pipeline = self.get_export_pipeline()
+        document = FreeCAD.ActiveDocument
+        if pipeline is None or document is None:
+            return
+        # The session may be cleared before the export completes, keep the store of the run
+        store = self.session_store
+        try:
+            job = pipeline.prepare(document, f"AI3DGenerator_{store.session_id}_run{run}")
+        except Exception as e:
+            FreeCAD.Console.PrintWarning(f"The result could not be serialized for export: {e}\n")
+            return
+        if job is None:
+            FreeCAD.Console.PrintWarning("The result was not exported: it has no shape, or too many exports are pending.\n")
+            return
+
+        def finished(request, result):
+            pipeline.finished()
+            self.handle_export_result(store, run, job, result, request)
+
+        def failed(request, message):
+            pipeline.finished()
+            self.metrics.record(EXPORT, ok=False)
+            FreeCAD.Console.PrintWarning(f"Export of run {run} failed:\n{message}\n")
+
+        self.export_engine.submit(lambda request: pipeline.run(job, request.cancel_event),
+                                  on_finished=finished, on_failed=failed)
+
+    def handle_export_result(self, store, run, job, result, request):
+        """ Record the files and the thumbnail of a finished export in the session, and its metrics. """
+        self.metrics.record(
+            EXPORT, ok=result.ok, triangles=result.triangles or None,
+            queue_ms=((request.started_at or request.submitted_at) - request.submitted_at) * 1000,
+            serialize_ms=job["serialize_elapsed"] * 1000,
+            **{f"{stage}_ms": elapsed * 1000 for stage, elapsed in result.stages.items() if stage != "load"},
+            total_ms=(time.monotonic() - request.submitted_at) * 1000
+        )
+        if not result.ok:
+            FreeCAD.Console.PrintWarning(f"Export of run {run} failed:\n{result.traceback}\n")
+            return
+        store.record_artifacts(run, result.files, result.thumbnail or None)
+        FreeCAD.Console.PrintMessage(f"Exported run {run} in {result.elapsed:.2f} s: "
+                                     f"{', '.join(result.files.values()) or result.thumbnail}\n")
+
+    def on_script_failed(self, script, error_traceback, tier=None):
+        """
+        Record the failed run in the session and offer debugging options. The script of
+        a fast model tier is asked from the strong tier instead, and run again.
+        """
+        self.record_first_outcome(tier, False)
+        used = tier or self.model_router.strong
+        self.session_store.record_run(self.conversation_history, script, used.model,
+                                       used.temperature, used.max_tokens, error_traceback)
+        FreeCAD.Console.PrintError(f"Error running script:\n{error_traceback}")
+        if tier is not None and self.escalate(f"The script of {tier.model} failed", run=True):
+            return
+        self.start_debugging_loop(error_traceback, script)
+
+    def record_first_outcome(self, tier, ok):
+        """ Record the outcome of the first run of the script of a tier; later runs say nothing of the tier. """
+        if tier is not None and tier is self.code_tier and self._tier_script is not None:
+            self.record_tier_outcome(tier, ok)
+            if ok or self.model_router.escalation(tier) is None:
+                self._tier_script = None
+
     def start_debugging_loop(self, error_message, script):
         """ Start a debugging loop to fix the error in the script. """
         debug_button = QtWidgets.QPushButton("Debug")
-        debug_button.clicked.connect(lambda: self.run_debugging_loop(error_message, script))
+        debug_button.clicked.connect(lambda: self.debug_script(error_message, script))
         self.layout().addWidget(debug_button)
 
-    def run_debugging_loop(self, error_message, script):
-        """ Run the debugging loop to fix the error in the script. """
-        counter = 0
-        while True:
-            counter += 1
-            FreeCAD.Console.PrintError(f"Debugging loop iteration {counter}\n")
-            FreeCAD.Console.PrintError(f"Error message:\n{error_message}\n")
-            
-            # Ask user if they want to continue debugging
-            reply = QtWidgets.QMessageBox.question( 
-                None,
-                "Continue Debugging?",
-                f"Iteration {counter} failed. Do you want to continue debugging?\n\nError message:\n{error_message}",
-                QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No,
-                QtWidgets.QMessageBox.No
-            )
-            
-            if reply == QtWidgets.QMessageBox.No:
-                break  # Exit the loop if the user chooses 'No'
+    def debug_script(self, error_message, script):
+        """ Debug a failing script with the configured repair mode. """
+        self.prepare_snippet_index()
+        if self.repair_mode == REPAIR_PARALLEL:
+            self.run_parallel_repair(error_message, script)
+        else:
+            self.run_debugging_loop(error_message, script)
+
+    def request_fix(self, script, error_message, request, candidate=0):
+        """
+        Ask the AI for a fixed script. This is a blocking call meant for a worker thread.
+        Candidates after the first use a higher temperature and bypass the cache, so the
+        parallel repair gets different fixes. With the patch format, a patch that does
+        not apply is followed by a request for the full script. The first round asks
+        the repair tier, and the later rounds the strong tier.
+
+        Returns:
+            str: The fixed script, or None if the request failed.
+        """
+        tier = self.model_router.route(REPAIR_KIND)
+        if self.parallel_repair is not None and self.parallel_repair.rounds() > 1:
+            tier = self.model_router.escalation(tier) or tier
+        temperature = min(2.0, tier.temperature + 0.3 * candidate)
+        code, _ = repair(
+            lambda messages: self.get_openai_response(messages, request, use_cache=candidate == 0, temperature=temperature,
+                                                      tier=tier),
+            script, error_message,
+            reference=self.reference_message(f"{error_message}\n{script}"),
+            patch=self.repair_format == REPAIR_PATCH
+        )
+        return code
+
+    def run_parallel_repair(self, error_message, script):
+        """
+        Repair a failing script by racing several candidate fixes in the sandbox workers.
+        Falls back to the serial debugging loop when the sandbox is not available.
+        """
+        executor = self.get_script_executor()
+        if executor is None:
+            self.chat_window.add_message("AI", "Parallel repair needs FreeCADCmd, debugging one fix at a time instead.", is_user=False)
+            self.run_debugging_loop(error_message, script)
+            return
+        if self.parallel_repair is not None and self.parallel_repair.is_running():
+            return
+        # Leave room for a request and a sandbox run per candidate, until the repair ends
+        self._repair_thread_count = self.request_engine.pool.maxThreadCount()
+        self.request_engine.pool.setMaxThreadCount(max(self._repair_thread_count, 2 * self.repair_candidates))
+        self.parallel_repair = ParallelRepair(
+            self.request_engine, executor, self.request_fix,
+            candidates=self.repair_candidates,
+            max_rounds=self.repair_max_rounds,
+            time_budget=self.repair_time_budget,
+            request_timeout=self.request_timeout,
+            validate=self.validation_error,
+            parent=self
+        )
+        self.parallel_repair.progress.connect(lambda text: self.chat_window.add_message("AI (Debug)", text, is_user=False))
+        self.parallel_repair.succeeded.connect(self.handle_repair_succeeded)
+        self.parallel_repair.failed.connect(self.handle_repair_failed)
+        self.parallel_repair.start(script, error_message)
+
+    def handle_repair_succeeded(self, code, result):
+        """ Apply the winning fix of a parallel repair to the document. """
+        self.restore_repair_threads()
+        self.metrics.record(REPAIR, ok=True, rounds=self.parallel_repair.rounds(), total_ms=self.parallel_repair.elapsed() * 1000)
+        self.code_editor.setPlainText(code)
+        on_success = lambda: self.on_script_succeeded(code)
+        on_failure = lambda error_traceback: self.on_script_failed(code, error_traceback)
+        if self.execution_mode == EXECUTION_SANDBOX:
+            # The sandbox already built the document, merge it instead of running the script again
+            self.handle_execution_result(result, on_success, on_failure,
+                                         geometry_key=self.geometry_key(code, EXECUTION_SANDBOX))
+        else:
+            if result.output_path and os.path.exists(result.output_path):
+                os.remove(result.output_path)
+            self.execute_script(code, on_success, on_failure)
+
+    def handle_repair_failed(self, reason):
+        """ Report a parallel repair that gave up. """
+        self.restore_repair_threads()
+        self.metrics.record(REPAIR, ok=False, rounds=self.parallel_repair.rounds(), total_ms=self.parallel_repair.elapsed() * 1000)
+        self.chat_window.add_message("AI (Debug)", f"Repair failed: {reason}", is_user=False)
+
+    def restore_repair_threads(self):
+        """ Give the request pool back the thread count it had before the parallel repair. """
+        if self._repair_thread_count is not None:
+            self.request_engine.pool.setMaxThreadCount(self._repair_thread_count)
+            self._repair_thread_count = None
+
+    def run_debugging_loop(self, error_message, script, counter=0, tier=None):
+        """
+        Run the debugging loop to fix the error in the script.
+        Each iteration asks the user whether to continue, then requests a fix in the
+        background; handle_debug_response runs the fix and starts the next iteration.
+
+        Args:
+            tier (Tier): The model tier asked for the fix; by default the repair tier.
+        """
+        counter += 1
+        FreeCAD.Console.PrintError(f"Debugging loop iteration {counter}\n")
+        FreeCAD.Console.PrintError(f"Error message:\n{error_message}\n")
+
+        # Ask user if they want to continue debugging
+        reply = QtWidgets.QMessageBox.question(
+            None,
+            "Continue Debugging?",
+            f"Iteration {counter} failed. Do you want to continue debugging?\n\nError message:\n{error_message}",
+            QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No,
+            QtWidgets.QMessageBox.No
+        )
 
-            # Debugging process
-            prompt = f"The following script caused an error:\n\n{script}\n\nError message:\n{error_message}\n\nPlease fix the code."
-            response = self.get_openai_response([{"role": "user", "content": prompt}])
+        if reply == QtWidgets.QMessageBox.No or self.request_engine.is_busy():
+            return  # Exit the loop if the user chooses 'No'
 
-            if response:
+        # Debugging process
+        messages = build_patch_messages(script, error_message) if self.repair_format == REPAIR_PATCH else None
+        self.request_repair(messages, error_message, script, counter, tier=tier or self.model_router.route(REPAIR_KIND))
+
+    def request_repair(self, messages, error_message, script, counter, repair_format=None, tier=None):
+        """
+        Submit a fix request in the background.
+
+        Args:
+            messages (list): The messages of a patch request, or None to ask for the full script.
+            repair_format (str): How the fix is requested, recorded in the metrics; by default
+                "patch" for a patch request and "full" otherwise.
+            tier (Tier): The model tier asked for the fix, or None for the model of the settings.
+        """
+        if messages is None:
+            messages = build_repair_messages(script, error_message)
+            repair_format = repair_format or "full"
+            self.chat_window.add_message("AI", f"Requesting a fix (debugging iteration {counter})...", is_user=False)
+        else:
+            repair_format = repair_format or REPAIR_PATCH
+            self.chat_window.add_message("AI", f"Requesting a patch (debugging iteration {counter})...", is_user=False)
+        self.request_engine.submit(
+            lambda request: self.get_openai_response(self.add_references(messages, f"{error_message}\n{script}", request),
+                                                     request, tier=tier),
+            timeout=self.request_timeout,
+            on_finished=lambda request, response: self.handle_debug_response(
+                request, response, error_message, script, counter, repair_format, tier),
+            on_failed=lambda request, message: self.handle_ai_error(request, message, restore=False)
+        )
+
+    def handle_debug_response(self, request, response, error_message, script, counter, repair_format="full", tier=None):
+        """
+        Run the fixed script returned by the AI, and continue the debugging loop on failure.
+        A patch is applied to the script; if it does not apply, the full script is requested.
+        When the fix of a fast tier fails, the next iteration asks the strong tier.
+        """
+        self.report_cache_hit(request)
+        values = {"iteration": counter, "repair_format": repair_format}
+        new_code = None
+        if response and repair_format == REPAIR_PATCH:
+            try:
+                new_code, values["repair_format"] = apply_response(script, response)
+            except PatchError as e:
+                FreeCAD.Console.PrintWarning(f"The patch did not apply: {e}\n")
+        if values["repair_format"] == REPAIR_PATCH and new_code is not None:
+            values["saved_tokens"] = saved_tokens(script, error_message, response)
+        self.record_request_metrics(DEBUG, request, response, **values)
+        if response and repair_format == REPAIR_PATCH and new_code is None:
+            self.chat_window.add_message("AI", "The patch did not apply to the script.", is_user=False)
+            self.request_repair(None, error_message, script, counter, repair_format="fallback", tier=tier)
+            return
+        if response:
+            if new_code is None:
                 new_code = self.extract_code_from_response(response)
-                self.code_editor.setPlainText(new_code)
-                try:
-                    exec(new_code, globals())
-                    QtWidgets.QMessageBox.information(None, "Debugging", "Debugging successful. Please run the script again.")
-                    break  # Exit loop if successful
-                except Exception as e:
-                    error_message = traceback.format_exc()
-                    script = new_code  # Update script for next loop iteration
+            self.code_editor.setPlainText(new_code)
+            self.execute_script(
+                new_code,
+                on_success=lambda: self.handle_debug_success(tier),
+                # Continue the loop with the new script and its error
+                on_failure=lambda new_error: self.handle_debug_failure(new_error, new_code, counter, tier)
+            )
+            return
+        self.run_debugging_loop(error_message, script, counter, tier)
 
+    def handle_debug_success(self, tier):
+        """ Report a fix that ran. """
+        self.record_tier_outcome(tier, True)
+        QtWidgets.QMessageBox.information(None, "Debugging", "Debugging successful. Please run the script again.")
+
+    def handle_debug_failure(self, error_message, script, counter, tier):
+        """ Continue the debugging loop after a fix failed, asking the strong tier if a fast tier wrote the fix. """
+        self.record_tier_outcome(tier, False)
+        escalation = self.model_router.escalation(tier)
+        if escalation is not None:
+            self.chat_window.add_message("AI", f"The fix of {tier.model} failed, the next fix is asked from "
+                                               f"{escalation.model}.", is_user=False)
+        self.run_debugging_loop(error_message, script, counter, escalation or tier)
 
     def extract_code_from_response(self, response):
         """ Extract the code from the AI response. """
-        if "```python" in response:
-            code = response.split("```python")[1].split("```")[0]
-        else:
-            code = response
-        return code.strip()
+        return self.extract_reasoning_and_code(response)[1]
 
     def clear_chat(self):
-        """ Clear the chat window and the conversation history. !FIXME: This method is not working as expected. """
+        """
+        Clear the chat window and the conversation history, and start a new session.
+        The requests, streams and repairs in progress are cancelled first, so that
+        their late results do not land in the cleared chat and history.
+        """
+        self.cancel_request()
+        self._thinking_index = None
+        self._stream_parser = None
+        self._stream_text_index = None
+        self._stream_code_index = None
+        self._run_after_response = False
+        self.conversation_history.clear()
+        self.offloaded = False
+        self.code_tier = None
+        self._tier_script = None
+        self.start_session()
+        self.chat_window.clear_chat()
+
+    def is_idle(self):
+        """ Return True if the session has no request, queued prompt or repair in progress. """
+        return not (self.request_engine.is_busy() or self.queued
+                    or (self.parallel_repair is not None and self.parallel_repair.is_running()))
+
+    def offload_history(self):
+        """
+        Drop the conversation and the chat messages of an idle session from memory.
+        They are already in the session file, and are read back by reload_history
+        when the session is shown or used again.
+
+        Returns:
+            bool: True if the history was offloaded.
+        """
+        if self.offloaded or not self.conversation_history or not self.is_idle():
+            return False
+        self.session_store.flush()
+        if not os.path.exists(self.session_store.path):
+            return False
         self.conversation_history.clear()
         self.chat_window.clear_chat()
+        if self.incremental_runner is not None:
+            self.incremental_runner.reset()  # Releases the namespaces of the last run
+        self.offloaded = True
+        return True
+
+    def reload_history(self):
+        """ Read back the conversation of an offloaded session, and show it in the chat again. """
+        if not self.offloaded:
+            return
+        self.offloaded = False
+        self.conversation_history.extend(load_session(self.session_store.path)["messages"])
+        for message in self.conversation_history:
+            if message["role"] == "user":
+                self.chat_window.add_message("User", message["content"], is_user=True)
+            elif message["role"] == "assistant":
+                reasoning, code = self.extract_reasoning_and_code(message["content"])
+                self.chat_window.add_message("AI (Reasoning)", reasoning)
+                if code:
+                    self.chat_window.add_message("AI (Code)", code)
+
+    def showEvent(self, event):
+        self.reload_history()
+        super().showEvent(event)
+
+    def close_session(self):
+        """ Cancel the requests of the session, close its session file and detach its stats panel from the metrics. """
+        self.cancel_request()
+        self.session_store.close()
+        if self.stats_panel is not None:
+            self.stats_panel.detach()
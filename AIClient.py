@@ -0,0 +1,271 @@
+# AIClient.py
+"""
+This module contains the AIClient class, which sends chat completion requests to
+the OpenAI API, with the response cache in front of it. It does not depend on Qt,
+so it is shared by the AI3DGenerator widget and the headless batch mode.
+The openai package is imported on the first request, it is slow to import.
+
+All clients of the process share one pooled HTTP session, so connections are kept
+alive across requests, and one semaphore per API key, so the widget, the parallel
+repair and the batch mode never exceed the concurrency allowed for a key.
+"""
+import hashlib
+import random
+import threading
+import time
+
+import Log
+from ResponseCache import ResponseCache, CACHE_ALWAYS, CACHE_DETERMINISTIC
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors
+RETRYABLE_STATUSES = (408, 409, 429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+_semaphores = {}
+_http_session = None
+
+
+def build_repair_messages(script, error_message):
+    """ Build the messages asking the AI to fix a failing script. """
+    prompt = f"The following script caused an error:\n\n{script}\n\nError message:\n{error_message}\n\nPlease fix the code."
+    return [{"role": "user", "content": prompt}]
+
+
+def key_semaphore(api_key, limit):
+    """
+    Return the semaphore bounding the in-flight requests made with an API key.
+    A new semaphore replaces the old one when the limit changes; the requests
+    holding the old one release it as usual.
+    """
+    key = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    with _lock:
+        semaphore, size = _semaphores.get(key, (None, 0))
+        if semaphore is None or size != limit:
+            semaphore = threading.BoundedSemaphore(limit)
+            _semaphores[key] = (semaphore, limit)
+        return semaphore
+
+
+def install_http_session(openai, pool_size):
+    """
+    Make the openai package send every request through one pooled requests.Session,
+    so the connections to the API are kept alive and shared by the worker threads.
+    A session installed by the user (openai.requestssession) is left alone.
+    """
+    global _http_session
+    with _lock:
+        if _http_session is not None or openai.requestssession is not None:
+            return
+        import requests
+        _http_session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=max(pool_size, 10))
+        _http_session.mount("https://", adapter)
+        _http_session.mount("http://", adapter)
+        openai.requestssession = _http_session
+
+
+def retry_after(error):
+    """ Return the delay requested by the Retry-After headers of an API error, in seconds, or None. """
+    headers = getattr(error, "headers", None) or {}
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return max(0.0, float(value) * scale)
+            except ValueError:  # An HTTP date, not worth parsing
+                pass
+    return None
+
+
+def is_retryable(error, openai):
+    """ Return True for transient errors: rate limits, timeouts, connection and server errors. """
+    if isinstance(error, openai.error.RateLimitError):
+        # An exhausted quota will not come back by waiting
+        return getattr(error, "code", None) != "insufficient_quota"
+    if isinstance(error, (openai.error.APIConnectionError, openai.error.Timeout,
+                          openai.error.ServiceUnavailableError, openai.error.TryAgain)):
+        return True
+    if isinstance(error, openai.error.APIError):
+        return error.http_status is None or error.http_status in RETRYABLE_STATUSES
+    return False
+
+
+class AIClient:
+    """
+    A client for the OpenAI chat completions.
+
+    Calls are blocking. The optional request argument of complete() is a handle
+    with the interface of RequestEngine.Request (info, remaining_time,
+    check_cancelled, is_cancelled, emit_progress, cancel_event); it is used for the
+    timeout, cancellation, streaming and to report cache hits, token usage, the
+    number of retries and the monotonic times of the first token ("first_token_at")
+    and of the end of the response ("finished_at") in request.info.
+
+    Transient errors are retried up to max_retries times with a jittered exponential
+    backoff, or after the delay asked by the API in its Retry-After header. A stream
+    that failed after its first token is not retried, since it was already shown.
+
+    Attributes:
+        api_key (str): The OpenAI API key, sent with each request.
+        model (str): The AI model.
+        temperature (float): The default temperature parameter.
+        max_tokens (int): The maximum number of tokens of a response.
+        request_timeout (float): The default time limit of a request, in seconds.
+        cache_mode (str): When to use the response cache: "always", "deterministic" or "off".
+        response_cache (ResponseCache): The response cache, or None for no cache.
+        api_base (str): The base URL of the API, or None for the OpenAI default.
+        max_retries (int): The number of retries of a failed request.
+        max_concurrent_requests (int): The maximum number of in-flight requests per API key.
+        backoff_base (float): The first retry delay, in seconds, doubled at each retry.
+        backoff_max (float): The longest retry delay, in seconds.
+    """
+    def __init__(self, api_key="", model="gpt-4", temperature=1.0, max_tokens=2048,
+                 request_timeout=120.0, cache_mode=CACHE_ALWAYS, response_cache=None, api_base=None,
+                 max_retries=4, max_concurrent_requests=4, backoff_base=1.0, backoff_max=30.0):
+        self.api_key = api_key
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.request_timeout = request_timeout
+        self.cache_mode = cache_mode
+        self.response_cache = response_cache
+        self.api_base = api_base
+        self.max_retries = max_retries
+        self.max_concurrent_requests = max_concurrent_requests
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def use_response_cache(self, temperature):
+        """ Return True if the cache mode allows caching a request with this temperature. """
+        if self.response_cache is None:
+            return False
+        if self.cache_mode == CACHE_ALWAYS:
+            return True
+        return self.cache_mode == CACHE_DETERMINISTIC and temperature == 0
+
+    def complete(self, messages, request=None, stream=False, use_cache=True, temperature=None, model=None, max_tokens=None):
+        """
+        Get the response of the model for a list of messages.
+        Responses are looked up in and stored to the response cache, according to the cache mode.
+
+        Args:
+            messages (list): The messages to send.
+            request (Request): The background request handle, used for its timeout and cancellation.
+            stream (bool): Stream the response, sending each chunk through request.emit_progress.
+            use_cache (bool): Set to False to bypass the response cache for this call.
+            temperature (float): Overrides the temperature for this call.
+            model (str): Overrides the model for this call.
+            max_tokens (int): Overrides the maximum number of tokens of the response for this call.
+
+        Returns:
+            str: The response, or None if the request failed.
+        """
+        temperature = self.temperature if temperature is None else temperature
+        model = model or self.model
+        max_tokens = max_tokens or self.max_tokens
+        cache_key = None
+        if use_cache and self.use_response_cache(temperature):
+            cache_key = ResponseCache.make_key(model, temperature, max_tokens, messages)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                if request is not None:
+                    request.info["cache_hit"] = True
+                    request.info["first_token_at"] = request.info["finished_at"] = time.monotonic()
+                return cached
+
+        import openai
+        install_http_session(openai, self.max_concurrent_requests)
+        semaphore = key_semaphore(self.api_key, self.max_concurrent_requests)
+        stream = stream and request is not None
+        attempt = 0
+        while True:
+            try:
+                self.acquire(semaphore, request)
+                try:
+                    content = self.request_completion(openai, messages, temperature, request, stream, model, max_tokens)
+                finally:
+                    semaphore.release()
+            except Exception as e:
+                if request is not None and request.is_cancelled():
+                    raise
+                delay = self.retry_delay(e, openai, attempt, request)
+                if delay is None:
+                    attempts = f" after {attempt + 1} attempts" if attempt else ""
+                    Log.error(f"Error fetching response{attempts}: {str(e)}\n")
+                    return None
+                attempt += 1
+                Log.warning(f"Error fetching response: {str(e)}, retrying in {delay:.1f} s ({attempt}/{self.max_retries})\n")
+                if request is not None:
+                    request.info["retries"] = attempt
+                    if request.cancel_event.wait(delay):
+                        request.check_cancelled()
+                else:
+                    time.sleep(delay)
+                continue
+            if cache_key is not None and content:
+                self.response_cache.put(cache_key, content)
+            return content
+
+    def acquire(self, semaphore, request):
+        """ Wait for a free request slot of the API key, giving up if the request is cancelled or times out. """
+        if request is None:
+            semaphore.acquire()
+            return
+        while not semaphore.acquire(timeout=0.1):
+            request.check_cancelled()
+            if request.remaining_time() == 0:
+                raise TimeoutError("No request slot became free before the timeout.")
+
+    def request_completion(self, openai, messages, temperature, request, stream, model=None, max_tokens=None):
+        """ Send a single request to the API and return the response text. """
+        timeout = request.remaining_time() if request is not None else None
+        response = openai.ChatCompletion.create(
+            model=model or self.model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens or self.max_tokens,
+            request_timeout=timeout if timeout is not None else self.request_timeout,
+            stream=stream,
+            api_key=self.api_key,
+            api_base=self.api_base
+        )
+        if stream:
+            request.info["streamed"] = True
+            chunks = []
+            for chunk in response:
+                request.check_cancelled()
+                content = chunk['choices'][0].get('delta', {}).get('content')
+                if content:
+                    if not chunks:
+                        request.info["first_token_at"] = time.monotonic()
+                    chunks.append(content)
+                    request.emit_progress(content)
+            content = "".join(chunks).strip()
+        else:
+            content = response['choices'][0]['message']['content'].strip()
+            if request is not None:
+                request.info["first_token_at"] = time.monotonic()
+                if 'usage' in response:
+                    request.info["usage"] = dict(response['usage'])
+        if request is not None:
+            request.info["finished_at"] = time.monotonic()
+        return content
+
+    def retry_delay(self, error, openai, attempt, request):
+        """
+        Return the delay before retrying a failed request, in seconds, or None if it
+        should not be retried: the error is permanent, the retries are spent, a stream
+        was already shown, or the delay would outlast the request timeout.
+        """
+        if attempt >= self.max_retries or not is_retryable(error, openai):
+            return None
+        if request is not None and "first_token_at" in request.info:
+            return None
+        delay = retry_after(error)
+        if delay is None:
+            # Full jitter, so that concurrent requests do not retry in lockstep
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        remaining = request.remaining_time() if request is not None else None
+        if remaining is not None and delay >= remaining:
+            return None
+        return delay
@@ -1,27 +1,215 @@
-
 # ChatWindow.py
-from PySide2 import QtWidgets, QtCore
+import collections
+
+from PySide2 import QtWidgets, QtGui, QtCore
+
+SENDER_ROLE = QtCore.Qt.UserRole + 1
+IS_USER_ROLE = QtCore.Qt.UserRole + 2
+VERSION_ROLE = QtCore.Qt.UserRole + 3
+
+
+class ChatMessageModel(QtCore.QAbstractListModel):
+    """
+    A list model holding the chat messages.
+
+    Each message is stored as [sender, text, is_user, version]. The version is
+    bumped whenever the text changes, so views can cache the text layout of a row.
+    Appending a message and appending text to a message are O(1).
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._messages = []
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self._messages)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        sender, text, is_user, version = self._messages[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            return text
+        if role == QtCore.Qt.ToolTipRole or role == SENDER_ROLE:
+            return sender
+        if role == IS_USER_ROLE:
+            return is_user
+        if role == VERSION_ROLE:
+            return version
+        return None
+
+    def append_message(self, sender, text, is_user):
+        """ Append a message and return its row. """
+        row = len(self._messages)
+        self.beginInsertRows(QtCore.QModelIndex(), row, row)
+        self._messages.append([sender, text, is_user, 0])
+        self.endInsertRows()
+        return row
+
+    def set_text(self, row, text, append=False):
+        """ Replace, or append to, the text of the message at the given row. """
+        message = self._messages[row]
+        message[1] = message[1] + text if append else text
+        message[3] += 1
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def text(self, row):
+        """ Return the text of the message at the given row. """
+        return self._messages[row][1]
+
+    def clear(self):
+        """ Remove all messages. """
+        self.beginResetModel()
+        self._messages = []
+        self.endResetModel()
+
+
+class ChatMessageDelegate(QtWidgets.QStyledItemDelegate):
+    """
+    Paints the chat messages as bubbles.
+
+    The text of each row is laid out once per (version, width) with a QTextLayout.
+    Row sizes are cached for every row, which lets the view lay out thousands of
+    rows cheaply, while the layouts themselves are kept in a bounded LRU cache since
+    only the visible rows are painted.
+
+    Attributes:
+        margin (int): The space around a bubble.
+        padding (int): The space between the bubble border and its text.
+        radius (int): The corner radius of the bubbles.
+        max_layouts (int): The maximum number of text layouts kept in memory.
+    """
+    margin = 5
+    padding = 10
+    radius = 15
+    width_step = 16
+    user_colors = (QtGui.QColor("#d1e7dd"), QtGui.QColor("#0f5132"))
+    ai_colors = (QtGui.QColor("#d1d1d1"), QtGui.QColor("#333333"))
+
+    def __init__(self, view, max_layouts=256):
+        super().__init__(view)
+        self.max_layouts = max_layouts
+        self._sizes = {}
+        self._layouts = collections.OrderedDict()
+
+    def clear_cache(self):
+        """ Release every cached size and layout. """
+        self._sizes.clear()
+        self._layouts.clear()
+
+    def text_width(self):
+        """ Return the wrapping width of the text for the current width of the view. """
+        width = int(self.parent().viewport().width() * 0.85) - 2 * (self.margin + self.padding)
+        return max(self.width_step, width - width % self.width_step)
+
+    def _layout_text(self, index, font, width):
+        """ Return the (cached) text layout and the text size of a row. """
+        key = (index.row(), index.data(VERSION_ROLE), width)
+        layout = self._layouts.get(key[0])
+        if layout is not None and layout[0] == key:
+            self._layouts.move_to_end(key[0])
+            return layout[1], layout[2]
+
+        # QTextLayout breaks lines on the Unicode line separator, not on newlines
+        text = (index.data(QtCore.Qt.DisplayRole) or "").replace("\n", "\u2028")
+        text_layout = QtGui.QTextLayout(text, font)
+        text_option = QtGui.QTextOption()
+        text_option.setWrapMode(QtGui.QTextOption.WrapAtWordBoundaryOrAnywhere)
+        text_layout.setTextOption(text_option)
+        text_layout.setCacheEnabled(True)
+        height = 0.0
+        natural_width = 0.0
+        text_layout.beginLayout()
+        while True:
+            line = text_layout.createLine()
+            if not line.isValid():
+                break
+            line.setLineWidth(width)
+            line.setPosition(QtCore.QPointF(0, height))
+            height += line.height()
+            natural_width = max(natural_width, line.naturalTextWidth())
+        text_layout.endLayout()
+
+        size = QtCore.QSizeF(natural_width, height)
+        self._sizes[key[0]] = (key, size)
+        self._layouts[key[0]] = (key, text_layout, size)
+        self._layouts.move_to_end(key[0])
+        while len(self._layouts) > self.max_layouts:
+            self._layouts.popitem(last=False)
+        return text_layout, size
+
+    def _text_size(self, index, font, width):
+        key = (index.row(), index.data(VERSION_ROLE), width)
+        cached = self._sizes.get(key[0])
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        return self._layout_text(index, font, width)[1]
+
+    def sizeHint(self, option, index):
+        size = self._text_size(index, option.font, self.text_width())
+        return QtCore.QSize(self.parent().viewport().width(), int(size.height()) + 2 * (self.margin + self.padding) + 1)
+
+    def paint(self, painter, option, index):
+        text_layout, size = self._layout_text(index, option.font, self.text_width())
+        is_user = index.data(IS_USER_ROLE)
+        background, foreground = self.user_colors if is_user else self.ai_colors
+
+        bubble_width = size.width() + 2 * self.padding
+        bubble_height = size.height() + 2 * self.padding
+        if is_user:
+            left = option.rect.right() - self.margin - bubble_width
+        else:
+            left = option.rect.left() + self.margin
+        bubble = QtCore.QRectF(left, option.rect.top() + self.margin, bubble_width, bubble_height)
+
+        painter.save()
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        painter.setPen(QtCore.Qt.NoPen)
+        painter.setBrush(background)
+        painter.drawRoundedRect(bubble, self.radius, self.radius)
+        painter.setPen(foreground)
+        text_layout.draw(painter, bubble.topLeft() + QtCore.QPointF(self.padding, self.padding))
+        painter.restore()
+
+
 class ChatWindow(QtWidgets.QWidget):
     """
     A widget that displays a chat conversation with messages from different senders.
 
+    The messages live in a ChatMessageModel shown by a QListView, so only the
+    visible rows are laid out and painted, even in sessions with thousands of
+    messages.
+
     Attributes:
         layout (QtWidgets.QVBoxLayout): The layout of the widget.
-        scroll_area (QtWidgets.QScrollArea): The scroll area for the chat content.
-        chat_content (QtWidgets.QWidget): The widget containing the chat messages.
-        chat_layout (QtWidgets.QVBoxLayout): The layout of the chat content.
+        model (ChatMessageModel): The model holding the messages.
+        delegate (ChatMessageDelegate): The delegate painting the message bubbles.
+        view (QtWidgets.QListView): The view displaying the messages.
     """
     def __init__(self):
         super().__init__()
         self.layout = QtWidgets.QVBoxLayout(self)
-        self.scroll_area = QtWidgets.QScrollArea()
-        self.scroll_area.setWidgetResizable(True)
-        self.chat_content = QtWidgets.QWidget()
-        self.chat_layout = QtWidgets.QVBoxLayout(self.chat_content)
-        self.scroll_area.setWidget(self.chat_content)
-        self.layout.addWidget(self.scroll_area)
-        self.chat_layout.setAlignment(QtCore.Qt.AlignTop)
-        self.chat_content.setStyleSheet("background-color: #f0f0f0; border: 1px solid #ccc;")
+        self.model = ChatMessageModel(self)
+        self.view = QtWidgets.QListView()
+        self.view.setModel(self.model)
+        self.delegate = ChatMessageDelegate(self.view)
+        self.view.setItemDelegate(self.delegate)
+        self.view.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollPerPixel)
+        self.view.setHorizontalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOff)
+        self.view.setResizeMode(QtWidgets.QListView.Adjust)
+        self.view.setLayoutMode(QtWidgets.QListView.Batched)
+        self.view.setBatchSize(200)
+        self.view.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
+        self.view.setFocusPolicy(QtCore.Qt.NoFocus)
+        self.view.setStyleSheet("QListView { background-color: #f0f0f0; border: 1px solid #ccc; }")
+        self.layout.addWidget(self.view)
+        self.model.modelReset.connect(self.delegate.clear_cache)
+
+        # Keep following the bottom of the chat while the (batched) layout grows
+        self._follow_bottom = True
+        scroll_bar = self.view.verticalScrollBar()
+        scroll_bar.rangeChanged.connect(self._on_scroll_range_changed)
+        scroll_bar.valueChanged.connect(self._on_scrolled)
 
     def add_message(self, sender, message, is_user=False):
         """
@@ -31,39 +219,56 @@ class ChatWindow(QtWidgets.QWidget):
             sender (str): The name of the message sender.
             message (str): The content of the message.
             is_user (bool): A flag indicating if the message is sent by the user.
+
+        Returns:
+            int: The index of the message, for append_to_message and set_message_text.
         """
-        message_layout = QtWidgets.QHBoxLayout()
-        
-        message_label = QtWidgets.QLabel(message)
-        message_label.setWordWrap(True)
-        message_label.setAlignment(QtCore.Qt.AlignLeft)
-        message_label.setStyleSheet(
-            "border-radius: 15px; padding: 10px; margin: 5px;"
-            + ("background-color: #d1e7dd; color: #0f5132;" if is_user else "background-color: #d1d1d1; color: #333;")
-        )
+        row = self.model.append_message(sender, message, is_user)
+        self.scroll_to_bottom()
+        return row
 
-        if is_user:
-            message_layout.addStretch()
-            message_layout.addWidget(message_label)
-        else:
-            message_layout.addWidget(message_label)
-            message_layout.addStretch()
-        
-        self.chat_layout.addLayout(message_layout)
-        QtCore.QTimer.singleShot(0, self.scroll_to_bottom)
+    def append_to_message(self, index, text):
+        """
+        Append text to an existing message, e.g. while a response is streamed.
+
+        Args:
+            index (int): The index returned by add_message.
+            text (str): The text to append.
+        """
+        self.model.set_text(index, text, append=True)
+        self.delegate.sizeHintChanged.emit(self.model.index(index))
+
+    def set_message_text(self, index, text):
+        """
+        Replace the text of an existing message.
+
+        Args:
+            index (int): The index returned by add_message.
+            text (str): The new text of the message.
+        """
+        self.model.set_text(index, text)
+        self.delegate.sizeHintChanged.emit(self.model.index(index))
+
+    def message_count(self):
+        """ Return the number of messages in the chat window. """
+        return self.model.rowCount()
 
     def scroll_to_bottom(self):
         """
-        Scroll the chat window to the bottom. !FIXME: This method is not working as expected.
+        Scroll the chat window to the bottom and keep it there while the layout grows.
         """
-        self.scroll_area.verticalScrollBar().setValue(self.scroll_area.verticalScrollBar().maximum())
+        self._follow_bottom = True
+        self.view.scrollToBottom()
+
+    def _on_scroll_range_changed(self, minimum, maximum):
+        if self._follow_bottom:
+            self.view.verticalScrollBar().setValue(maximum)
+
+    def _on_scrolled(self, value):
+        self._follow_bottom = value >= self.view.verticalScrollBar().maximum() - 4
 
     def clear_chat(self):
         """
-        Clear all messages from the chat window.  !FIXME: This method is not working as expected.
+        Clear all messages from the chat window and release their cached layouts.
         """
-        for i in reversed(range(self.chat_layout.count())):
-            widget = self.chat_layout.itemAt(i).widget()
-            if widget is not None:
-                widget.deleteLater()
-
+        self.model.clear()
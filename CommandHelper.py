@@ -1,76 +1,196 @@
-# ComandHelper.py
+# CommandHelper.py
 """
 This module contains the CommandHelper class, which is a popup widget that
 displays a list of commands and allows the user to filter and insert them into
 a text input.
+
+The commands are the slash commands of the pre-prompt and every command
+registered in FreeCAD. They are searched through a CommandIndex, and the list
+shows the ranked matches through a sort/filter proxy, so typing never rebuilds
+the list items.
 """
-from PySide2 import QtWidgets, QtCore
+import time
+
+from PySide2 import QtWidgets, QtGui, QtCore
+
+import Log
+from CommandIndex import CommandEntry, CommandIndex, freecad_commands, parse_slash_commands
+
+RANK_ROLE = QtCore.Qt.UserRole + 1
+
+
+def registered_command_count():
+    """ Return the number of commands registered in FreeCAD, or 0 outside of FreeCAD. """
+    try:
+        import FreeCADGui
+        return len(FreeCADGui.listCommands())
+    except (ImportError, AttributeError):
+        return 0
+
+
+class RankedFilterProxyModel(QtCore.QSortFilterProxyModel):
+    """
+    Shows the rows of a QStandardItemModel matched by the last search, best first.
+
+    The scores are written to the RANK_ROLE of the matched source items as
+    zero-padded strings, so that Qt filters and sorts the rows itself instead of
+    calling back into Python for every row. The sort is stable, so matches with
+    the same score keep the order of the source model.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setDynamicSortFilter(False)
+        self.setFilterRole(RANK_ROLE)
+        self.setSortRole(RANK_ROLE)
+        self._ranked_rows = []
+
+    def set_matches(self, scores):
+        """ Show only the source rows of the scores dict, best first, or every row with None. """
+        source = self.sourceModel()
+        for row in self._ranked_rows:
+            source.item(row).setData(None, RANK_ROLE)
+        self._ranked_rows = list(scores or ())
+        for row, score in (scores or {}).items():
+            source.item(row).setData(f"{score:08d}", RANK_ROLE)
+        pattern = "." if scores is not None else ""
+        if self.filterRegularExpression().pattern() != pattern:
+            self.setFilterRegularExpression(pattern)
+        column = 0 if scores is not None else -1
+        if self.sortColumn() != column:
+            self.sort(column, QtCore.Qt.DescendingOrder)
+        self.invalidate()
+
 
 class CommandHelper(QtWidgets.QWidget):
     """
-    A popup widget that displays a list of commands and allows the user to 
+    A popup widget that displays a list of commands and allows the user to
     filter and insert them into a text input.
 
+    The search runs debounce_ms after the last keystroke. Enter inserts the
+    selected command, or the best match.
+
     Attributes:
-        parent (QtWidgets.QTextEdit): The parent text input widget where the 
+        parent (QtWidgets.QTextEdit): The parent text input widget where the
             command will be inserted.
         layout (QtWidgets.QVBoxLayout): The layout of the widget.
         search_bar (QtWidgets.QLineEdit): The search bar for filtering commands.
-        command_list (QtWidgets.QListWidget): The list of commands to display.
-        commands (list): A list of commands to display in the widget.
+        command_list (QtWidgets.QListView): The list of commands to display.
+        model (QtGui.QStandardItemModel): The model holding every command, in index order.
+        proxy (RankedFilterProxyModel): The ranked matches shown by the list.
+        index (CommandIndex): The search index of the commands.
+        debounce_ms (int): The delay between the last keystroke and the search.
+        max_results (int): The maximum number of matches shown.
+        last_search_ms (float): The duration of the last search, in milliseconds.
     """
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, pre_prompt="", debounce_ms=80, max_results=200):
         super().__init__(parent)
         self.setWindowTitle("Command Helper")
         self.setWindowFlags(QtCore.Qt.Popup)
+        self.debounce_ms = debounce_ms
+        self.max_results = max_results
+        self.last_search_ms = 0.0
+        self._pre_prompt = None
+        self._command_count = None
+
         self.layout = QtWidgets.QVBoxLayout(self)
         self.search_bar = QtWidgets.QLineEdit()
         self.search_bar.setPlaceholderText("Type to filter commands...")
-        self.search_bar.textChanged.connect(self.filter_commands)
+        self.search_bar.textChanged.connect(self.schedule_filter)
+        self.search_bar.returnPressed.connect(self.insert_selected_command)
+        self.search_bar.installEventFilter(self)
         self.layout.addWidget(self.search_bar)
 
-        self.command_list = QtWidgets.QListWidget()
-        self.command_list.itemClicked.connect(self.insert_command)
+        self.model = QtGui.QStandardItemModel(self)
+        self.proxy = RankedFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.command_list = QtWidgets.QListView()
+        self.command_list.setModel(self.proxy)
+        self.command_list.setUniformItemSizes(True)
+        self.command_list.clicked.connect(self.insert_command)
+        self.command_list.activated.connect(self.insert_command)
         self.layout.addWidget(self.command_list)
 
-        self.commands = [
-            "/Sketch: Generate a constrained 2D sketch using geometric",
-            "and dimensional constraints.",
-            "/Extrude: Extend a sketch into 3D, allowing control over depth and direction.",
-            "/Cut: Subtract material from an object, for operations like drilling or hollowing.",
-            "/Part: Create individual 3D parts with detailed features.",
-            "/Assembly: Integrate parts into an assembly using constraints like alignment, "
-            "concentricity, and parallelism.",
-            "/Chamfer: Apply beveled edges to enhance aesthetics or reduce sharpness.",
-            "/Fillet: Round edges for smoother finishes.",
-            "/Draft: Add taper angles to extrusions or create draft elements.",
-            "/Mirror: Duplicate geometry symmetrically across a specified plane.",
-            "/Pattern: Arrange copies of a feature linearly or radially.",
-            "/Pocket: Create recesses or cavities in a part.",
-            "/Revolve: Form parts by rotating a profile around an axis.",
-            "/Boolean: Perform union, intersection, or difference operations between parts."
-        ]
-        self.update_command_list()
-
-    def update_command_list(self):
+        self.filter_timer = QtCore.QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(debounce_ms)
+        self.filter_timer.timeout.connect(lambda: self.filter_commands(self.search_bar.text()))
+
+        self.index = CommandIndex()
+        self.update_command_list(pre_prompt)
+
+    def update_command_list(self, pre_prompt=None):
+        """
+        Rebuild the index if the slash commands of the pre-prompt or the number of
+        registered FreeCAD commands changed, e.g. after a workbench was loaded.
+        """
+        pre_prompt = self._pre_prompt if pre_prompt is None else pre_prompt
+        command_count = registered_command_count()
+        if pre_prompt == self._pre_prompt and command_count == self._command_count:
+            return
+        self._pre_prompt = pre_prompt
+        self._command_count = command_count
+        start = time.perf_counter()
+        entries = [CommandEntry(name, description) for name, description in parse_slash_commands(pre_prompt)]
+        entries += [CommandEntry(name, description) for name, description in freecad_commands()]
+        self.index = CommandIndex(entries)
+        self.proxy.set_matches(None)
+        items = []
+        for entry in entries:
+            item = QtGui.QStandardItem(entry.display())
+            item.setToolTip(entry.description or entry.name)
+            item.setEditable(False)
+            items.append(item)
+        self.model.clear()
+        self.model.appendColumn(items)
+        Log.message(f"Command helper: indexed {len(entries)} commands in {(time.perf_counter() - start) * 1000:.0f} ms\n")
+        self.filter_commands(self.search_bar.text())
+
+    def schedule_filter(self, text):
         """
-        Update the command list with the current list of commands.
+        Filter the list once the user stops typing for debounce_ms.
         """
-        self.command_list.clear()
-        self.command_list.addItems(self.commands)
+        self.filter_timer.start()
 
     def filter_commands(self, text):
         """
-        Filter the list of commands based on the given text.
+        Filter the list of commands based on the given text, best matches first.
         """
-        filtered_commands = [cmd for cmd in self.commands if text.lower() in cmd.lower()]
-        self.command_list.clear()
-        self.command_list.addItems(filtered_commands)
+        self.filter_timer.stop()
+        start = time.perf_counter()
+        if text.strip():
+            self.proxy.set_matches(dict(self.index.search(text, self.max_results)))
+        else:
+            self.proxy.set_matches(None)
+        if self.proxy.rowCount():
+            self.command_list.setCurrentIndex(self.proxy.index(0, 0))
+        self.last_search_ms = (time.perf_counter() - start) * 1000
 
-    def insert_command(self, item):
+    def eventFilter(self, watched, event):
+        # Let the arrow keys move the selection while typing in the search bar
+        if watched is self.search_bar and event.type() == QtCore.QEvent.KeyPress \
+                and event.key() in (QtCore.Qt.Key_Up, QtCore.Qt.Key_Down, QtCore.Qt.Key_PageUp, QtCore.Qt.Key_PageDown):
+            QtWidgets.QApplication.sendEvent(self.command_list, event)
+            return True
+        return super().eventFilter(watched, event)
+
+    def insert_selected_command(self):
         """
-        Insert the selected command into the parent text input widget.
+        Insert the selected command, running a pending search first.
         """
-        command_text = item.text().split(':')[0]  # Extract only the command tag
-        self.parent().prompt_input.insertPlainText(f"{command_text} ")
+        if self.filter_timer.isActive():
+            self.filter_commands(self.search_bar.text())
+        index = self.command_list.currentIndex()
+        if index.isValid():
+            self.insert_command(index)
+
+    def insert_command(self, index):
+        """
+        Insert the command at the given index of the list into the parent text input widget.
+        """
+        entry = self.index.entries[self.proxy.mapToSource(index).row()]
+        self.parent().prompt_input.insertPlainText(f"{entry.text} ")
         self.hide()
+
+    def showEvent(self, event):
+        self.search_bar.setFocus()
+        super().showEvent(event)
@@ -0,0 +1,206 @@
+# CommandIndex.py
+"""
+This module contains the CommandIndex class, a search index over the commands
+offered by the command helper: the slash commands of the pre-prompt and the
+commands registered in FreeCAD, with their tooltips. It does not depend on Qt.
+
+Queries are answered from a prefix index of the words of each command and a
+trigram index, so a search only scores the commands sharing something with the
+query, and typos such as "extrde" still find "/Extrude".
+"""
+import bisect
+import collections
+import re
+
+# The slash commands of pre_prompt_example.txt, used when the pre-prompt defines none
+SLASH_COMMANDS = (
+    ("/Sketch", "Generate a constrained 2D sketch using geometric and dimensional constraints."),
+    ("/Extrude", "Extend a sketch into 3D, allowing control over depth and direction."),
+    ("/Cut", "Subtract material from an object, for operations like drilling or hollowing."),
+    ("/Part", "Create individual 3D parts with detailed features."),
+    ("/Assembly", "Integrate parts into an assembly using constraints like alignment, concentricity, and parallelism."),
+    ("/Chamfer", "Apply beveled edges to enhance aesthetics or reduce sharpness."),
+    ("/Fillet", "Round edges for smoother finishes."),
+    ("/Draft", "Add taper angles to extrusions or create draft elements."),
+    ("/Mirror", "Duplicate geometry symmetrically across a specified plane."),
+    ("/Pattern", "Arrange copies of a feature linearly or radially."),
+    ("/Pocket", "Create recesses or cavities in a part."),
+    ("/Revolve", "Form parts by rotating a profile around an axis."),
+    ("/Boolean", "Perform union, intersection, or difference operations between parts."),
+)
+
+SLASH_COMMAND_PATTERN = re.compile(r"^\s*(/\w+)\s*:\s*(.*?)\s*$", re.MULTILINE)
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+TAG_PATTERN = re.compile(r"<[^>]+>")
+
+# Weights of the ranking, from the strongest match to the weakest
+SCORE_EXACT = 1000
+SCORE_NAME_PREFIX = 500
+SCORE_WORD_PREFIX = 300
+SCORE_NAME_SUBSTRING = 200
+SCORE_DESCRIPTION_SUBSTRING = 100
+SCORE_TRIGRAMS = 100
+SCORE_SLASH = 50
+
+
+def parse_slash_commands(pre_prompt):
+    """
+    Return the slash commands defined in a pre-prompt, one per "/Name: description"
+    line, as (name, description) pairs. Falls back to SLASH_COMMANDS if there are none.
+    """
+    commands = SLASH_COMMAND_PATTERN.findall(pre_prompt or "")
+    return commands or list(SLASH_COMMANDS)
+
+
+def freecad_commands():
+    """
+    Return the commands registered in FreeCAD as (name, description) pairs, the
+    description being the menu text and tooltip of the command when available.
+    """
+    try:
+        import FreeCADGui
+        names = FreeCADGui.listCommands()
+    except (ImportError, AttributeError):
+        return []
+    get_command = getattr(getattr(FreeCADGui, "Command", None), "get", None)
+    commands = []
+    for name in names:
+        description = ""
+        if get_command is not None:
+            try:
+                info = get_command(name).getInfo()
+                menu_text = info.get("menuText", "").replace("&", "")
+                tooltip = TAG_PATTERN.sub("", info.get("toolTip", ""))
+                description = f"{menu_text}. {tooltip}" if tooltip and tooltip != menu_text else menu_text
+            except Exception:  # Commands of broken workbenches must not break the helper
+                pass
+        commands.append((name, " ".join(description.split())))
+    return commands
+
+
+def trigrams(text):
+    """ Return the set of trigrams of a lowercase text, padded so that short words have some. """
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def split_words(name):
+    """ Split a command name such as "PartDesign_AdditiveBox" into lowercase words. """
+    spaced = re.sub(r"([a-z0-9])([A-Z])", r"\1 \2", name)
+    return WORD_PATTERN.findall(spaced.lower())
+
+
+class CommandEntry:
+    """
+    A command of the index.
+
+    Attributes:
+        name (str): The command name, such as "/Sketch" or "Part_Extrude".
+        description (str): What the command does.
+        text (str): The text inserted in the prompt.
+        key (str): The lowercase name.
+        words (list): The lowercase words of the name.
+        search_text (str): The lowercase name and description.
+    """
+    __slots__ = ("name", "description", "text", "key", "words", "search_text")
+
+    def __init__(self, name, description="", text=None):
+        self.name = name
+        self.description = description
+        self.text = text or name
+        self.key = name.lower()
+        self.words = split_words(name.lstrip("/"))
+        self.search_text = f"{self.key} {description.lower()}"
+
+    def display(self):
+        """ Return the text shown in the command list. """
+        return f"{self.name}: {self.description}" if self.description else self.name
+
+
+class CommandIndex:
+    """
+    A ranked fuzzy search index over command entries.
+
+    The index holds a sorted list of the words of every command name, searched by
+    bisection for prefix matches, and posting lists from each trigram of the names
+    to the entries containing it. A query scores only the candidates found in them,
+    then ranks them by exact match, name prefix, word prefix, substring and
+    trigram similarity. Slash commands rank above FreeCAD commands on ties.
+
+    Attributes:
+        entries (list): The indexed CommandEntry objects.
+    """
+    def __init__(self, entries=()):
+        self.entries = []
+        self._words = []
+        self._trigrams = collections.defaultdict(list)
+        self.add(entries)
+
+    def add(self, entries):
+        """ Index more entries. """
+        for entry in entries:
+            index = len(self.entries)
+            self.entries.append(entry)
+            self._words.extend((word, index) for word in set(entry.words) | {entry.key.lstrip("/")})
+            for trigram in trigrams(entry.key.lstrip("/")):
+                self._trigrams[trigram].append(index)
+        self._words.sort()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def prefix_matches(self, prefix):
+        """ Return the indexes of the entries having a name word starting with prefix. """
+        position = bisect.bisect_left(self._words, (prefix, -1))
+        matches = set()
+        while position < len(self._words) and self._words[position][0].startswith(prefix):
+            matches.add(self._words[position][1])
+            position += 1
+        return matches
+
+    def search(self, query, limit=200):
+        """
+        Return the best matches of a query as a list of (entry index, score), best first.
+        An empty query returns every entry in index order, with a score of 0, and a
+        query of slashes only returns every slash command in index order.
+        """
+        query = " ".join(query.lower().split())
+        if not query:
+            return [(index, 0) for index in range(len(self.entries))][:limit]
+        term = query.lstrip("/")
+        if not term:
+            return [(index, 0) for index, entry in enumerate(self.entries) if entry.key.startswith("/")][:limit]
+        query_trigrams = trigrams(term) if len(term) >= 3 else set()
+
+        # Candidates: name word prefixes, and entries sharing enough trigrams with the query
+        candidates = self.prefix_matches(term.split()[0]) if term else set()
+        shared = collections.Counter()
+        for trigram in query_trigrams:
+            shared.update(self._trigrams.get(trigram, ()))
+        needed = max(2, len(query_trigrams) // 2)
+        candidates.update(index for index, count in shared.items() if count >= needed)
+        if len(term) >= 3:
+            # Words of the description only match as substrings, checked over the whole index
+            candidates.update(index for index, entry in enumerate(self.entries) if term in entry.search_text)
+
+        scored = []
+        for index in candidates:
+            entry = self.entries[index]
+            score = 0
+            if entry.key == query or entry.key.lstrip("/") == term:
+                score += SCORE_EXACT
+            elif entry.key.lstrip("/").startswith(term):
+                score += SCORE_NAME_PREFIX
+            elif any(word.startswith(term) for word in entry.words):
+                score += SCORE_WORD_PREFIX
+            elif term in entry.key:
+                score += SCORE_NAME_SUBSTRING
+            elif term in entry.search_text:
+                score += SCORE_DESCRIPTION_SUBSTRING
+            if query_trigrams:
+                score += SCORE_TRIGRAMS * shared[index] // len(query_trigrams)
+            if entry.key.startswith("/"):
+                score += SCORE_SLASH
+            scored.append((-score, len(entry.key), index))
+        scored.sort()
+        return [(index, -score) for score, _, index in scored[:limit]]
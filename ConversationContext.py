@@ -0,0 +1,186 @@
+# ConversationContext.py
+"""
+This module contains the ConversationContext class, which builds the list of
+messages sent to the AI model from the full conversation history while staying
+inside a token budget.
+"""
+import functools
+import re
+import threading
+
+# Tokens added by the chat format around each message
+MESSAGE_OVERHEAD = 4
+
+CODE_BLOCK = re.compile(r"```[^\n]*\n.*?(?:```|$)", re.DOTALL)
+OMITTED_CODE = "[Earlier code revision omitted, the latest version is further down the conversation.]"
+
+
+_encoding_lock = threading.Lock()
+_encoding_state = {"loaded": False, "encoding": None}
+
+
+def _encoding():
+    """
+    Return the tiktoken encoding, loading it on the first call. Returns None when
+    tiktoken is missing, and while another thread loads it, so that a count on the
+    GUI thread during the warm-up estimates rather than waits for a download.
+    """
+    if _encoding_state["loaded"]:
+        return _encoding_state["encoding"]
+    if not _encoding_lock.acquire(blocking=False):
+        return None
+    try:
+        if not _encoding_state["loaded"]:
+            _encoding_state["encoding"] = _load_encoding()
+            _encoding_state["loaded"] = True
+    finally:
+        _encoding_lock.release()
+    return _encoding_state["encoding"]
+
+
+def _load_encoding():
+    # Imported on the first count, tiktoken is slow to import
+    try:
+        import tiktoken
+    except ImportError:  # tiktoken is optional, fall back to an estimate
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def warm_up():
+    """
+    Load the tokenizer on a background thread. Its first load imports tiktoken and
+    may download its vocabulary, which must not happen on the GUI thread.
+    """
+    threading.Thread(target=_encoding, name="tiktoken warm-up", daemon=True).start()
+
+
+def count_tokens(text):
+    """
+    Count the tokens of a text. Uses tiktoken when it is installed and loaded, and
+    an estimate of four characters per token otherwise.
+    """
+    encoding = _encoding()
+    if encoding is not None:
+        return _count_encoded(text)
+    # Estimates are not cached, so the exact count is used once the encoding is loaded
+    return (len(text) + 3) // 4
+
+
+@functools.lru_cache(maxsize=4096)
+def _count_encoded(text):
+    return len(_encoding_state["encoding"].encode(text))
+
+
+def count_message_tokens(message):
+    """ Count the tokens of a chat message, including the chat format overhead. """
+    return MESSAGE_OVERHEAD + count_tokens(message.get("content") or "")
+
+
+def has_code(message):
+    """ Return True if the message contains a fenced code block. """
+    return "```" in (message.get("content") or "")
+
+
+class ConversationContext:
+    """
+    Builds the context sent to the model from the conversation history.
+
+    - Leading system messages (the pre-prompt) are always kept.
+    - Only the latest assistant message keeps its code; the code blocks of
+      earlier revisions are replaced by a short placeholder.
+    - If the result is still over the token budget, the oldest turns are dropped
+      and replaced by a one-line-per-request summary, which itself takes at most
+      a quarter of the budget.
+    - The latest user message and the latest code revision are never dropped.
+
+    Attributes:
+        token_budget (int): The maximum number of prompt tokens to send.
+        summary_line_length (int): The maximum length of a line in the summary of dropped turns.
+    """
+    def __init__(self, token_budget=6000, summary_line_length=120):
+        self.token_budget = token_budget
+        self.summary_line_length = summary_line_length
+
+    def build(self, history):
+        """
+        Build the messages to send for the given conversation history.
+
+        Args:
+            history (list): The full conversation history.
+
+        Returns:
+            tuple: The list of messages and a dict of statistics with the keys
+                "tokens", "full_tokens", "omitted_code" and "dropped".
+        """
+        full_tokens = sum(count_message_tokens(message) for message in history)
+
+        pinned = []
+        index = 0
+        while index < len(history) and history[index].get("role") == "system":
+            pinned.append(history[index])
+            index += 1
+        turns = list(history[index:])
+
+        # Keep only the latest code revision
+        latest_code = max((i for i, m in enumerate(turns) if m.get("role") == "assistant" and has_code(m)), default=None)
+        omitted_code = 0
+        for i, message in enumerate(turns):
+            if i != latest_code and message.get("role") == "assistant" and has_code(message):
+                turns[i] = {"role": message["role"], "content": CODE_BLOCK.sub(OMITTED_CODE, message["content"])}
+                omitted_code += 1
+
+        latest_user = max((i for i, m in enumerate(turns) if m.get("role") == "user"), default=None)
+        protected = {i for i in (latest_code, latest_user) if i is not None}
+
+        pinned_tokens = sum(count_message_tokens(message) for message in pinned)
+        tokens = pinned_tokens + sum(count_message_tokens(message) for message in turns)
+        dropped = []
+        kept = list(range(len(turns)))
+        summary = None
+        while tokens > self.token_budget:
+            candidates = [i for i in kept if i not in protected]
+            if not candidates:
+                break
+            dropped.append(candidates[0])
+            kept.remove(candidates[0])
+            summary = self.summarize([turns[i] for i in sorted(dropped)], self.token_budget // 4)
+            tokens = (pinned_tokens + count_message_tokens(summary)
+                      + sum(count_message_tokens(turns[i]) for i in kept))
+
+        messages = list(pinned)
+        if summary is not None:
+            messages.append(summary)
+        messages.extend(turns[i] for i in kept)
+        stats = {"tokens": tokens, "full_tokens": full_tokens, "omitted_code": omitted_code, "dropped": len(dropped)}
+        return messages, stats
+
+    def summarize(self, messages, max_tokens):
+        """
+        Summarize dropped turns as a system message listing the earlier user requests.
+        The oldest requests are left out if the summary would exceed max_tokens.
+
+        Args:
+            messages (list): The dropped messages, oldest first.
+            max_tokens (int): The maximum number of tokens of the summary.
+
+        Returns:
+            dict: The summary message.
+        """
+        lines = []
+        for message in messages:
+            if message.get("role") != "user":
+                continue
+            text = " ".join(message.get("content", "").split())
+            if len(text) > self.summary_line_length:
+                text = text[:self.summary_line_length - 3] + "..."
+            lines.append(f"- {text}")
+        header = "Earlier in this conversation the user asked (older turns omitted to save space):\n"
+        content = header + "\n".join(lines)
+        while len(lines) > 1 and count_tokens(content) > max_tokens:
+            lines.pop(0)
+            content = header + "\n".join(lines)
+        return {"role": "system", "content": content}
@@ -0,0 +1,164 @@
+# ExportPipeline.py
+"""
+This module contains the ExportPipeline class, which exports the result of a
+successful run to STEP/STL/3MF files and renders its thumbnail in the background.
+It does not depend on Qt.
+
+Only the serialization of the shapes happens in FreeCAD: the top-level shapes of
+the document are written as BREP files, which is cheap. The tessellation, the
+exports and the thumbnail, which stall FreeCAD on large assemblies, run in
+FreeCADCmd workers of their own (see ScriptWorker.py), so they never compete
+with the script runs of the sandbox.
+"""
+import itertools
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from ScriptExecutor import ScriptExecutor
+
+EXPORT_FOLDER = "AI3DGenerator_exports"
+EXPORT_FORMATS = ("step", "stl", "3mf")
+
+
+def top_level_shapes(document):
+    """ Return the objects of a document that hold a shape and that no other object depends on. """
+    return [obj for obj in document.Objects
+            if not obj.InList and hasattr(obj, "Shape") and not obj.Shape.isNull()]
+
+
+class ExportResult:
+    """
+    The outcome of a background export.
+
+    Attributes:
+        ok (bool): True if every file was written.
+        traceback (str): The reason of the failure, if any.
+        files (dict): The paths of the exported files, by format.
+        thumbnail (str): The path of the thumbnail, or empty if none was rendered.
+        triangles (int): The number of triangles of the tessellation.
+        elapsed (float): The duration of the export in the worker, in seconds.
+        stages (dict): The duration of each stage in the worker ("load", "tessellate", "write", "thumbnail").
+        timed_out (bool): True if the export was killed for exceeding its time limit.
+    """
+    def __init__(self, ok, traceback="", files=None, thumbnail="", triangles=0, elapsed=0.0, stages=None, timed_out=False):
+        self.ok = ok
+        self.traceback = traceback
+        self.files = files or {}
+        self.thumbnail = thumbnail
+        self.triangles = triangles
+        self.elapsed = elapsed
+        self.stages = stages or {}
+        self.timed_out = timed_out
+
+
+class ExportPipeline:
+    """
+    Exports the results of runs in a pool of FreeCADCmd workers.
+
+    prepare() runs on the GUI thread and returns a job; run() is blocking and is
+    meant to be called from a background thread. At most pool_size exports run
+    at once, and prepare() refuses new exports while max_pending are waiting, so
+    a burst of runs cannot pile up BREP files and worker time.
+
+    Attributes:
+        executor (ScriptExecutor): The export workers.
+        folder (str): The folder the exported files and thumbnails are written to.
+        formats (tuple): The exported formats, among EXPORT_FORMATS.
+        thumbnail_size (int): The width and height of the thumbnails in pixels, 0 for none.
+        deflection (float): The linear deflection of the tessellation, in millimeters.
+        timeout (float): The wall-clock limit of an export, in seconds.
+        max_pending (int): The number of exports prepared and not finished beyond which new ones are refused.
+    """
+    def __init__(self, executor, folder, formats=("step", "stl"), thumbnail_size=256, deflection=0.1, timeout=300.0,
+                 max_pending=8):
+        self.executor = executor
+        self.folder = folder
+        self.formats = tuple(fmt for fmt in formats if fmt in EXPORT_FORMATS)
+        self.thumbnail_size = thumbnail_size
+        self.deflection = deflection
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.pending = 0
+        self._ids = itertools.count(1)
+
+    @classmethod
+    def for_freecadcmd(cls, folder, freecadcmd_path="", workers=1, memory_limit_mb=2048, **kwargs):
+        """
+        Create a pipeline whose workers run ScriptWorker.py with FreeCADCmd.
+
+        Returns:
+            ExportPipeline: The pipeline, or None if FreeCADCmd cannot be found.
+        """
+        executor = ScriptExecutor.for_freecadcmd(freecadcmd_path, pool_size=workers, memory_limit_mb=memory_limit_mb)
+        if executor is None:
+            return None
+        return cls(executor, folder, **kwargs)
+
+    def prepare(self, document, name):
+        """
+        Serialize the top-level shapes of a document for an export. Call it from the GUI thread.
+
+        Args:
+            document (App.Document): The document holding the result of the run.
+            name (str): The base name of the exported files, e.g. the session and run.
+
+        Returns:
+            dict: The job to pass to run(), or None if the document has no shape or too many exports are pending.
+        """
+        objects = top_level_shapes(document)
+        if not objects or self.pending >= self.max_pending:
+            return None
+        name = re.sub(r"[^\w.-]+", "_", name)
+        os.makedirs(self.folder, exist_ok=True)
+        brep_folder = tempfile.mkdtemp(prefix="AI3DGenerator_export_", dir=self.executor.output_folder)
+        start = time.perf_counter()
+        shapes = []
+        for index, obj in enumerate(objects):
+            path = os.path.join(brep_folder, f"{index}.brp")
+            obj.Shape.exportBrep(path)
+            shapes.append({"label": obj.Label, "path": path})
+        self.pending += 1
+        return {
+            "id": next(self._ids),
+            "op": "export",
+            "shapes": shapes,
+            "exports": {fmt: os.path.join(self.folder, f"{name}.{fmt}") for fmt in self.formats},
+            "deflection": self.deflection,
+            "thumbnail": os.path.join(self.folder, f"{name}.png") if self.thumbnail_size else "",
+            "thumbnail_size": self.thumbnail_size,
+            "serialize_elapsed": time.perf_counter() - start,
+        }
+
+    def run(self, job, cancel_event=None):
+        """
+        Run a prepared export in a worker and remove its BREP files. This call blocks until the export completes.
+
+        Returns:
+            ExportResult: The outcome of the export.
+        """
+        try:
+            message = self.executor.send_job(job, self.timeout, cancel_event)
+        finally:
+            shutil.rmtree(os.path.dirname(job["shapes"][0]["path"]), ignore_errors=True)
+        return ExportResult(
+            message["ok"],
+            traceback=message.get("traceback", ""),
+            files=message.get("exports", {}),
+            thumbnail=message.get("thumbnail", ""),
+            triangles=message.get("triangles", 0),
+            elapsed=message.get("elapsed", 0.0),
+            stages={stage: message[f"{stage}_elapsed"] for stage in ("load", "tessellate", "write", "thumbnail")
+                    if f"{stage}_elapsed" in message},
+            timed_out=message.get("timed_out", False),
+        )
+
+    def finished(self):
+        """ Release the slot of a prepared export, once its result was handled. Call it from the GUI thread. """
+        self.pending = max(0, self.pending - 1)
+
+    def shutdown(self):
+        """ Stop the export workers. """
+        self.executor.shutdown()
@@ -0,0 +1,256 @@
+# GeometryCache.py
+"""
+This module contains the GeometryCache class, a content-addressed cache of the
+documents built by generated scripts. It does not depend on Qt.
+
+A script that already ran with the same FreeCAD version is not run again: the
+document it built, saved as an FCStd file (which holds the BREP shapes and the
+document objects with their properties), is merged back into FreeCAD instead
+of recomputing every boolean, fillet and chamfer.
+"""
+import ast
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import Log
+
+GEOMETRY_FOLDER = "AI3DGenerator_geometry"
+INDEX_FILENAME = "index.sqlite"
+
+# Scripts importing these modules may build a different shape on each run
+NONDETERMINISTIC_MODULES = frozenset(("random", "secrets", "uuid", "time", "datetime"))
+
+
+def normalize_script(script):
+    """
+    Return a canonical form of a script, so that comments, blank lines and
+    formatting changes do not change its cache key.
+    """
+    try:
+        return ast.dump(ast.parse(script))
+    except SyntaxError:
+        return "\n".join(line.rstrip() for line in script.strip().splitlines() if line.strip())
+
+
+def is_deterministic(script):
+    """ Return False if the script imports a module whose results change from run to run. """
+    try:
+        tree = ast.parse(script)
+    except SyntaxError:
+        return False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            modules = [node.module or ""]
+        else:
+            continue
+        if any(module.split(".")[0] in NONDETERMINISTIC_MODULES for module in modules):
+            return False
+    return True
+
+
+def freecad_version():
+    """ Return the version of FreeCAD as a string, or an empty string outside of FreeCAD. """
+    try:
+        import FreeCAD
+        return ".".join(str(part) for part in FreeCAD.Version()[:4])
+    except (ImportError, AttributeError):
+        return ""
+
+
+class GeometryEntry:
+    """
+    A cached document.
+
+    Attributes:
+        key (str): The cache key.
+        path (str): The FCStd file holding the document.
+        objects (list): The names of the objects of the document.
+        document (str): The name of the document the script created, or empty if it
+            built its objects in the active document.
+        build_elapsed (float): How long the script took to build the document, in seconds.
+    """
+    def __init__(self, key, path, objects, document, build_elapsed):
+        self.key = key
+        self.path = path
+        self.objects = objects
+        self.document = document
+        self.build_elapsed = build_elapsed
+
+
+class GeometryCache:
+    """
+    A disk cache of the documents built by scripts, keyed on a hash of the
+    normalized script, the FreeCAD version and the execution context.
+
+    Each entry is an FCStd file in the cache folder, indexed in a SQLite database
+    holding its size, objects and last use. The folder is bounded by max_bytes,
+    evicting the least recently used entries. Runs faster than min_elapsed are
+    not worth caching and are ignored. The cache is thread-safe. If the folder or
+    the database cannot be used, the cache is disabled.
+
+    Attributes:
+        folder (str): The cache folder, or None for a disabled cache.
+        max_bytes (int): The maximum total size of the cached files.
+        min_elapsed (float): The shortest build, in seconds, that is cached.
+        version (str): The FreeCAD version the entries are valid for.
+    """
+    def __init__(self, folder=None, max_bytes=512 * 1024 * 1024, min_elapsed=0.25, version=None):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.min_elapsed = min_elapsed
+        self.version = freecad_version() if version is None else version
+        self._lock = threading.Lock()
+        self._db = None
+        if folder:
+            try:
+                os.makedirs(folder, exist_ok=True)
+                self._db = sqlite3.connect(os.path.join(folder, INDEX_FILENAME), check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    "key TEXT PRIMARY KEY, size INTEGER NOT NULL, objects TEXT, document TEXT, "
+                    "build_elapsed REAL, created REAL, last_used REAL)"
+                )
+                self._db.commit()
+            except (OSError, sqlite3.Error) as e:
+                Log.warning(f"Geometry cache disabled ({folder}): {e}\n")
+                self._db = None
+
+    @property
+    def enabled(self):
+        return self._db is not None
+
+    def make_key(self, script, context=""):
+        """
+        Compute the cache key of a script.
+
+        Args:
+            script (str): The script.
+            context (str): Anything else the result depends on, e.g. the execution mode.
+
+        Returns:
+            str: The SHA-256 hex digest, or None if the script is not deterministic.
+        """
+        if not is_deterministic(script):
+            return None
+        payload = "\0".join((self.version, context, normalize_script(script)))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.FCStd")
+
+    def get(self, key):
+        """ Return the GeometryEntry of a key, or None on a miss. """
+        if key is None:
+            return None
+        with self._lock:
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute("SELECT objects, document, build_elapsed FROM entries WHERE key = ?",
+                                       (key,)).fetchone()
+                if row is None:
+                    return None
+                path = self._path(key)
+                if not os.path.exists(path):  # Deleted behind our back
+                    self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._db.commit()
+                    return None
+                self._db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+            except sqlite3.Error as e:
+                Log.warning(f"Geometry cache read failed: {e}\n")
+                return None
+        objects, document, build_elapsed = row
+        return GeometryEntry(key, path, objects.split("\n") if objects else [], document or "", build_elapsed or 0.0)
+
+    def put(self, key, source_path, objects=(), document="", build_elapsed=0.0):
+        """
+        Copy the FCStd file of a successful run into the cache.
+
+        Args:
+            key (str): The cache key of the script.
+            source_path (str): The FCStd file holding the document built by the script.
+            objects (list): The names of the objects of the document.
+            document (str): The name of the document the script created, if any.
+            build_elapsed (float): How long the script took to run, in seconds.
+
+        Returns:
+            bool: True if the document was cached.
+        """
+        if key is None or build_elapsed < self.min_elapsed:
+            return False
+        with self._lock:
+            if self._db is None:
+                return False
+            path = self._path(key)
+            temporary = f"{path}.tmp"
+            try:
+                shutil.copyfile(source_path, temporary)
+                os.replace(temporary, path)
+                now = time.time()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries (key, size, objects, document, build_elapsed, created, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, os.path.getsize(path), "\n".join(objects), document, build_elapsed, now, now)
+                )
+                self._db.commit()
+                self._evict()
+            except (OSError, sqlite3.Error) as e:
+                Log.warning(f"Geometry cache write failed: {e}\n")
+                return False
+        return True
+
+    def _evict(self):
+        """ Remove the least recently used entries until the cache fits in max_bytes. """
+        rows = self._db.execute("SELECT key, size FROM entries ORDER BY last_used DESC").fetchall()
+        total = 0
+        evicted = []
+        for key, size in rows:
+            total += size
+            if total > self.max_bytes:
+                evicted.append(key)
+        for key in evicted:
+            if os.path.exists(self._path(key)):
+                os.remove(self._path(key))
+        if evicted:
+            self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in evicted])
+            self._db.commit()
+
+    def size(self):
+        """ Return the number of entries and their total size in bytes. """
+        with self._lock:
+            if self._db is None:
+                return 0, 0
+            try:
+                count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+            except sqlite3.Error:
+                return 0, 0
+        return count, total
+
+    def clear(self):
+        """ Remove every cached document. """
+        with self._lock:
+            if self._db is None:
+                return
+            try:
+                keys = [row[0] for row in self._db.execute("SELECT key FROM entries")]
+                for key in keys:
+                    if os.path.exists(self._path(key)):
+                        os.remove(self._path(key))
+                self._db.execute("DELETE FROM entries")
+                self._db.commit()
+            except (OSError, sqlite3.Error) as e:
+                Log.warning(f"Geometry cache clear failed: {e}\n")
+
+    def close(self):
+        """ Close the database connection. """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
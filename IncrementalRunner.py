@@ -0,0 +1,301 @@
+# IncrementalRunner.py
+"""
+This module contains the IncrementalRunner class, which runs revised scripts
+inside FreeCAD by re-running only the steps that changed. It does not depend on Qt.
+
+A script is split into steps, its top-level statements. Each step runs in its
+own FreeCAD transaction, and the namespace is saved after each step. When the
+next revision of the script shares its first steps with the last run, the
+transactions of the other steps are undone and only the changed suffix runs,
+starting from the namespace saved after the shared steps. Recomputing the
+document then only recomputes the objects the suffix touched.
+"""
+import ast
+import copy
+import time
+import traceback
+
+TRANSACTION_NAME = "AI3DGenerator run {} step {}"
+
+
+class Step:
+    """
+    A top-level statement of a script and what running it did.
+
+    Attributes:
+        key (str): The normalized statement, equal for equivalent statements.
+        code (code): The compiled statement, keeping its line numbers.
+        transaction (str): The name of the transaction of the step, unique to the run.
+        documents (set): The names of the documents the step created.
+        touched (set): The names of the other documents the step changed.
+    """
+    def __init__(self, key, code):
+        self.key = key
+        self.code = code
+        self.transaction = ""
+        self.documents = set()
+        self.touched = set()
+
+    @property
+    def changed(self):
+        return bool(self.documents or self.touched)
+
+
+class IncrementalResult:
+    """
+    The outcome of an incremental run.
+
+    Attributes:
+        ok (bool): True if the script ran without raising.
+        traceback (str): The traceback of the failure, if any.
+        steps (int): The number of steps of the script.
+        first_step (int): The index of the first step that ran; the steps before it were reused.
+        elapsed (float): The execution time, in seconds.
+        recompute_elapsed (float): The time spent in the final document recompute, in seconds.
+    """
+    def __init__(self, ok, traceback="", steps=0, first_step=0, elapsed=0.0, recompute_elapsed=0.0):
+        self.ok = ok
+        self.traceback = traceback
+        self.steps = steps
+        self.first_step = first_step
+        self.elapsed = elapsed
+        self.recompute_elapsed = recompute_elapsed
+
+    @property
+    def steps_run(self):
+        return self.steps - self.first_step
+
+
+def split_steps(script, filename="<string>"):
+    """
+    Split a script into its top-level statements.
+
+    Raises:
+        SyntaxError: If the script cannot be parsed.
+    """
+    tree = ast.parse(script, filename)
+    return [Step(ast.dump(node), compile(ast.Module([node], type_ignores=[]), filename, "exec"))
+            for node in tree.body]
+
+
+def snapshot(namespace):
+    """
+    Copy a namespace, and the lists, dicts and sets it holds, so that a later step
+    appending to a list of an earlier one does not change the copy.
+    """
+    return {name: copy.copy(value) if type(value) in (list, dict, set) else value
+            for name, value in namespace.items()}
+
+
+def undo_head(document):
+    """ Return the name of the last transaction of a document, or None. """
+    names = document.UndoNames
+    return names[0] if names else None
+
+
+class IncrementalRunner:
+    """
+    Runs scripts step by step in FreeCAD transactions, reusing the shared prefix of
+    the last run.
+
+    The last run is reused only when the documents are as it left them (the undo
+    stacks did not move), the active document is the same, the transactions to
+    undo are still on the undo stacks, and the shared steps changed a document.
+    A script sharing a step that changed a document with the last run, but no such
+    prefix, is a revision whose first change is at its start: every step of the last
+    run is undone and the script runs in full, so its objects are not duplicated.
+    A script sharing nothing of the kind, e.g. only its imports, is a new model and
+    runs in full next to what the last run built. A failing step undoes every step
+    of the run, leaving the shared prefix in place.
+
+    Attributes:
+        app (module): The FreeCAD module.
+        steps (list): The steps of the last run that are still applied.
+        namespaces (list): The namespace after each step of the last run.
+        base (dict): The namespace the last run started from.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.steps = []
+        self.namespaces = []
+        self.base = {}
+        self._undo_heads = {}
+        self._active_document = None
+        self._runs = 0
+
+    @staticmethod
+    def supported(app):
+        """ Return True if this FreeCAD version has application-wide transactions. """
+        return hasattr(app, "setActiveTransaction") and hasattr(app, "closeActiveTransaction")
+
+    def reset(self):
+        """ Forget the last run, so the next one runs in full. """
+        self.steps = []
+        self.namespaces = []
+        self._undo_heads = {}
+        self._active_document = None
+
+    def _documents(self):
+        return self.app.listDocuments()
+
+    def _active_name(self):
+        document = self.app.ActiveDocument
+        return document.Name if document is not None else None
+
+    def reusable_steps(self, steps):
+        """ Return the number of leading steps of the last run that can be kept for the new steps. """
+        if not self._last_run_intact():
+            return 0
+        shared = 0
+        while shared < min(len(steps), len(self.steps)) and steps[shared].key == self.steps[shared].key:
+            shared += 1
+        if not any(step.changed for step in self.steps[:shared]) or not self._undoable_from(shared):
+            return 0
+        return shared
+
+    def replaces_last_run(self, steps):
+        """
+        Return True if the steps revise the last run from its first step on: they share
+        a step that changed a document with it, but no prefix that can be kept.
+        """
+        if self.reusable_steps(steps) or not self._last_run_intact() or not self._undoable_from(0):
+            return False
+        keys = {step.key for step in steps}
+        return any(step.changed and step.key in keys for step in self.steps)
+
+    def revises(self, script):
+        """ Return True if a script would reuse the last run or replace it, rather than run next to it. """
+        try:
+            steps = split_steps(script)
+        except SyntaxError:
+            return False
+        return bool(self.reusable_steps(steps)) or self.replaces_last_run(steps)
+
+    def _last_run_intact(self):
+        """ Return True if there is a last run and the documents are as it left them. """
+        if not self.steps:
+            return False
+        documents = self._documents()
+        if set(documents) != set(self._undo_heads) or self._active_name() != self._active_document:
+            return False
+        # Changed since the last run, by the user or another run
+        return all(undo_head(documents[name]) == head for name, head in self._undo_heads.items())
+
+    def _undoable_from(self, index):
+        """ Return True if the transactions of the steps of the last run from index on are still on the undo stacks. """
+        documents = self._documents()
+        # FreeCAD bounds the undo stacks
+        for step in self.steps[index:]:
+            for name in step.touched - self._created_from(index):
+                if step.transaction not in documents[name].UndoNames:
+                    return False
+        return True
+
+    def _created_from(self, index):
+        """ Return the names of the documents created by the steps of the last run from index on. """
+        created = set()
+        for step in self.steps[index:]:
+            created |= step.documents
+        return created
+
+    def rollback(self, index):
+        """ Undo the steps of the last run from index on. """
+        created = self._created_from(index)
+        transactions = {step.transaction for step in self.steps[index:]}
+        for name, document in self._documents().items():
+            if name in created:
+                self.app.closeDocument(name)
+                continue
+            while document.UndoNames and document.UndoNames[0] in transactions:
+                document.undo()
+        del self.steps[index:]
+        del self.namespaces[index:]
+
+    def run(self, script, base_namespace):
+        """
+        Run a script, re-running only the steps that differ from the last run.
+
+        Args:
+            script (str): The script.
+            base_namespace (dict): The namespace a full run starts from; it is copied.
+
+        Returns:
+            IncrementalResult: The outcome of the run.
+        """
+        start = time.perf_counter()
+        self._runs += 1
+        try:
+            steps = split_steps(script)
+        except SyntaxError:
+            return IncrementalResult(False, traceback.format_exc(), elapsed=time.perf_counter() - start)
+        first = self.reusable_steps(steps)
+        if first:
+            self.rollback(first)
+            namespace = snapshot(self.namespaces[first - 1])
+        else:
+            if self.replaces_last_run(steps):
+                self.rollback(0)
+            # Otherwise a new model: keep what the last run built, and start over
+            self.reset()
+            self.base = dict(base_namespace)
+            namespace = dict(self.base)
+        for index in range(first, len(steps)):
+            error = self._run_step(steps[index], index, namespace)
+            if error is not None:
+                self.rollback(first)
+                self._record_state()
+                return IncrementalResult(False, error, len(steps), first, time.perf_counter() - start)
+            self.steps.append(steps[index])
+            self.namespaces.append(snapshot(namespace))
+        recompute_start = time.perf_counter()
+        try:
+            if self.app.ActiveDocument is not None:
+                self.app.ActiveDocument.recompute()
+        except Exception:
+            self.rollback(first)
+            self._record_state()
+            return IncrementalResult(False, traceback.format_exc(), len(steps), first, time.perf_counter() - start)
+        recompute_elapsed = time.perf_counter() - recompute_start
+        self._record_state()
+        return IncrementalResult(True, "", len(steps), first, time.perf_counter() - start, recompute_elapsed)
+
+    def _run_step(self, step, index, namespace):
+        """
+        Run a step in its own transaction. Returns the traceback of a failure, or None.
+
+        Undo is turned on for the active document, the one scripts change, during the
+        step only. If the user turned it off, turning it back off drops the transaction
+        of the step, so the next revision of the script runs in full.
+        """
+        documents = self._documents()
+        active = self._active_name()
+        undo_mode = documents[active].UndoMode if active is not None else None
+        if active is not None:
+            documents[active].UndoMode = 1
+        step.transaction = TRANSACTION_NAME.format(self._runs, index + 1)
+        self.app.setActiveTransaction(step.transaction)
+        try:
+            exec(step.code, namespace)
+        except Exception:
+            self.app.closeActiveTransaction(True)
+            self._restore_undo_mode(active, undo_mode)
+            for name in set(self._documents()) - set(documents):
+                self.app.closeDocument(name)
+            return traceback.format_exc()
+        self.app.closeActiveTransaction()
+        after = self._documents()
+        step.documents = set(after) - set(documents)
+        step.touched = {name for name in documents if name in after and undo_head(after[name]) == step.transaction}
+        self._restore_undo_mode(active, undo_mode)
+        return None
+
+    def _restore_undo_mode(self, name, undo_mode):
+        """ Give a document the undo mode it had before a step, unless the step closed it. """
+        document = self._documents().get(name) if name is not None else None
+        if document is not None and document.UndoMode != undo_mode:
+            document.UndoMode = undo_mode
+
+    def _record_state(self):
+        """ Remember the undo stacks and the active document the run left, to detect later changes. """
+        self._undo_heads = {name: undo_head(document) for name, document in self._documents().items()}
+        self._active_document = self._active_name()
@@ -15,10 +15,16 @@ class AI3DGeneratorWorkbench(FreeCADGui.Workbench):
     ToolTip = "Generate and execute 3D models with AI code generation"
 
     def Initialize(self):
-        """ Initialize the workbench. """
-        from AI3DGenerator import AI3DGeneratorCommand
-        FreeCADGui.addCommand('AI3DGenerator', AI3DGeneratorCommand())
+        """
+        Initialize the workbench.
+        Only the command is registered here; the widget is built when the command is first activated.
+        """
+        import time
+        start = time.perf_counter()
+        from AI3DGenerator import register_command, record_startup_time
+        register_command()
         self.appendToolbar("AI Tools", ["AI3DGenerator"])
+        record_startup_time("workbench", start)
 
     def GetClassName(self):
         """ Return the name of this workbench. """
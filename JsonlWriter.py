@@ -0,0 +1,88 @@
+# JsonlWriter.py
+"""
+This module contains the JsonlWriter class, which appends JSON records to a
+JSON Lines file from a background thread, so the callers never wait on disk I/O.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+
+import Log
+
+
+class JsonlWriter:
+    """
+    Appends records to a JSONL file on a background thread.
+
+    The thread is started and the file is created on the first record, so a
+    writer that is never used leaves nothing behind. A closed writer drops the
+    records written to it.
+
+    Attributes:
+        path (str): The path of the file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def write(self, record):
+        """ Queue a record (a JSON-serializable dict) to be appended to the file. """
+        with self._lock:
+            if self._closed:
+                Log.warning(f"Record not saved to {self.path}: the writer is closed\n")
+                return
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"JsonlWriter {os.path.basename(self.path)}", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+            self._queue.put(record)
+
+    def is_started(self):
+        """ Return True once a record has been written. """
+        return self._thread is not None
+
+    def flush(self):
+        """ Wait until every queued record has been written. """
+        self._queue.join()
+
+    def is_closed(self):
+        """ Return True once the writer was closed. """
+        return self._closed
+
+    def close(self):
+        """ Write the pending records and stop the writer thread. Later records are dropped. """
+        with self._lock:
+            self._closed = True
+            if self._thread is None:
+                return
+            atexit.unregister(self.close)
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self):
+        """ Append the queued records to the file; runs on the writer thread. """
+        file = None
+        while True:
+            record = self._queue.get()
+            try:
+                if record is None:
+                    break
+                if file is None:
+                    folder = os.path.dirname(self.path)
+                    if folder:
+                        os.makedirs(folder, exist_ok=True)
+                    file = open(self.path, "a", encoding="utf-8")
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                if self._queue.empty():
+                    file.flush()
+            except (OSError, TypeError, ValueError) as e:
+                Log.warning(f"Record not saved to {self.path}: {e}\n")
+            finally:
+                self._queue.task_done()
+        if file is not None:
+            file.close()
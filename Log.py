@@ -0,0 +1,35 @@
+# Log.py
+"""
+Console output for the modules shared with the headless batch mode. Messages go
+to the FreeCAD report view when FreeCAD is available, and to stderr otherwise.
+"""
+import sys
+
+try:
+    import FreeCAD
+except ImportError:  # Headless batch mode outside of FreeCAD
+    FreeCAD = None
+
+
+def message(text):
+    """ Print an informational message. """
+    if FreeCAD is not None:
+        FreeCAD.Console.PrintMessage(text)
+    else:
+        sys.stderr.write(text)
+
+
+def warning(text):
+    """ Print a warning. """
+    if FreeCAD is not None:
+        FreeCAD.Console.PrintWarning(text)
+    else:
+        sys.stderr.write(f"Warning: {text}")
+
+
+def error(text):
+    """ Print an error. """
+    if FreeCAD is not None:
+        FreeCAD.Console.PrintError(text)
+    else:
+        sys.stderr.write(f"Error: {text}")
@@ -0,0 +1,177 @@
+# Metrics.py
+"""
+This module contains the Metrics class, which collects per-stage timers and
+counters of the AI requests and script runs, summarizes them and exports them
+as JSON, CSV or a JSONL metrics file.
+"""
+import csv
+import json
+import statistics
+import time
+
+from JsonlWriter import JsonlWriter
+
+# Record kinds
+REQUEST = "request"
+DEBUG = "debug"
+REPAIR = "repair"
+RUN = "run"
+ROUTE = "route"
+EXPORT = "export"
+
+# Numeric fields summarized per kind, in milliseconds unless noted
+TIMERS = ("queue_ms", "ttft_ms", "api_ms", "latency_ms", "parse_ms", "validate_ms", "exec_ms", "recompute_ms", "merge_ms", "restore_ms",
+          "serialize_ms", "tessellate_ms", "write_ms", "thumbnail_ms", "total_ms")
+COUNTERS = ("prompt_tokens", "completion_tokens", "retries", "iteration", "rounds", "steps", "steps_run", "saved_tokens", "triangles")
+FIELDS = ("time", "kind", "ok", "model", "cache_hit", "streamed", "mode", "repair_format", "tier", "escalated") + TIMERS + COUNTERS
+
+
+class Metrics:
+    """
+    Records one entry per AI request, debugging iteration, repair, script run or
+    background export of a result, and per outcome of the script of a model tier (a "route" entry).
+
+    Each entry is a flat dict holding its kind, the time it was recorded and the
+    measured stages (see TIMERS and COUNTERS). When the collector is disabled,
+    record() returns at once, so the instrumented code pays a single attribute
+    check. Listeners are called with each new entry, on the recording thread.
+
+    Attributes:
+        enabled (bool): Whether entries are recorded.
+        max_records (int): The number of entries kept in memory.
+        path (str): The JSONL metrics file every entry is appended to, or None.
+        listeners (list): Callables called with each new entry.
+    """
+    def __init__(self, enabled=True, path=None, max_records=1000):
+        self.enabled = enabled
+        self.max_records = max_records
+        self.listeners = []
+        self.path = None
+        self._writer = None
+        self._records = []
+        self.set_path(path)
+
+    def set_path(self, path):
+        """ Append the entries to a JSONL metrics file, or stop with None. """
+        if path == self.path:
+            return
+        if self._writer is not None:
+            self._writer.close()
+        self.path = path or None
+        self._writer = JsonlWriter(self.path) if self.path else None
+
+    def record(self, kind, **values):
+        """
+        Record an entry. Values that are None are left out.
+
+        Returns:
+            dict: The entry, or None when the collector is disabled.
+        """
+        if not self.enabled:
+            return None
+        entry = {"time": time.time(), "kind": kind}
+        entry.update((key, round(value, 3) if isinstance(value, float) else value)
+                     for key, value in values.items() if value is not None)
+        self._records.append(entry)
+        if len(self._records) > self.max_records:
+            del self._records[:len(self._records) - self.max_records]
+        if self._writer is not None:
+            self._writer.write(entry)
+        for listener in self.listeners:
+            listener(entry)
+        return entry
+
+    def records(self, kind=None):
+        """ Return the recorded entries, optionally of a single kind. """
+        return [entry for entry in self._records if kind is None or entry["kind"] == kind]
+
+    def clear(self):
+        """ Forget the entries kept in memory. The metrics file is left untouched. """
+        self._records = []
+
+    def summary(self):
+        """
+        Summarize the entries.
+
+        Returns:
+            dict: The counters ("requests", "cache_hits", "debug_iterations", "repairs",
+            "runs", "failed_runs", "restored_runs", "exports", "prompt_tokens", "completion_tokens", "saved_tokens"),
+            per repair format of the debugging iterations the count and mean tokens and latency,
+            per model tier the requests, their mean latency and the outcomes of their scripts,
+            the number of escalations to the strong tier, and, per kind, the count, mean,
+            median and 95th percentile of every timer.
+        """
+        requests = self.records(REQUEST) + self.records(DEBUG)
+        runs = self.records(RUN)
+        summary = {
+            "requests": len(requests),
+            "cache_hits": sum(1 for entry in requests if entry.get("cache_hit")),
+            "debug_iterations": len(self.records(DEBUG)),
+            "repairs": len(self.records(REPAIR)),
+            "runs": len(runs),
+            "failed_runs": sum(1 for entry in runs if not entry.get("ok")),
+            "restored_runs": sum(1 for entry in runs if entry.get("cache_hit")),
+            "exports": len(self.records(EXPORT)),
+            "prompt_tokens": sum(entry.get("prompt_tokens", 0) for entry in requests),
+            "completion_tokens": sum(entry.get("completion_tokens", 0) for entry in requests),
+            "saved_tokens": sum(entry.get("saved_tokens", 0) for entry in requests),
+            "repair_formats": {},
+            "tiers": {},
+            "escalations": sum(1 for entry in requests if entry.get("escalated")),
+            "stages": {},
+        }
+        for entry in self.records(DEBUG):
+            if "repair_format" in entry:
+                summary["repair_formats"].setdefault(entry["repair_format"], []).append(entry)
+        for repair_format, entries in summary["repair_formats"].items():
+            summary["repair_formats"][repair_format] = {"n": len(entries)}
+            for field in ("prompt_tokens", "completion_tokens", "latency_ms"):
+                values = [entry[field] for entry in entries if field in entry]
+                if values:
+                    summary["repair_formats"][repair_format][field] = round(statistics.mean(values), 3)
+        for entry in requests:
+            if "tier" in entry:
+                tier = summary["tiers"].setdefault(entry["tier"], {"requests": 0, "latency": [], "runs": 0, "succeeded": 0})
+                tier["requests"] += 1
+                if "latency_ms" in entry:
+                    tier["latency"].append(entry["latency_ms"])
+        for entry in self.records(ROUTE):
+            tier = summary["tiers"].setdefault(entry["tier"], {"requests": 0, "latency": [], "runs": 0, "succeeded": 0})
+            tier["runs"] += 1
+            tier["succeeded"] += 1 if entry.get("ok") else 0
+        for tier in summary["tiers"].values():
+            latency = tier.pop("latency")
+            if latency:
+                tier["latency_ms"] = round(statistics.mean(latency), 3)
+        for kind in (REQUEST, DEBUG, REPAIR, RUN, EXPORT):
+            entries = self.records(kind)
+            stages = {}
+            for timer in TIMERS:
+                values = sorted(entry[timer] for entry in entries if timer in entry)
+                if values:
+                    stages[timer] = {
+                        "n": len(values),
+                        "mean": round(statistics.mean(values), 3),
+                        "median": round(statistics.median(values), 3),
+                        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                    }
+            if stages:
+                summary["stages"][kind] = stages
+        return summary
+
+    def export_json(self, path):
+        """ Write the summary and the entries to a JSON file. """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump({"summary": self.summary(), "records": self._records}, file, indent=2)
+
+    def export_csv(self, path):
+        """ Write the entries to a CSV file, one row per entry. """
+        with open(path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(self._records)
+
+    def close(self):
+        """ Write the pending entries to the metrics file. """
+        if self._writer is not None:
+            self._writer.close()
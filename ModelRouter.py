@@ -0,0 +1,99 @@
+# ModelRouter.py
+"""
+This module contains the ModelRouter class, which sends each AI request to a
+model tier according to its kind. It does not depend on Qt.
+
+Requests are of three kinds: a new design, a small edit of the last script, or
+the repair of a failing script. Each kind goes to a tier, a model with its own
+temperature and max tokens, so trivial follow-ups and mechanical fixes can use
+a fast model. When the script of a fast tier fails the validation or its run,
+the request is escalated to the strong tier: the model of the settings.
+"""
+import re
+
+# Request kinds, and the tier of the settings model
+DESIGN = "design"
+EDIT = "edit"
+REPAIR = "repair"
+STRONG = "strong"
+TIER_KINDS = (DESIGN, EDIT, REPAIR)
+
+# The model, temperature and max tokens of each tier by default; no model means the model of the settings
+DEFAULT_TIERS = {
+    DESIGN: ("", 1.0, 2048),
+    EDIT: ("gpt-3.5-turbo", 0.3, 2048),
+    REPAIR: ("gpt-3.5-turbo", 0.2, 2048),
+}
+
+EDIT_MAX_WORDS = 40  # Longer prompts describe a new design, not a tweak
+NEW_DESIGN_PATTERN = re.compile(
+    r"^\s*(please\s+)?(create|design|build|generate|model|make)\s+(me\s+)?(a|an)\b"
+    r"|\b(new|another|different)\s+(part|model|design|object|assembly)\b"
+    r"|\b(from scratch|start over)\b",
+    re.IGNORECASE
+)
+CODE_BLOCK_PATTERN = re.compile(r"^```", re.MULTILINE)
+
+
+class Tier:
+    """
+    A model and the parameters requests routed to it are sent with.
+
+    Attributes:
+        name (str): The kind of the requests of the tier, or "strong".
+        model (str): The model.
+        temperature (float): The temperature of the requests.
+        max_tokens (int): The maximum number of tokens of the responses.
+    """
+    def __init__(self, name, model, temperature, max_tokens):
+        self.name = name
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+    def __repr__(self):
+        return f"Tier({self.name!r}, {self.model!r}, {self.temperature}, {self.max_tokens})"
+
+
+def classify(history):
+    """
+    Return the kind of the request answering the last user message of a conversation:
+    "design" before any script was generated, or when the message asks for a new
+    part or is long, and "edit" for a short change of the last script.
+    """
+    prompt = next((message["content"] for message in reversed(history) if message["role"] == "user"), "")
+    has_code = any(message["role"] == "assistant" and CODE_BLOCK_PATTERN.search(message["content"])
+                   for message in history)
+    if not has_code or len(prompt.split()) > EDIT_MAX_WORDS or NEW_DESIGN_PATTERN.search(prompt):
+        return DESIGN
+    return EDIT
+
+
+class ModelRouter:
+    """
+    Picks the tier of each request, and the tier a failed request is escalated to.
+
+    Attributes:
+        tiers (dict): The Tier of each request kind.
+        strong (Tier): The tier of the settings model, which failed requests are escalated to.
+        enabled (bool): Whether requests are routed; when off, every request goes to the strong tier.
+    """
+    def __init__(self, tiers, strong, enabled=True):
+        self.tiers = tiers
+        self.strong = strong
+        self.enabled = enabled
+
+    def route(self, kind):
+        """ Return the tier of a request kind. """
+        if not self.enabled:
+            return self.strong
+        return self.tiers.get(kind, self.strong)
+
+    def escalation(self, tier):
+        """
+        Return the tier to send a request to again after the script of a tier failed,
+        or None when the tier already uses the strong model.
+        """
+        if not self.enabled or tier is None or tier.name == STRONG or tier.model == self.strong.model:
+            return None
+        return self.strong
@@ -0,0 +1,178 @@
+# ParallelRepair.py
+"""
+This module contains the ParallelRepair class, which repairs a failing script by
+requesting several candidate fixes at once and running them in parallel in the
+sandbox workers, keeping the first one that works.
+"""
+import time
+
+from PySide2 import QtCore
+
+
+class ParallelRepair(QtCore.QObject):
+    """
+    Races N candidate fixes of a failing script.
+
+    Each round requests N fixes concurrently. Every fix is executed in a sandbox
+    worker as soon as it arrives, unless the validation rejects it; the first one that runs successfully wins and
+    every other request and run is cancelled. If the whole round fails, the next
+    round repairs one of the failed candidates with its own error. The repair
+    stops after max_rounds rounds, when the time budget is spent, or when the
+    sandbox cannot run a candidate at all.
+
+    Signals:
+        succeeded (str, ExecutionResult): The winning script and its sandbox result.
+        failed (str): The repair gave up; the argument is the reason.
+        progress (str): A status message for the chat.
+
+    Attributes:
+        candidates (int): The number of fixes requested per round.
+        max_rounds (int): The maximum number of rounds.
+        time_budget (float): The total time allowed for the repair, in seconds.
+        request_timeout (float): The time limit of each AI request, in seconds.
+    """
+    succeeded = QtCore.Signal(str, object)
+    failed = QtCore.Signal(str)
+    progress = QtCore.Signal(str)
+
+    def __init__(self, request_engine, executor, request_fix, candidates=3, max_rounds=3,
+                 time_budget=180.0, request_timeout=120.0, validate=None, parent=None):
+        """
+        Args:
+            request_engine (RequestEngine): The engine running the requests and the sandbox runs.
+            executor (ScriptExecutor): The sandbox worker pool.
+            request_fix (callable): Called as request_fix(script, error_message, request, candidate)
+                on a worker thread; returns the fixed script, or None.
+            validate (callable): Called with each fix before it runs; returns an error message
+                to reject the fix without running it, or None.
+        """
+        super().__init__(parent)
+        self.request_engine = request_engine
+        self.executor = executor
+        self.request_fix = request_fix
+        self.candidates = candidates
+        self.max_rounds = max_rounds
+        self.time_budget = time_budget
+        self.request_timeout = request_timeout
+        self.validate = validate
+        self._requests = []
+        self._pending = 0
+        self._round = 0
+        self._failures = []
+        self._done = True
+        self._started_at = 0.0
+        self._budget_timer = QtCore.QTimer(self)
+        self._budget_timer.setSingleShot(True)
+        self._budget_timer.timeout.connect(lambda: self._finish_failed(f"The repair time budget of {self.time_budget:g} seconds was spent."))
+
+    def is_running(self):
+        """ Return True while a repair is in progress. """
+        return not self._done
+
+    def start(self, script, error_message):
+        """
+        Start repairing a script.
+
+        Args:
+            script (str): The failing script.
+            error_message (str): Its error traceback.
+        """
+        self._done = False
+        self._round = 0
+        self._started_at = time.monotonic()
+        self._budget_timer.start(int(self.time_budget * 1000))
+        self._start_round(script, error_message)
+
+    def cancel(self):
+        """ Stop the repair and cancel every in-flight request and run. """
+        self._finish_failed("The repair was cancelled.")
+
+    def rounds(self):
+        """ Return the number of rounds of the current (or last) repair. """
+        return self._round
+
+    def elapsed(self):
+        """ Return the time spent on the current (or last) repair, in seconds. """
+        return time.monotonic() - self._started_at
+
+    def _start_round(self, script, error_message):
+        self._round += 1
+        self._failures = []
+        self._pending = self.candidates
+        self.progress.emit(f"Repair round {self._round}: requesting {self.candidates} candidate fixes in parallel...")
+        for candidate in range(self.candidates):
+            request = self.request_engine.submit(
+                lambda request, candidate=candidate: self.request_fix(script, error_message, request, candidate),
+                timeout=self.request_timeout,
+                on_finished=lambda request, code, candidate=candidate: self._on_fix(request, code, candidate),
+                on_failed=lambda request, message: self._on_candidate_failed(None, message)
+            )
+            self._requests.append(request)
+
+    def _on_fix(self, request, code, candidate):
+        self._forget(request)
+        if self._done:
+            return
+        if not code:
+            self._on_candidate_failed(None, "The AI did not return a fix.")
+            return
+        error_message = self.validate(code) if self.validate is not None else None
+        if error_message:
+            self.progress.emit(f"Candidate {candidate + 1} rejected by the static validation.")
+            self._on_candidate_failed(code, error_message)
+            return
+        self.progress.emit(f"Candidate {candidate + 1} received, running it in the sandbox...")
+        run = self.request_engine.submit(
+            lambda request: self.executor.execute(code, cancel_event=request.cancel_event),
+            on_finished=lambda request, result: self._on_result(request, code, result, candidate),
+            on_failed=lambda request, message: self._on_candidate_failed(code, message)
+        )
+        self._requests.append(run)
+
+    def _on_result(self, request, code, result, candidate):
+        self._forget(request)
+        if self._done:
+            return
+        if result.ok:
+            self.progress.emit(f"Candidate {candidate + 1} works (round {self._round}, {self.elapsed():.1f} s).")
+            self._finish()
+            self.succeeded.emit(code, result)
+        elif result.infrastructure:
+            # The sandbox failed, not the fix: another round would only repair the sandbox error
+            self._finish_failed(f"The sandbox could not run the candidate fixes: {result.traceback}")
+        else:
+            self._on_candidate_failed(code, result.traceback)
+
+    def _on_candidate_failed(self, code, error_message):
+        if self._done:
+            return
+        if code is not None:
+            self._failures.append((code, error_message))
+        self._pending -= 1
+        if self._pending > 0:
+            return
+        if not self._failures:
+            self._finish_failed("No candidate fix could be obtained from the AI.")
+        elif self._round >= self.max_rounds:
+            self._finish_failed(f"No candidate worked after {self._round} rounds.")
+        else:
+            # Repair the first failed candidate with its own error
+            self._start_round(*self._failures[0])
+
+    def _forget(self, request):
+        if request in self._requests:
+            self._requests.remove(request)
+
+    def _finish(self):
+        """ Stop the repair and cancel whatever is still running. """
+        self._done = True
+        self._budget_timer.stop()
+        for request in self._requests:
+            self.request_engine.cancel(request)
+        self._requests = []
+
+    def _finish_failed(self, reason):
+        if self._done:
+            return
+        self._finish()
+        self.failed.emit(reason)
@@ -0,0 +1,219 @@
+# RequestEngine.py
+"""
+This module contains the RequestEngine class, which runs blocking jobs such as
+OpenAI requests on a background thread pool and delivers their results back to
+the GUI thread through Qt signals.
+"""
+import itertools
+import threading
+import time
+import traceback
+
+from PySide2 import QtCore
+
+
+class RequestCancelled(Exception):
+    """ Raised inside a job when its request has been cancelled or has timed out. """
+
+
+class Request:
+    """
+    A handle for a single background job.
+
+    Attributes:
+        id (int): A unique identifier for the request.
+        timeout (float): The wall-clock limit in seconds, or None for no limit.
+        submitted_at (float): The monotonic time the request was submitted.
+        started_at (float): The monotonic time a worker picked the request up.
+        timed_out (bool): True if the request was abandoned because of its timeout.
+        info (dict): Free-form data the job can attach for the GUI (e.g. cache hits).
+    """
+    def __init__(self, request_id, timeout=None):
+        self.id = request_id
+        self.timeout = timeout
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.timed_out = False
+        self.info = {}
+        self._cancel_event = threading.Event()
+        self._signals = None
+
+    def cancel(self):
+        """ Mark the request as cancelled. Its result will be discarded. """
+        self._cancel_event.set()
+
+    def is_cancelled(self):
+        """ Return True if the request has been cancelled or has timed out. """
+        return self._cancel_event.is_set()
+
+    def check_cancelled(self):
+        """ Raise RequestCancelled if the request has been cancelled. """
+        if self._cancel_event.is_set():
+            raise RequestCancelled()
+
+    @property
+    def cancel_event(self):
+        """ The threading.Event set when the request is cancelled, for jobs that wait on it. """
+        return self._cancel_event
+
+    def remaining_time(self):
+        """ Return the number of seconds left before the timeout, or None if there is no timeout. """
+        if self.timeout is None:
+            return None
+        started = self.started_at if self.started_at is not None else time.monotonic()
+        return max(0.0, self.timeout - (time.monotonic() - started))
+
+    def emit_progress(self, data):
+        """ Send intermediate data (e.g. a streamed chunk) to the GUI thread. """
+        if self._signals is not None and not self.is_cancelled():
+            self._signals.progress.emit(self, data)
+
+
+class _RequestSignals(QtCore.QObject):
+    """ Signals emitted by the workers. They are delivered on the GUI thread. """
+    finished = QtCore.Signal(object, object)
+    failed = QtCore.Signal(object, str)
+    progress = QtCore.Signal(object, object)
+
+
+class _RequestWorker(QtCore.QRunnable):
+    """ Runs a single job on a QThreadPool thread. """
+    def __init__(self, request, fn, signals):
+        super().__init__()
+        self.request = request
+        self.fn = fn
+        self.signals = signals
+
+    def run(self):
+        self.request.started_at = time.monotonic()
+        if self.request.is_cancelled():
+            return
+        try:
+            result = self.fn(self.request)
+        except RequestCancelled:
+            return
+        except Exception:
+            self.signals.failed.emit(self.request, traceback.format_exc())
+        else:
+            self.signals.finished.emit(self.request, result)
+
+
+class RequestEngine(QtCore.QObject):
+    """
+    A background request engine built on a QThreadPool.
+
+    Jobs are plain callables that receive their Request handle. They run on a
+    worker thread, so they must not touch any widget. Results, errors and
+    progress updates are delivered on the GUI thread, either through the
+    per-request callbacks given to submit() or through the engine signals.
+
+    A cancelled or timed out request is dropped immediately: the GUI gets
+    control back at once and whatever the worker returns later is discarded.
+
+    Signals:
+        busy_changed (bool): Emitted when the engine goes from idle to busy or back.
+        request_cancelled (Request): Emitted when a request is cancelled by the user.
+        request_timed_out (Request): Emitted when a request exceeds its timeout.
+
+    Attributes:
+        pool (QtCore.QThreadPool): The thread pool running the jobs.
+    """
+    busy_changed = QtCore.Signal(bool)
+    request_cancelled = QtCore.Signal(object)
+    request_timed_out = QtCore.Signal(object)
+
+    def __init__(self, parent=None, max_threads=4):
+        super().__init__(parent)
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self._ids = itertools.count(1)
+        self._requests = {}
+
+        self._signals = _RequestSignals(self)
+        self._signals.finished.connect(self._on_finished, QtCore.Qt.QueuedConnection)
+        self._signals.failed.connect(self._on_failed, QtCore.Qt.QueuedConnection)
+        self._signals.progress.connect(self._on_progress, QtCore.Qt.QueuedConnection)
+
+        self._watchdog = QtCore.QTimer(self)
+        self._watchdog.setInterval(250)
+        self._watchdog.timeout.connect(self._check_timeouts)
+
+    def submit(self, fn, timeout=None, on_finished=None, on_failed=None, on_progress=None):
+        """
+        Run a job in the background.
+
+        Args:
+            fn (callable): The job. It is called as fn(request) on a worker thread.
+            timeout (float): The wall-clock limit in seconds, or None for no limit.
+            on_finished (callable): Called as on_finished(request, result) on success.
+            on_failed (callable): Called as on_failed(request, message) on error or timeout.
+            on_progress (callable): Called as on_progress(request, data) for each progress update.
+
+        Returns:
+            Request: The handle of the submitted request.
+        """
+        request = Request(next(self._ids), timeout)
+        request._signals = self._signals
+        was_busy = self.is_busy()
+        self._requests[request.id] = (request, on_finished, on_failed, on_progress)
+        self.pool.start(_RequestWorker(request, fn, self._signals))
+        if not self._watchdog.isActive():
+            self._watchdog.start()
+        if not was_busy:
+            self.busy_changed.emit(True)
+        return request
+
+    def cancel(self, request=None):
+        """
+        Cancel a request, or every in-flight request if none is given.
+        """
+        requests = [request] if request is not None else self.active_requests()
+        for req in requests:
+            if self._discard(req) is not None:
+                req.cancel()
+                self.request_cancelled.emit(req)
+
+    def active_requests(self):
+        """ Return the list of requests that have not completed yet. """
+        return [entry[0] for entry in self._requests.values()]
+
+    def is_busy(self):
+        """ Return True if at least one request is in flight. """
+        return bool(self._requests)
+
+    def _discard(self, request):
+        """ Forget a request and return its entry, updating the busy state. """
+        entry = self._requests.pop(request.id, None)
+        if entry is not None and not self._requests:
+            self._watchdog.stop()
+            self.busy_changed.emit(False)
+        return entry
+
+    def _on_finished(self, request, result):
+        entry = self._discard(request)
+        if entry is not None and entry[1] is not None:
+            entry[1](request, result)
+
+    def _on_failed(self, request, message):
+        entry = self._discard(request)
+        if entry is not None and entry[2] is not None:
+            entry[2](request, message)
+
+    def _on_progress(self, request, data):
+        entry = self._requests.get(request.id)
+        if entry is not None and entry[3] is not None:
+            entry[3](request, data)
+
+    def _check_timeouts(self):
+        """ Abandon the requests that have run longer than their timeout. """
+        now = time.monotonic()
+        for request in self.active_requests():
+            if request.timeout is None or request.started_at is None:
+                continue
+            if now - request.started_at > request.timeout:
+                request.timed_out = True
+                request.cancel()
+                entry = self._discard(request)
+                self.request_timed_out.emit(request)
+                if entry is not None and entry[2] is not None:
+                    entry[2](request, f"Request timed out after {request.timeout:g} seconds.")
@@ -0,0 +1,139 @@
+# ResponseCache.py
+"""
+This module contains the ResponseCache class, a content-addressed cache for the
+OpenAI completions with an in-memory LRU tier and a persistent SQLite tier.
+"""
+import collections
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+import Log
+
+CACHE_FILENAME = "AI3DGenerator_cache.sqlite"
+
+CACHE_ALWAYS = "always"
+CACHE_DETERMINISTIC = "deterministic"
+CACHE_OFF = "off"
+CACHE_MODES = (CACHE_ALWAYS, CACHE_DETERMINISTIC, CACHE_OFF)
+
+
+class ResponseCache:
+    """
+    A two-tier cache of AI responses keyed on a hash of the request.
+
+    The memory tier is an LRU bounded by max_entries. The disk tier is a SQLite
+    database bounded by max_disk_entries, evicting the least recently used rows.
+    The cache is thread-safe, so it can be used from the RequestEngine workers.
+    If the database cannot be opened, the cache silently runs in memory only.
+
+    Attributes:
+        path (str): The path of the SQLite database, or None for a memory-only cache.
+        max_entries (int): The maximum number of responses kept in memory.
+        max_disk_entries (int): The maximum number of responses kept on disk.
+    """
+    def __init__(self, path=None, max_entries=256, max_disk_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            try:
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL, last_used REAL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                Log.warning(f"Response cache disabled on disk ({path}): {e}\n")
+                self._db = None
+
+    @staticmethod
+    def make_key(model, temperature, max_tokens, messages):
+        """
+        Compute the cache key of a request.
+
+        Args:
+            model (str): The AI model.
+            temperature (float): The temperature parameter.
+            max_tokens (int): The maximum number of tokens.
+            messages (list): The messages sent to the model.
+
+        Returns:
+            str: The SHA-256 hex digest of the request.
+        """
+        payload = json.dumps(
+            {"model": model, "temperature": float(temperature), "max_tokens": int(max_tokens), "messages": messages},
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """ Return the cached response for the key, or None on a miss. """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+            except sqlite3.Error as e:
+                Log.warning(f"Response cache read failed: {e}\n")
+                return None
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, key, response):
+        """ Store a response in both tiers. """
+        with self._lock:
+            self._remember(key, response)
+            if self._db is None:
+                return
+            now = time.time()
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+                    (key, response, now, now)
+                )
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_disk_entries,)
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                Log.warning(f"Response cache write failed: {e}\n")
+
+    def clear(self):
+        """ Remove every cached response from both tiers. """
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM responses")
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    Log.warning(f"Response cache clear failed: {e}\n")
+
+    def close(self):
+        """ Close the database connection. """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, key, response):
+        self._memory[key] = response
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
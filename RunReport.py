@@ -0,0 +1,68 @@
+# RunReport.py
+"""
+Markdown reports of script runs. The widget records its runs in a SessionStore,
+which renders these reports on demand; the batch mode writes one per prompt.
+"""
+import os
+import time
+
+
+def render_run_report(conversation_history, model, temperature, max_tokens, error_traceback=None, run_date=None,
+                      files=None, thumbnail=None):
+    """
+    Render the markdown report of a script run.
+
+    Args:
+        conversation_history (list): The messages of the conversation.
+        model (str): The AI model.
+        temperature (float): The temperature parameter.
+        max_tokens (int): The maximum number of tokens.
+        error_traceback (str): The traceback of a failed run, or None for a successful run.
+        run_date (float): The time of the run, defaults to now.
+        files (dict): The paths of the files exported from the result, by format, if any.
+        thumbnail (str): The path of the thumbnail of the result, if any.
+
+    Returns:
+        str: The report.
+    """
+    run_date = time.localtime(run_date) if run_date is not None else time.localtime()
+    chat_history = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation_history])
+    parts = [
+        "# Script generated by AI3DGenerator\n\n",
+        f"## Run Date: {time.strftime('%Y-%m-%d %H:%M:%S', run_date)}\n\n",
+        f"## Settings:\n\n- Model: {model}\n- Temperature: {temperature}\n- Max Tokens: {max_tokens}\n\n",
+    ]
+    if files or thumbnail:
+        parts.append("## Exports:\n\n")
+        if thumbnail:
+            parts.append(f"![Thumbnail]({thumbnail})\n\n")
+        parts.extend(f"- {fmt.upper()}: {path}\n" for fmt, path in (files or {}).items())
+        parts.append("\n")
+    if error_traceback is None:
+        parts.append(f"## Chat history:\n{chat_history}\n\n")
+    else:
+        parts.append(f"# Chat history:\n{chat_history}\n\n")
+        parts.append(f"\n\n# Error running script:\n{error_traceback}")
+    return "".join(parts)
+
+
+def write_run_report(save_folder, conversation_history, model, temperature, max_tokens, error_traceback=None, name=None, run_date=None,
+                     files=None, thumbnail=None):
+    """
+    Write the markdown report of a script run to the save folder.
+
+    Args:
+        name (str): The file name without extension, defaults to a timestamped name.
+        run_date (float): The time of the run, defaults to now.
+        See render_run_report for the other arguments.
+
+    Returns:
+        str: The path of the report.
+    """
+    if name is None:
+        name = f"AI3DGenerator_{time.strftime('%Y%m%d-%H%M%S')}" + ("_error" if error_traceback is not None else "")
+    save_path = os.path.join(save_folder, f"{name}.md")
+    with open(save_path, 'w') as file:
+        file.write(render_run_report(conversation_history, model, temperature, max_tokens, error_traceback, run_date,
+                                     files, thumbnail))
+    return save_path
@@ -0,0 +1,339 @@
+# ScriptExecutor.py
+"""
+This module contains the ScriptExecutor class, which runs generated scripts in a
+pool of warm, sandboxed FreeCADCmd worker processes (see ScriptWorker.py), with
+wall-clock and memory limits.
+
+The module does not depend on Qt; execute() is blocking and is meant to be
+called from a background thread.
+"""
+import atexit
+import itertools
+import json
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from ScriptWorker import PROTOCOL_PREFIX
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ScriptWorker.py")
+FREECADCMD_NAMES = ("FreeCADCmd", "freecadcmd", "FreeCADCmd.exe")
+
+
+def find_freecadcmd(configured=""):
+    """
+    Find the FreeCADCmd executable.
+
+    Args:
+        configured (str): A path set by the user, tried first.
+
+    Returns:
+        str: The path of the executable, or None if it cannot be found.
+    """
+    if configured and os.path.isfile(configured):
+        return configured
+    # FreeCADCmd usually lives next to the FreeCAD executable
+    folder = os.path.dirname(sys.executable)
+    for name in FREECADCMD_NAMES:
+        candidate = os.path.join(folder, name)
+        if os.path.isfile(candidate):
+            return candidate
+    for name in FREECADCMD_NAMES:
+        found = shutil.which(name)
+        if found:
+            return found
+    return None
+
+
+class ExecutionResult:
+    """
+    The outcome of a sandboxed script run.
+
+    Attributes:
+        ok (bool): True if the script ran without raising.
+        traceback (str): The traceback of the failure, if any.
+        output_path (str): The FCStd file holding the resulting document.
+        objects (list): The names of the objects in the resulting document.
+        exports (dict): The exported files, by export name.
+        elapsed (float): The execution time in seconds, measured in the worker.
+        recompute_elapsed (float): The part of elapsed spent in the final document recompute.
+        timed_out (bool): True if the run was killed for exceeding its time limit.
+        infrastructure (bool): True if the script never reached a worker (none became available, or it
+            exited first) or its run was cancelled, so the failure says nothing of the script.
+    """
+    def __init__(self, ok, traceback="", output_path="", objects=None, exports=None, elapsed=0.0, timed_out=False, recompute_elapsed=0.0,
+                 infrastructure=False):
+        self.ok = ok
+        self.traceback = traceback
+        self.output_path = output_path
+        self.objects = objects or []
+        self.exports = exports or {}
+        self.elapsed = elapsed
+        self.recompute_elapsed = recompute_elapsed
+        self.timed_out = timed_out
+        self.infrastructure = infrastructure
+
+
+class WorkerProcess:
+    """
+    A single sandbox worker process and the thread reading its protocol messages.
+    """
+    def __init__(self, command, memory_limit_mb):
+        env = dict(os.environ)
+        env["AI3DGENERATOR_MEMORY_MB"] = str(memory_limit_mb)
+        self.process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=env,
+            cwd=os.path.dirname(WORKER_SCRIPT),
+            text=True,
+            bufsize=1,
+        )
+        self.messages = queue.Queue()
+        self.ready = False
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        for line in self.process.stdout:
+            if line.startswith(PROTOCOL_PREFIX):
+                self.messages.put(json.loads(line[len(PROTOCOL_PREFIX):]))
+        self.messages.put(None)  # The process exited
+
+    def wait_message(self, timeout):
+        """ Return the next message, None if the process died, or raise queue.Empty on timeout. """
+        return self.messages.get(timeout=timeout)
+
+    def send(self, job):
+        self.process.stdin.write(json.dumps(job) + "\n")
+        self.process.stdin.flush()
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        if self.is_alive():
+            self.process.kill()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+class ScriptExecutor:
+    """
+    Runs scripts in a pool of pre-started FreeCADCmd processes.
+
+    Workers are started ahead of time, so a run does not pay FreeCAD's startup
+    cost. A worker that exceeds the time limit, runs out of memory or crashes is
+    killed and replaced in the background; the GUI process is never affected.
+
+    Attributes:
+        command (list): The command starting a worker.
+        pool_size (int): The number of warm workers.
+        timeout (float): The default wall-clock limit of a run, in seconds.
+        memory_limit_mb (int): The address space limit of a worker, in megabytes (0 for none).
+        startup_timeout (float): The time allowed for a worker to import FreeCAD.
+        output_folder (str): The folder where the resulting FCStd files are written.
+    """
+    def __init__(self, command, pool_size=2, timeout=60.0, memory_limit_mb=2048, startup_timeout=60.0):
+        self.command = command
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.startup_timeout = startup_timeout
+        self.output_folder = tempfile.mkdtemp(prefix="AI3DGenerator_")
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = 0
+        self._ids = itertools.count(1)
+        self._workers = set()
+        self._closed = False
+        atexit.register(self.shutdown)
+
+    @classmethod
+    def for_freecadcmd(cls, freecadcmd_path="", **kwargs):
+        """
+        Create an executor running ScriptWorker.py with FreeCADCmd.
+
+        Returns:
+            ScriptExecutor: The executor, or None if FreeCADCmd cannot be found.
+        """
+        executable = find_freecadcmd(freecadcmd_path)
+        if executable is None:
+            return None
+        return cls([executable, WORKER_SCRIPT], **kwargs)
+
+    def start(self):
+        """ Start the warm workers in the background. """
+        with self._lock:
+            missing = max(0, self.pool_size - self._started)
+            self._started += missing
+        for _ in range(missing):
+            self._spawn_thread()
+
+    def _spawn(self):
+        """ Start a worker and wait until it has imported FreeCAD. Returns None on failure. """
+        worker = WorkerProcess(self.command, self.memory_limit_mb)
+        with self._lock:
+            self._workers.add(worker)
+        try:
+            message = worker.wait_message(self.startup_timeout)
+        except queue.Empty:
+            message = None
+        if not message or not message.get("ready"):
+            self._discard(worker)
+            return None
+        worker.ready = True
+        return worker
+
+    def _spawn_async(self):
+        with self._lock:
+            self._started += 1
+        self._spawn_thread()
+
+    def _spawn_thread(self):
+        """ Start a worker on a background thread; the caller has already counted it in _started. """
+        def spawn():
+            worker = self._spawn()
+            if worker is None:
+                with self._lock:
+                    self._started -= 1
+            elif self._closed:
+                self._discard(worker)
+            else:
+                self._idle.put(worker)
+        threading.Thread(target=spawn, daemon=True).start()
+
+    def _discard(self, worker):
+        worker.kill()
+        with self._lock:
+            self._workers.discard(worker)
+
+    def _acquire(self, deadline):
+        """ Take an idle worker, starting the pool if needed. """
+        if self._started < self.pool_size:
+            self.start()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("No sandbox worker became available in time.")
+            try:
+                worker = self._idle.get(timeout=min(remaining, 0.5))
+            except queue.Empty:
+                if self._started == 0:
+                    raise RuntimeError(f"Could not start a sandbox worker with: {' '.join(self.command)}")
+                continue
+            if worker.is_alive():
+                return worker
+            self._replace(worker)
+
+    def _replace(self, worker):
+        """ Kill a worker and start a new one in its place. """
+        self._discard(worker)
+        with self._lock:
+            self._started -= 1
+        if not self._closed:
+            self._spawn_async()
+
+    def execute(self, script, timeout=None, cancel_event=None, output_path=None, exports=None):
+        """
+        Run a script in a sandbox worker. This call blocks until the run completes.
+
+        Args:
+            script (str): The script to run.
+            timeout (float): The wall-clock limit in seconds, defaults to self.timeout.
+            cancel_event (threading.Event): Set it to abort the run and kill the worker.
+            output_path (str): Where to save the resulting document, defaults to a file in output_folder.
+            exports (dict): Files to export the resulting shapes to, by name, e.g. {"step": "part.step"}.
+
+        Returns:
+            ExecutionResult: The outcome of the run.
+        """
+        job_id = next(self._ids)
+        output_path = output_path or os.path.join(self.output_folder, f"result_{job_id}.FCStd")
+        message = self.send_job({"id": job_id, "op": "run", "script": script, "output_path": output_path,
+                                 "exports": exports or {}}, timeout, cancel_event)
+        return ExecutionResult(
+            message["ok"],
+            traceback=message.get("traceback", ""),
+            output_path=message.get("output_path", ""),
+            objects=message.get("objects", []),
+            exports=message.get("exports", {}),
+            elapsed=message.get("elapsed", 0.0),
+            recompute_elapsed=message.get("recompute_elapsed", 0.0),
+            timed_out=message.get("timed_out", False),
+            infrastructure=message.get("infrastructure", False),
+        )
+
+    def send_job(self, job, timeout=None, cancel_event=None):
+        """
+        Send a job to a sandbox worker and wait for its response. This call blocks
+        until the job completes.
+
+        Args:
+            job (dict): The job (see ScriptWorker.py); its "id" is set when missing.
+            timeout (float): The wall-clock limit in seconds, defaults to self.timeout.
+            cancel_event (threading.Event): Set it to abort the job and kill the worker.
+
+        Returns:
+            dict: The response of the worker. When the job could not complete, "ok" is
+            False, "traceback" says why, "timed_out" is True if it ran out of time, and
+            "infrastructure" is True if it never reached a worker or was cancelled.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout + self.startup_timeout
+        job_id = job.setdefault("id", next(self._ids))
+        what = "script" if job.get("op") == "run" else "job"
+        try:
+            worker = self._acquire(deadline)
+        except (TimeoutError, RuntimeError) as e:
+            return {"ok": False, "traceback": str(e), "infrastructure": True}
+
+        try:
+            worker.send(job)
+        except OSError:
+            self._replace(worker)
+            return {"ok": False, "traceback": f"The sandbox worker exited before the {what} was sent.", "infrastructure": True}
+
+        run_deadline = time.monotonic() + timeout
+        while True:
+            if cancel_event is not None and cancel_event.is_set():
+                self._replace(worker)
+                return {"ok": False, "traceback": f"The {what} run was cancelled.", "infrastructure": True}
+            remaining = run_deadline - time.monotonic()
+            if remaining <= 0:
+                self._replace(worker)
+                return {"ok": False, "traceback": f"The {what} did not finish within {timeout:g} seconds and was stopped.",
+                        "timed_out": True}
+            try:
+                message = worker.wait_message(min(remaining, 0.25))
+            except queue.Empty:
+                continue
+            if message is None:
+                try:
+                    code = worker.process.wait(timeout=1)
+                except subprocess.TimeoutExpired:
+                    code = None
+                self._replace(worker)
+                return {"ok": False, "traceback": f"The sandbox worker crashed (exit code {code}). "
+                                                  f"The {what} may have run out of memory."}
+            if message.get("id") == job_id:
+                self._idle.put(worker)
+                return message
+
+    def shutdown(self):
+        """ Stop every worker. """
+        self._closed = True
+        atexit.unregister(self.shutdown)
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            self._discard(worker)
+        shutil.rmtree(self.output_folder, ignore_errors=True)
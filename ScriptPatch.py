@@ -0,0 +1,274 @@
+# ScriptPatch.py
+"""
+This module contains the patch repair protocol: instead of sending the whole
+failing script and getting a whole new one back, the AI gets the traceback and
+the numbered lines around the error, and answers with a unified diff that is
+applied locally. It does not depend on Qt.
+
+Completion tokens dominate the latency of a request, and a patch is a few lines
+where a rewrite repeats the whole script. A patch that does not apply is reported
+with PatchError, and the caller falls back to asking for the full script.
+"""
+import ast
+import re
+
+from AIClient import build_repair_messages
+from ConversationContext import count_message_tokens, count_tokens
+from SnippetIndex import with_references
+from StreamParser import extract_reasoning_and_code, split_response
+
+CONTEXT_LINES = 8  # Lines sent before and after each error line
+MAX_WINDOW_LINES = 80  # Above this, the window is no cheaper than the script
+SEARCH_RADIUS = 30  # How far from its line numbers a hunk is looked for first
+
+PATCH_INSTRUCTIONS = (
+    "Reply with a unified diff that fixes the script, in a ```diff block. Use hunks such as\n"
+    "@@ -12,3 +12,4 @@\n"
+    "with the line numbers shown, unchanged context lines starting with a space, removed lines with '-' "
+    "and added lines with '+'. Do not copy the line numbers into the lines. Keep the diff as short as possible. "
+    "If the fix needs lines that are not shown, reply with the whole fixed script in a ```python block instead."
+)
+
+TRACEBACK_LINE_PATTERN = re.compile(r'File "<string>", line (\d+)')
+VALIDATION_LINE_PATTERN = re.compile(r"^\s*line (\d+): ", re.MULTILINE)
+HUNK_HEADER_PATTERN = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@", re.MULTILINE)
+DIFF_LANGUAGES = ("diff", "patch", "udiff")
+NUMBERED_LINE_PATTERN = re.compile(r"^\s*\d+\s?\| ?")
+
+
+class PatchError(Exception):
+    """ Raised when a patch cannot be read or applied to the script. """
+
+
+class Hunk:
+    """
+    A change of a unified diff.
+
+    Attributes:
+        start (int): The 1-based line of the script where the hunk applies, or 0 if unknown.
+        old (list): The lines the hunk replaces, context included.
+        new (list): The lines replacing them.
+    """
+    def __init__(self, start=0):
+        self.start = start
+        self.old = []
+        self.new = []
+
+
+def error_lines(error_message):
+    """ Return the lines of the script named by a traceback or a validation report, in order. """
+    lines = [int(line) for line in TRACEBACK_LINE_PATTERN.findall(error_message)]
+    lines += [int(line) for line in VALIDATION_LINE_PATTERN.findall(error_message)]
+    match = re.search(r"SyntaxError.*?line (\d+)", error_message)
+    if match:
+        lines.append(int(match.group(1)))
+    return sorted(set(lines))
+
+
+def line_window(script, lines, context=CONTEXT_LINES):
+    """
+    Return the numbered lines of the script around the given lines, with "..."
+    between the ranges that are not contiguous, or None if no line is in the script.
+    """
+    script_lines = script.splitlines()
+    ranges = []
+    for line in lines:
+        if not 1 <= line <= len(script_lines):
+            continue
+        start, end = max(1, line - context), min(len(script_lines), line + context)
+        if ranges and start <= ranges[-1][1] + 1:
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([start, end])
+    if not ranges:
+        return None
+    width = len(str(len(script_lines)))
+    parts = []
+    previous_end = 0
+    for start, end in ranges:
+        if start > previous_end + 1:
+            parts.append("...")
+        parts.extend(f"{number:>{width}}| {script_lines[number - 1]}" for number in range(start, end + 1))
+        previous_end = end
+    if previous_end < len(script_lines):
+        parts.append("...")
+    return "\n".join(parts)
+
+
+def build_patch_messages(script, error_message, context=CONTEXT_LINES):
+    """
+    Build the messages asking the AI for a patch of a failing script.
+
+    Returns:
+        list: The messages, or None if the error does not point at lines of the script, or
+        if the window would be about as long as the script; a full repair is better then.
+    """
+    window = line_window(script, error_lines(error_message), context)
+    if window is None or window.count("\n") + 1 > min(MAX_WINDOW_LINES, len(script.splitlines()) * 2 // 3):
+        return None
+    prompt = (f"A FreeCAD script of {len(script.splitlines())} lines caused an error.\n\n"
+              f"Error message:\n{error_message}\n\nThe lines around the error:\n{window}\n\n{PATCH_INSTRUCTIONS}")
+    return [{"role": "user", "content": prompt}]
+
+
+def parse_patch(text):
+    """
+    Read the hunks of a unified diff. The ---/+++ file headers are optional.
+
+    Raises:
+        PatchError: If the text holds no hunk.
+    """
+    hunks = []
+    for line in text.splitlines():
+        header = HUNK_HEADER_PATTERN.match(line)
+        if header:
+            hunks.append(Hunk(int(header.group(1))))
+            continue
+        if line.startswith("@@"):  # A header without line numbers
+            hunks.append(Hunk())
+            continue
+        if not hunks or line.startswith(("--- ", "+++ ", "\\")):
+            continue  # File headers and "\ No newline at end of file"
+        prefix, body = (line[0], line[1:]) if line else (" ", "")
+        if prefix not in " +-":
+            prefix, body = " ", line  # A context line that lost its leading space
+        body = NUMBERED_LINE_PATTERN.sub("", body, count=1)
+        if prefix in " -":
+            hunks[-1].old.append(body)
+        if prefix in " +":
+            hunks[-1].new.append(body)
+    hunks = [hunk for hunk in hunks if hunk.old != hunk.new]
+    if not hunks:
+        raise PatchError("The response holds no diff hunk.")
+    return hunks
+
+
+def indentation(line):
+    return line[:len(line) - len(line.lstrip())]
+
+
+def find_block(lines, block, expected, radius=SEARCH_RADIUS):
+    """
+    Find where a block of lines appears in the script, nearest to the expected
+    index first. Lines are compared exactly, then ignoring trailing whitespace,
+    then ignoring all surrounding whitespace.
+
+    Returns:
+        tuple: The index of the block and the comparison that matched, or (None, None).
+    """
+    comparisons = (
+        ("exact", lambda line: line),
+        ("rstrip", lambda line: line.rstrip()),
+        ("strip", lambda line: line.strip()),
+    )
+    count = len(lines) - len(block) + 1
+    expected = min(max(expected, 0), max(count - 1, 0))
+    # Candidates ordered by their distance to the expected index, the nearby ones first
+    order = sorted(range(max(count, 0)), key=lambda index: (abs(index - expected) > radius, abs(index - expected)))
+    for name, normalize in comparisons:
+        wanted = [normalize(line) for line in block]
+        for index in order:
+            if all(normalize(lines[index + offset]) == wanted[offset] for offset in range(len(block))):
+                return index, name
+    return None, None
+
+
+def apply_patch(script, hunks):
+    """
+    Apply hunks to a script, looking for each hunk near its line numbers first.
+
+    Returns:
+        str: The patched script.
+
+    Raises:
+        PatchError: If a hunk cannot be found in the script, or the result is not valid Python.
+    """
+    lines = script.splitlines()
+    offset = 0
+    for number, hunk in enumerate(hunks, 1):
+        expected = hunk.start - 1 + offset if hunk.start else 0
+        if not hunk.old:  # A pure insertion
+            if not hunk.start:
+                raise PatchError(f"Hunk {number} adds lines without saying where.")
+            index = min(max(hunk.start + offset, 0), len(lines))
+            lines[index:index] = hunk.new
+            offset += len(hunk.new)
+            continue
+        index, comparison = find_block(lines, hunk.old, expected)
+        if index is None:
+            raise PatchError(f"Hunk {number} does not match the script: {hunk.old[0].strip()!r}")
+        new = hunk.new
+        if comparison == "strip":
+            # Re-indent the new lines like the lines they replace
+            shift = indentation(lines[index]), indentation(hunk.old[0])
+            new = [shift[0] + line[len(shift[1]):] if line.startswith(shift[1]) else line for line in new]
+        lines[index:index + len(hunk.old)] = new
+        offset += len(new) - len(hunk.old)
+    patched = "\n".join(lines) + ("\n" if script.endswith("\n") else "")
+    try:
+        ast.parse(patched)
+    except SyntaxError as e:
+        raise PatchError(f"The patched script is not valid Python: {e.msg} (line {e.lineno})")
+    return patched
+
+
+def apply_response(script, response):
+    """
+    Apply the answer to a patch request: a diff block, or a whole fixed script.
+
+    Returns:
+        tuple: The fixed script and "patch" or "rewrite".
+
+    Raises:
+        PatchError: If the diff does not apply.
+    """
+    _, blocks = split_response(response)
+    diffs = [code for language, code in blocks if language in DIFF_LANGUAGES or HUNK_HEADER_PATTERN.search(code)]
+    if diffs:
+        return apply_patch(script, [hunk for diff in diffs for hunk in parse_patch(diff)]), "patch"
+    if not blocks and re.search(r"^@@", response, re.MULTILINE):
+        return apply_patch(script, parse_patch(response)), "patch"
+    if blocks:
+        return extract_reasoning_and_code(response)[1], "rewrite"
+    raise PatchError("The response holds neither a diff nor a script.")
+
+
+def saved_tokens(script, error_message, response):
+    """
+    Estimate the tokens a patch saved over a full repair of the same script: the full
+    prompt and the script sent back, minus the patch prompt and response. The API
+    references are left out, as both requests send the same ones.
+    """
+    patch_messages = build_patch_messages(script, error_message) or []
+    full_prompt = sum(count_message_tokens(message) for message in build_repair_messages(script, error_message))
+    patch_prompt = sum(count_message_tokens(message) for message in patch_messages)
+    return full_prompt + count_tokens(f"```python\n{script}\n```") - patch_prompt - count_tokens(response)
+
+
+def repair(complete, script, error_message, reference=None, patch=True):
+    """
+    Ask for a fix of a failing script with the patch protocol, falling back to a full
+    rewrite when the error has no line of the script or the patch does not apply.
+
+    Args:
+        complete (callable): Sends a list of messages and returns the response, or None.
+        reference (dict): A message of API references sent with the requests, if any.
+        patch (bool): Whether to try the patch protocol first.
+
+    Returns:
+        tuple: The fixed script (None if no request succeeded), and how it was obtained:
+        "patch", "rewrite" (the model sent a whole script), "fallback" (the patch did not
+        apply and a full rewrite was requested) or "full" (patches were not tried).
+    """
+    messages = build_patch_messages(script, error_message) if patch else None
+    if messages is not None:
+        response = complete(with_references(messages, reference))
+        if not response:
+            return None, "patch"
+        try:
+            return apply_response(script, response)
+        except PatchError:
+            response = complete(with_references(build_repair_messages(script, error_message), reference))
+            return (extract_reasoning_and_code(response)[1] if response else None), "fallback"
+    response = complete(with_references(build_repair_messages(script, error_message), reference))
+    return (extract_reasoning_and_code(response)[1] if response else None), "full"
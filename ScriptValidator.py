@@ -0,0 +1,356 @@
+# ScriptValidator.py
+"""
+This module contains the ScriptValidator class, which checks a generated script
+statically before it runs: syntax errors, forbidden operations (file system,
+processes, network, dynamic code), names that are never defined, and
+references to FreeCAD modules, attributes and object types that do not exist.
+It does not depend on Qt.
+
+A failed validation is reported like a traceback, so it goes through the same
+repair path as a failed run without touching the document.
+"""
+import ast
+import builtins
+import difflib
+import json
+import os
+import time
+
+import Log
+from SnippetIndex import API_MODULES, api_fingerprint, supported_types
+
+SYMBOLS_FILENAME = "AI3DGenerator_symbols.json"
+
+# Modules whose import is refused, with the reason given to the model
+FORBIDDEN_MODULES = {
+    "subprocess": "starts processes",
+    "shutil": "modifies the file system",
+    "socket": "opens network connections",
+    "urllib": "opens network connections",
+    "http": "opens network connections",
+    "requests": "opens network connections",
+    "ftplib": "opens network connections",
+    "ctypes": "calls native code",
+    "multiprocessing": "starts processes",
+    "pty": "starts processes",
+    "importlib": "imports modules dynamically",
+}
+# Functions refused wherever they come from
+FORBIDDEN_BUILTINS = {
+    "open": "accesses the file system, use the FreeCAD export functions instead",
+    "eval": "runs dynamic code",
+    "exec": "runs dynamic code",
+    "compile": "runs dynamic code",
+    "__import__": "imports modules dynamically",
+    "breakpoint": "stops the script",
+    "input": "waits for console input",
+    "exit": "stops FreeCAD",
+    "quit": "stops FreeCAD",
+}
+# Functions of the os module that are allowed; os.path is always allowed
+ALLOWED_OS_FUNCTIONS = frozenset(("getcwd", "getenv", "environ", "sep", "linesep", "path", "fspath"))
+# Names of the namespace referring to modules, e.g. in the sandbox App is FreeCAD
+MODULE_ALIASES = {"FreeCAD": "FreeCAD", "App": "FreeCAD", "Part": "Part", "Sketcher": "Sketcher",
+                  "Draft": "Draft", "Mesh": "Mesh", "os": "os"}
+# Module attributes that FreeCAD sets at run time
+DYNAMIC_ATTRIBUTES = frozenset(("ActiveDocument", "GuiUp", "Gui"))
+
+
+class SymbolTable:
+    """
+    The names defined by the FreeCAD modules, and the object types of doc.addObject.
+
+    Attributes:
+        modules (dict): Module name to the set of its attribute names.
+        classes (dict): "Module.Class" to the set of its attribute names.
+        types (set): The object types supported by doc.addObject, e.g. "Part::Box".
+    """
+    def __init__(self, modules=None, classes=None, types=None):
+        self.modules = modules or {}
+        self.classes = classes or {}
+        self.types = set(types or ())
+
+    @classmethod
+    def collect(cls, module_names=API_MODULES):
+        """ Introspect the FreeCAD modules that can be imported. """
+        table = cls()
+        for module_name in module_names:
+            try:
+                module = __import__(module_name)
+            except Exception:
+                continue
+            table.modules[module_name] = set(dir(module))
+            for name in dir(module):
+                obj = getattr(module, name, None)
+                if isinstance(obj, type):
+                    table.classes[f"{module_name}.{name}"] = set(dir(obj))
+        table.types = set(supported_types() or ())
+        return table
+
+    @classmethod
+    def load(cls, path, module_names=API_MODULES):
+        """
+        Return the symbol table cached in a JSON file, collecting it again when the
+        FreeCAD version or the object types changed. Outside of FreeCAD, the cached
+        table is returned as is, or an empty table if there is none.
+        """
+        cached = None
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as file:
+                    cached = json.load(file)
+            except (OSError, ValueError) as e:
+                Log.warning(f"Symbol table cache ignored ({path}): {e}\n")
+        fingerprint = api_fingerprint(module_names)
+        if fingerprint is None:
+            return cls.from_dict(cached) if cached else cls()
+        types = supported_types()
+        if cached and cached.get("fingerprint") == fingerprint and (types is None or len(types) == len(cached["types"])):
+            return cls.from_dict(cached)
+        table = cls.collect(module_names)
+        if not table.types and cached:
+            table.types = set(cached["types"])  # No document open: keep the types collected earlier
+        if path:
+            try:
+                with open(path, "w", encoding="utf-8") as file:
+                    json.dump(dict(table.to_dict(), fingerprint=fingerprint), file)
+            except OSError as e:
+                Log.warning(f"Symbol table not cached ({path}): {e}\n")
+        return table
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls({name: set(names) for name, names in data["modules"].items()},
+                   {name: set(names) for name, names in data["classes"].items()},
+                   data["types"])
+
+    def to_dict(self):
+        return {"modules": {name: sorted(names) for name, names in self.modules.items()},
+                "classes": {name: sorted(names) for name, names in self.classes.items()},
+                "types": sorted(self.types)}
+
+
+class ValidationResult:
+    """
+    The outcome of a validation.
+
+    Attributes:
+        issues (list): (line, message) pairs, in line order.
+        elapsed (float): The duration of the validation, in seconds.
+    """
+    def __init__(self, issues=(), elapsed=0.0):
+        self.issues = sorted(issues)
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return not self.issues
+
+    def format(self):
+        """ Describe the issues like a traceback, for the user and for the repair prompt. """
+        lines = ["Static validation failed, the script was not run:"]
+        lines += [f"  line {line}: {message}" for line, message in self.issues]
+        return "\n".join(lines) + "\n"
+
+
+class ScriptValidator:
+    """
+    Checks scripts statically with the ast module.
+
+    Attribute references are only checked on names bound to an imported module
+    of the symbol table, e.g. Part.makeBox or FreeCAD.Vector, and on classes of
+    these modules; attributes of other objects cannot be known without running
+    the script. Names are checked without scopes: a name is defined if it is
+    bound anywhere in the script, by the namespace or by Python.
+
+    Attributes:
+        symbols (SymbolTable): The FreeCAD names, or an empty table to skip these checks.
+        predefined (set): The names defined by the namespace the script runs in.
+    """
+    def __init__(self, symbols=None, predefined=()):
+        self.symbols = symbols or SymbolTable()
+        self.predefined = set(predefined)
+
+    def validate(self, script):
+        """
+        Validate a script.
+
+        Returns:
+            ValidationResult: The issues found, none if the script may run.
+        """
+        start = time.perf_counter()
+        try:
+            tree = ast.parse(script)
+        except SyntaxError as e:
+            message = f"SyntaxError: {e.msg}"
+            if e.text:
+                message += f": {e.text.strip()}"
+            return ValidationResult([(e.lineno or 0, message)], time.perf_counter() - start)
+        checker = _Checker(self.symbols)
+        checker.aliases.update((name, MODULE_ALIASES[name]) for name in self.predefined if name in MODULE_ALIASES)
+        checker.visit(tree)
+        issues = checker.issues
+        if not checker.star_import:
+            defined = checker.bound | self.predefined | set(dir(builtins)) | {"__name__", "__file__"}
+            for name, line in checker.loaded:
+                if name not in defined:
+                    issues.append((line, f"NameError: name '{name}' is not defined{suggest(name, defined)}"))
+        return ValidationResult(issues, time.perf_counter() - start)
+
+
+def suggest(name, candidates):
+    """ Return a ", did you mean ...?" hint for a misspelled name, or an empty string. """
+    matches = difflib.get_close_matches(name, [c for c in candidates if not c.startswith("_")], n=1, cutoff=0.75)
+    return f", did you mean '{matches[0]}'?" if matches else ""
+
+
+def dotted_name(node):
+    """ Return "a.b.c" for a chain of attributes on a name, or None. """
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return ".".join(reversed(parts))
+    return None
+
+
+class _Checker(ast.NodeVisitor):
+    """ Walks the syntax tree, collecting the issues and the bound and loaded names. """
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.issues = []
+        self.bound = set()
+        self.loaded = []
+        self.aliases = {}  # Local name to the module or "module.attribute" it refers to
+        self.assigned = set()  # Names bound other than by an import
+        self.star_import = False
+
+    def report(self, node, message):
+        self.issues.append((getattr(node, "lineno", 0), message))
+
+    # Imports
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            root = alias.name.split(".")[0]
+            if root in FORBIDDEN_MODULES:
+                self.report(node, f"Forbidden import of {alias.name}: it {FORBIDDEN_MODULES[root]}")
+            local = alias.asname or root
+            self.bound.add(local)
+            self.aliases[local] = alias.name if alias.asname else root
+
+    def visit_ImportFrom(self, node):
+        module = node.module or ""
+        root = module.split(".")[0]
+        if root in FORBIDDEN_MODULES:
+            self.report(node, f"Forbidden import from {module}: it {FORBIDDEN_MODULES[root]}")
+        for alias in node.names:
+            if alias.name == "*":
+                self.star_import = True
+                continue
+            local = alias.asname or alias.name
+            self.bound.add(local)
+            self.aliases[local] = f"{module}.{alias.name}"
+            names = self.symbols.modules.get(module)
+            if names is not None and alias.name not in names:
+                self.report(node, f"ImportError: cannot import name '{alias.name}' from '{module}'{suggest(alias.name, names)}")
+            if module == "os" and alias.name not in ALLOWED_OS_FUNCTIONS:
+                self.report(node, f"Forbidden import of os.{alias.name}: it accesses the system")
+
+    # Names
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            self.loaded.append((node.id, node.lineno))
+        else:
+            self.bound.add(node.id)
+            self.assigned.add(node.id)
+
+    def visit_FunctionDef(self, node):
+        self.bound.add(node.name)
+        for argument in ast.walk(node.args):
+            if isinstance(argument, ast.arg):
+                self.bound.add(argument.arg)
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Lambda(self, node):
+        for argument in ast.walk(node.args):
+            if isinstance(argument, ast.arg):
+                self.bound.add(argument.arg)
+        self.generic_visit(node)
+
+    def visit_ClassDef(self, node):
+        self.bound.add(node.name)
+        self.generic_visit(node)
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self.bound.add(node.name)
+        self.generic_visit(node)
+
+    def visit_Global(self, node):
+        self.bound.update(node.names)
+
+    visit_Nonlocal = visit_Global
+
+    def visit_MatchAs(self, node):
+        if node.name:
+            self.bound.add(node.name)
+        self.generic_visit(node)
+
+    # Attributes and calls
+
+    def visit_Attribute(self, node):
+        name = dotted_name(node)
+        if name is None:
+            self.generic_visit(node)
+            return
+        if isinstance(node.ctx, ast.Load):
+            self.check_reference(node, name)
+        # Visit the name at the root of the chain only, so a chain is checked once
+        while isinstance(node, ast.Attribute):
+            node = node.value
+        self.visit(node)
+
+    def check_reference(self, node, name):
+        """ Check a.b or a.B.c where a is an imported module of the symbol table. """
+        head, _, rest = name.partition(".")
+        target = self.aliases.get(head)
+        if target is None or head in self.assigned:
+            return
+        parts = target.split(".") + rest.split(".")
+        module, attribute = parts[0], parts[1]
+        if module == "os" and attribute not in ALLOWED_OS_FUNCTIONS:
+            self.report(node, f"Forbidden use of os.{attribute}: it accesses the system")
+            return
+        names = self.symbols.modules.get(module)
+        if names is None or attribute in DYNAMIC_ATTRIBUTES:
+            return
+        if attribute not in names:
+            self.report(node, f"AttributeError: module '{module}' has no attribute '{attribute}'{suggest(attribute, names)}")
+            return
+        members = self.symbols.classes.get(f"{module}.{attribute}")
+        # Only the direct child of the outermost reference is checked, e.g. Part.Shape.cut
+        if members is not None and len(parts) == 3 and parts[2] not in members:
+            self.report(node, f"AttributeError: type object '{module}.{attribute}' has no attribute "
+                              f"'{parts[2]}'{suggest(parts[2], members)}")
+
+    def visit_Call(self, node):
+        if isinstance(node.func, ast.Name) and node.func.id in FORBIDDEN_BUILTINS:
+            self.report(node, f"Forbidden call of {node.func.id}(): it {FORBIDDEN_BUILTINS[node.func.id]}")
+        if isinstance(node.func, ast.Attribute) and node.func.attr in ("addObject", "newObject") and node.args:
+            type_name = node.args[0]
+            if isinstance(type_name, ast.Constant) and isinstance(type_name.value, str):
+                self.check_type(node, type_name.value)
+        self.generic_visit(node)
+
+    def check_type(self, node, type_name):
+        """ Check the object type of doc.addObject / body.newObject against the supported types. """
+        types = self.symbols.types
+        prefix = type_name.split("::")[0] + "::"
+        if types and type_name not in types and any(known.startswith(prefix) for known in types):
+            self.report(node, f"Unknown object type '{type_name}'{suggest(type_name, types)}")
@@ -0,0 +1,196 @@
+# ScriptWorker.py
+"""
+This is the entry point of the sandbox worker processes started by ScriptExecutor.
+It is run by FreeCADCmd (or by a Python interpreter that can import FreeCAD):
+
+    FreeCADCmd ScriptWorker.py
+
+The worker imports FreeCAD once, then reads jobs from stdin, one JSON object per
+line, and answers each with a JSON line prefixed by PROTOCOL_PREFIX on stdout.
+Anything else written to stdout (FreeCAD banners, prints of the scripts) is
+ignored by the parent. The memory limit is passed in the AI3DGENERATOR_MEMORY_MB
+environment variable and enforced with RLIMIT_AS where the platform supports it.
+
+Jobs:
+    {"id": 1, "op": "run", "script": "...", "output_path": "/tmp/result.FCStd",
+     "exports": {"step": "/tmp/result.step"}}
+    {"id": 2, "op": "export", "shapes": [{"label": "Bracket", "path": "/tmp/Bracket.brp"}],
+     "exports": {"stl": "/tmp/part.stl"}, "deflection": 0.1, "thumbnail": "/tmp/part.png", "thumbnail_size": 256}
+    {"id": 3, "op": "ping"}
+
+Exports are written from the top-level shapes of the resulting document (the
+objects no other object depends on); the format follows the file extension.
+An export job reads shapes serialized as BREP files by the GUI, tessellates them
+for the mesh formats and the thumbnail, and writes the files.
+"""
+import contextlib
+import json
+import os
+import sys
+import time
+import traceback
+
+PROTOCOL_PREFIX = "AI3DGEN:"
+MESH_EXTENSIONS = (".stl", ".obj", ".3mf", ".ply")
+
+
+def limit_memory():
+    """ Apply the memory limit requested by the parent process, if any. """
+    limit_mb = int(os.environ.get("AI3DGENERATOR_MEMORY_MB", "0") or 0)
+    if limit_mb <= 0:
+        return
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return
+    limit = limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def send(message, stream):
+    """ Write a protocol message to the parent. """
+    stream.write(PROTOCOL_PREFIX + json.dumps(message) + "\n")
+    stream.flush()
+
+
+def export_shapes(objects, path):
+    """ Export objects to a STEP/IGES/BREP file, or to a mesh file (STL, OBJ, 3MF). """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in MESH_EXTENSIONS:
+        import Mesh
+        Mesh.export(objects, path)
+    else:
+        import Import
+        Import.export(objects, path)
+
+
+def run_job(job, FreeCAD):
+    """
+    Execute a script in a fresh document and save the result as an FCStd file.
+
+    Returns:
+        dict: The response to send back to the parent.
+    """
+    start = time.perf_counter()
+    documents = set(FreeCAD.listDocuments())
+    namespace = {"__name__": "__main__", "FreeCAD": FreeCAD, "App": FreeCAD}
+    response = {"id": job["id"], "ok": True, "traceback": "", "output_path": "", "objects": [], "exports": {},
+                "recompute_elapsed": 0.0}
+    try:
+        FreeCAD.newDocument("AI3DGeneratorSandbox")
+        exec(job["script"], namespace)
+        document = FreeCAD.ActiveDocument
+        if document is not None:
+            recompute_start = time.perf_counter()
+            document.recompute()
+            response["recompute_elapsed"] = time.perf_counter() - recompute_start
+            response["objects"] = [obj.Name for obj in document.Objects]
+            if job.get("output_path"):
+                document.saveAs(job["output_path"])
+                response["output_path"] = job["output_path"]
+            exports = job.get("exports") or {}
+            if exports:
+                shapes = [obj for obj in document.Objects if hasattr(obj, "Shape") and not obj.InList]
+                for name, path in exports.items():
+                    export_shapes(shapes, path)
+                    response["exports"][name] = path
+    except BaseException:
+        response["ok"] = False
+        response["traceback"] = traceback.format_exc()
+    finally:
+        for name in set(FreeCAD.listDocuments()) - documents:
+            FreeCAD.closeDocument(name)
+    response["elapsed"] = time.perf_counter() - start
+    return response
+
+
+def run_export(job, FreeCAD):
+    """
+    Read serialized shapes, tessellate them and write the exports and the thumbnail.
+    Mesh formats are written from the tessellation, with the deflection of the job.
+
+    Returns:
+        dict: The response to send back to the parent, with the time of each stage.
+    """
+    start = time.perf_counter()
+    documents = set(FreeCAD.listDocuments())
+    response = {"id": job["id"], "ok": True, "traceback": "", "exports": {}, "thumbnail": "", "triangles": 0}
+    try:
+        import Part
+        document = FreeCAD.newDocument("AI3DGeneratorExport")
+        parts = []
+        for shape in job["shapes"]:
+            part = document.addObject("Part::Feature", "Shape")
+            part.Label = shape["label"]
+            part.Shape = Part.read(shape["path"])
+            parts.append(part)
+        response["load_elapsed"] = time.perf_counter() - start
+        exports = job.get("exports") or {}
+        meshes = []
+        if job.get("thumbnail") or any(os.path.splitext(path)[1].lower() in MESH_EXTENSIONS for path in exports.values()):
+            import Mesh  # noqa: F401 - registers the Mesh::Feature type added below
+            import MeshPart
+            tessellate_start = time.perf_counter()
+            for part in parts:
+                mesh = document.addObject("Mesh::Feature", "Mesh")
+                mesh.Label = part.Label
+                mesh.Mesh = MeshPart.meshFromShape(Shape=part.Shape, LinearDeflection=job.get("deflection", 0.1),
+                                                   AngularDeflection=0.5, Relative=False)
+                meshes.append(mesh)
+            response["tessellate_elapsed"] = time.perf_counter() - tessellate_start
+            response["triangles"] = sum(mesh.Mesh.CountFacets for mesh in meshes)
+        write_start = time.perf_counter()
+        for name, path in exports.items():
+            export_shapes(meshes if os.path.splitext(path)[1].lower() in MESH_EXTENSIONS else parts, path)
+            response["exports"][name] = path
+        response["write_elapsed"] = time.perf_counter() - write_start
+        if job.get("thumbnail"):
+            from Thumbnail import write_thumbnail
+            thumbnail_start = time.perf_counter()
+            points, triangles = [], []
+            for mesh in meshes:
+                vertices, facets = mesh.Mesh.Topology
+                triangles.extend((i + len(points), j + len(points), k + len(points)) for i, j, k in facets)
+                points.extend((vertex.x, vertex.y, vertex.z) for vertex in vertices)
+            response["thumbnail"] = write_thumbnail(job["thumbnail"], points, triangles, job.get("thumbnail_size", 256))
+            response["thumbnail_elapsed"] = time.perf_counter() - thumbnail_start
+    except BaseException:
+        response["ok"] = False
+        response["traceback"] = traceback.format_exc()
+    finally:
+        for name in set(FreeCAD.listDocuments()) - documents:
+            FreeCAD.closeDocument(name)
+    response["elapsed"] = time.perf_counter() - start
+    return response
+
+
+JOBS = {"run": run_job, "export": run_export}
+
+
+def main():
+    protocol = sys.stdout
+    limit_memory()
+    # FreeCADCmd does not put the folder of the script on the path, the export jobs import Thumbnail
+    folder = os.path.dirname(os.path.abspath(__file__))
+    if folder not in sys.path:
+        sys.path.insert(0, folder)
+    import FreeCAD
+    import Part  # noqa: F401 - preload the heavy modules while the worker is idle
+    send({"ready": True, "pid": os.getpid()}, protocol)
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        job = json.loads(line)
+        if job.get("op") == "ping":
+            send({"id": job["id"], "ok": True}, protocol)
+            continue
+        # Keep the protocol stream clean from what the script prints
+        with contextlib.redirect_stdout(sys.stderr):
+            response = JOBS[job.get("op", "run")](job, FreeCAD)
+        send(response, protocol)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# SessionStore.py
+"""
+This module contains the SessionStore class, an append-only journal of a chat
+session, and the exporter that renders the markdown run reports from it.
+
+A session is stored as one JSON Lines file in the save folder. Every message,
+script version and run result is written once, when it happens, by a background
+thread, so recording never blocks the GUI. The file holds one record per line:
+
+    {"type": "session", "id": ..., "created": ...}
+    {"type": "message", "index": 0, "role": "system", "content": ..., "time": ...}
+    {"type": "truncate", "messages": 2, "time": ...}
+    {"type": "script", "version": 1, "script": ..., "time": ...}
+    {"type": "run", "script_version": 1, "ok": false, "traceback": ..., "messages": 3,
+     "model": ..., "temperature": ..., "max_tokens": ..., "time": ...}
+    {"type": "artifacts", "run": 1, "files": {"step": ...}, "thumbnail": ..., "time": ...}
+
+The artifacts of a run, its exported files and thumbnail, are written when the
+background export of the run completes, after the run itself.
+
+The reports of the former version of the plugin can be rendered on demand:
+
+    python SessionStore.py AI3DGenerator_session_20240101-120000.jsonl --output-dir reports
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from JsonlWriter import JsonlWriter
+from RunReport import write_run_report
+
+SESSION_PREFIX = "AI3DGenerator_session_"
+
+# The paths of the sessions of this process, whose files may not be created yet
+_claimed_paths = set()
+
+
+class SessionStore:
+    """
+    Records a chat session to an append-only JSONL file.
+
+    The file is created on the first record, so an unused session leaves nothing
+    behind. Scripts are stored once per distinct version; runs refer to their
+    script version and to the number of messages of the conversation at the time.
+
+    Attributes:
+        folder (str): The folder of the session file.
+        session_id (str): The identifier of the session.
+        path (str): The path of the session file.
+    """
+    def __init__(self, folder, session_id=None):
+        self.folder = folder
+        self.session_id = session_id or time.strftime("%Y%m%d-%H%M%S")
+        self.path = os.path.join(folder, f"{SESSION_PREFIX}{self.session_id}.jsonl")
+        if session_id is None:
+            # Two sessions started within the same second
+            number = 1
+            while os.path.exists(self.path) or self.path in _claimed_paths:
+                number += 1
+                self.path = os.path.join(folder, f"{SESSION_PREFIX}{self.session_id}-{number}.jsonl")
+            if number > 1:
+                self.session_id = f"{self.session_id}-{number}"
+        _claimed_paths.add(self.path)
+        self._message_count = 0
+        self._run_count = 0
+        self._script_versions = {}
+        self._writer = JsonlWriter(self.path)
+
+    def record_messages(self, conversation_history):
+        """
+        Record the messages appended to the conversation since the last call.
+        If messages were removed from the end of the conversation (an unanswered
+        prompt), a truncate record is written first.
+
+        Args:
+            conversation_history (list): The whole conversation; only its new messages are written.
+        """
+        if len(conversation_history) < self._message_count:
+            self._message_count = len(conversation_history)
+            self._write({"type": "truncate", "messages": self._message_count, "time": time.time()})
+        for message in conversation_history[self._message_count:]:
+            self._write({"type": "message", "index": self._message_count, "role": message["role"],
+                         "content": message["content"], "time": time.time()})
+            self._message_count += 1
+
+    def record_script(self, script):
+        """
+        Record a script version, unless it was recorded before.
+
+        Returns:
+            int: The version number of the script.
+        """
+        digest = hashlib.sha256(script.encode("utf-8")).hexdigest()
+        if digest not in self._script_versions:
+            self._script_versions[digest] = len(self._script_versions) + 1
+            self._write({"type": "script", "version": self._script_versions[digest], "script": script, "time": time.time()})
+        return self._script_versions[digest]
+
+    def record_run(self, conversation_history, script, model, temperature, max_tokens, error_traceback=None):
+        """
+        Record the result of a script run, with the messages and the script version it ran.
+
+        Args:
+            conversation_history (list): The conversation at the time of the run.
+            script (str): The script that ran.
+            model (str): The AI model.
+            temperature (float): The temperature parameter.
+            max_tokens (int): The maximum number of tokens.
+            error_traceback (str): The traceback of a failed run, or None for a successful run.
+
+        Returns:
+            int: The number of the run in the session, from 1.
+        """
+        self.record_messages(conversation_history)
+        version = self.record_script(script)
+        self._write({"type": "run", "script_version": version, "ok": error_traceback is None,
+                     "traceback": error_traceback, "messages": self._message_count, "model": model,
+                     "temperature": temperature, "max_tokens": max_tokens, "time": time.time()})
+        self._run_count += 1
+        return self._run_count
+
+    def record_artifacts(self, run, files, thumbnail=None):
+        """
+        Attach the files exported from the result of a run to it.
+
+        Args:
+            run (int): The number of the run, as returned by record_run.
+            files (dict): The paths of the exported files, by format.
+            thumbnail (str): The path of the thumbnail image, if any.
+        """
+        record = {"type": "artifacts", "run": run, "files": files, "thumbnail": thumbnail, "time": time.time()}
+        if self._writer.is_closed():
+            # The export outlived the session, e.g. the chat was cleared: append to its file once
+            writer = JsonlWriter(self.path)
+            writer.write(record)
+            writer.close()
+        else:
+            self._write(record)
+
+    def flush(self):
+        """ Wait until every record has been written. """
+        self._writer.flush()
+
+    def close(self):
+        """ Write the pending records and stop the writer thread. """
+        self._writer.close()
+
+    def _write(self, record):
+        if not self._writer.is_started():
+            self._writer.write({"type": "session", "id": self.session_id, "created": time.time()})
+        self._writer.write(record)
+
+
+def load_session(path):
+    """
+    Read a session file.
+
+    Returns:
+        dict: The session with the keys "id", "messages" (list of role/content dicts),
+        "scripts" (dict of version to script) and "runs" (list of run records). The runs
+        whose result was exported have its "files" and "thumbnail".
+    """
+    session = {"id": None, "messages": [], "scripts": {}, "runs": []}
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record["type"] == "session":
+                session["id"] = record["id"]
+            elif record["type"] == "message":
+                session["messages"].append({"role": record["role"], "content": record["content"]})
+            elif record["type"] == "truncate":
+                del session["messages"][record["messages"]:]
+            elif record["type"] == "script":
+                session["scripts"][record["version"]] = record["script"]
+            elif record["type"] == "run":
+                session["runs"].append(record)
+            elif record["type"] == "artifacts" and 0 < record["run"] <= len(session["runs"]):
+                session["runs"][record["run"] - 1].update(files=record["files"], thumbnail=record["thumbnail"])
+    return session
+
+
+def export_markdown(path, output_dir=None):
+    """
+    Render the markdown report of every run of a session, as the plugin used to
+    write them after each run.
+
+    Args:
+        path (str): The session file.
+        output_dir (str): The folder of the reports, defaults to the folder of the session file.
+
+    Returns:
+        list: The paths of the reports.
+    """
+    session = load_session(path)
+    output_dir = output_dir or os.path.dirname(os.path.abspath(path))
+    os.makedirs(output_dir, exist_ok=True)
+    reports = []
+    for number, run in enumerate(session["runs"], 1):
+        name = f"AI3DGenerator_{session['id']}_run{number}" + ("" if run["ok"] else "_error")
+        reports.append(write_run_report(
+            output_dir, session["messages"][:run["messages"]], run["model"], run["temperature"],
+            run["max_tokens"], run["traceback"], name=name, run_date=run["time"],
+            files=run.get("files"), thumbnail=run.get("thumbnail")
+        ))
+    return reports
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render the markdown run reports of AI3DGenerator session files.")
+    parser.add_argument("sessions", nargs="+", help="session .jsonl files")
+    parser.add_argument("--output-dir", default=None, help="folder of the reports (default: next to each session)")
+    args = parser.parse_args(argv)
+    for path in args.sessions:
+        for report in export_markdown(path, args.output_dir):
+            print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+# SessionTabs.py
+"""
+This module contains the SessionTabs class, the tabs of the design sessions in
+the AI 3D Generator dock.
+
+Each tab is an AI3DGeneratorWidget with its own conversation, session overrides,
+target document and in-flight request. The first tab is the primary session: it
+owns the settings, the caches, the metrics and the sandbox workers, which the
+other tabs share. Prompts of several tabs generate in the background at the same
+time, up to the "Sessions generating at once" setting, and the others wait in a
+queue. Hidden tabs that stay idle are offloaded to their session files.
+"""
+import collections
+import itertools
+import time
+
+from PySide2 import QtWidgets, QtGui, QtCore
+
+from AI3DGeneratorWidget import AI3DGeneratorWidget
+
+OFFLOAD_CHECK_INTERVAL = 60 * 1000  # Milliseconds between two looks for idle sessions
+
+
+class SessionTabs(QtWidgets.QTabWidget):
+    """
+    The tabs of the design sessions, and the scheduler of their generations.
+
+    A session asks for a generation slot with request_slot(); it starts at once
+    if fewer than max_parallel_sessions sessions are generating, and is queued
+    otherwise. The slot is released when the requests of the session complete.
+    The tab of a session shows a busy indicator while it generates, "(queued)"
+    while it waits, and is highlighted when it finished while hidden.
+
+    Attributes:
+        primary (AI3DGeneratorWidget): The primary session, which cannot be closed.
+        new_button (QtWidgets.QToolButton): A button to open a new session.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setTabsClosable(True)
+        self.setMovable(True)
+        self.setDocumentMode(True)
+        self.primary = None
+        self._numbers = itertools.count(1)
+        self._active = set()  # The sessions holding a generation slot
+        self._queue = collections.deque()  # The (session, start) pairs waiting for a slot
+        self._last_used = {}  # The monotonic time each session was last shown or busy
+        self._unseen = set()  # The sessions that finished while hidden
+        self._indicators = {}
+        self._current = None
+
+        self.new_button = QtWidgets.QToolButton()
+        self.new_button.setText("+")
+        self.new_button.setToolTip("New session")
+        self.new_button.clicked.connect(self.new_session)
+        self.setCornerWidget(self.new_button, QtCore.Qt.TopRightCorner)
+        self.tabCloseRequested.connect(self.close_session)
+        self.currentChanged.connect(self.on_current_changed)
+
+        self.primary = self.new_session()
+        self.primary.settings_saved.connect(self.on_settings_saved)
+        # The primary session holds the shared caches and workers, it stays open
+        self.tabBar().setTabButton(0, self.close_button_side(), None)
+
+        self._offload_timer = QtCore.QTimer(self)
+        self._offload_timer.setInterval(OFFLOAD_CHECK_INTERVAL)
+        self._offload_timer.timeout.connect(self.offload_idle_sessions)
+        self._offload_timer.start()
+
+    def close_button_side(self):
+        """ Return the side of the tabs holding their close button in this style. """
+        return QtWidgets.QTabBar.ButtonPosition(self.tabBar().style().styleHint(
+            QtWidgets.QStyle.SH_TabBar_CloseButtonPosition, None, self.tabBar()))
+
+    def sessions(self):
+        """ Return the sessions, in the order of their tabs. """
+        return [self.widget(index) for index in range(self.count())]
+
+    def new_session(self):
+        """
+        Open a new session in a new tab and show it. Sessions other than the primary
+        one run their scripts in a document of their own by default.
+
+        Returns:
+            AI3DGeneratorWidget: The new session.
+        """
+        number = next(self._numbers)
+        session = AI3DGeneratorWidget(primary=self.primary, scheduler=self)
+        session.session_name = f"Session {number}"
+        if self.primary is not None:
+            session.target_document = f"Session{number}"
+        session.request_engine.busy_changed.connect(lambda busy: self.on_session_busy(session, busy))
+        session.session_changed.connect(lambda: self.update_tab(session))
+        self._last_used[session] = time.monotonic()
+        self.addTab(session, session.session_name)
+        self.setCurrentWidget(session)
+        self.update_tab(session)
+        return session
+
+    def close_session(self, index):
+        """ Close the session of a tab, cancelling its requests. The primary session is not closed. """
+        session = self.widget(index)
+        if session is None or session is self.primary:
+            return
+        session.close_session()
+        self._active.discard(session)
+        self._unseen.discard(session)
+        self._last_used.pop(session, None)
+        self._indicators.pop(session, None)
+        if self._current is session:
+            self._current = None
+        self.removeTab(index)
+        session.deleteLater()
+        self.start_queued()
+
+    def request_slot(self, session, start):
+        """
+        Run start, which submits the generation request of a session, as soon as fewer
+        than the allowed number of sessions are generating.
+        """
+        if len(self._active) < self.primary.max_parallel_sessions:
+            self.start_slot(session, start)
+            return
+        session.queued = True
+        self._queue.append((session, start))
+        session.chat_window.add_message("AI", f"Queued: {len(self._active)} other sessions are generating, "
+                                              f"this prompt starts when one of them finishes.", is_user=False)
+        session.on_busy_changed(session.request_engine.is_busy())
+        self.update_tab(session)
+
+    def start_slot(self, session, start):
+        """ Give a generation slot to a session and start its request. """
+        session.queued = False
+        self._active.add(session)
+        start()
+        if not session.request_engine.is_busy():
+            self._active.discard(session)  # Nothing was submitted
+        self.update_tab(session)
+
+    def cancel_slot(self, session):
+        """ Remove the queued prompt of a session from the queue. """
+        self._queue = collections.deque(entry for entry in self._queue if entry[0] is not session)
+        session.queued = False
+        session.on_busy_changed(session.request_engine.is_busy())
+        self.update_tab(session)
+
+    def start_queued(self):
+        """ Start the queued prompts, oldest first, while generation slots are free. """
+        while self._queue and len(self._active) < self.primary.max_parallel_sessions:
+            session, start = self._queue.popleft()
+            self.start_slot(session, start)
+
+    def on_session_busy(self, session, busy):
+        """ Release the slot of a session whose requests completed, and update its tab. """
+        self._last_used[session] = time.monotonic()
+        if not busy:
+            if session in self._active:
+                self._active.discard(session)
+                self.start_queued()
+            if session is not self.currentWidget():
+                self._unseen.add(session)
+        self.update_tab(session)
+
+    def on_current_changed(self, index):
+        """ Mark the shown session as seen, and remember when the hidden one was last used. """
+        now = time.monotonic()
+        if self._current is not None:
+            self._last_used[self._current] = now
+        self._current = self.widget(index)
+        if self._current is not None:
+            self._last_used[self._current] = now
+            self._unseen.discard(self._current)
+            self.update_tab(self._current)
+
+    def on_settings_saved(self):
+        """ Apply the settings saved from the primary session to the other sessions. """
+        for session in self.sessions():
+            if session is not self.primary:
+                session.sync_settings()
+        self.start_queued()
+
+    def offload_idle_sessions(self):
+        """ Offload the hidden sessions that have been idle for longer than the setting. """
+        minutes = self.primary.session_offload_minutes
+        if not minutes:
+            return
+        now = time.monotonic()
+        for session in self.sessions():
+            if session is self.currentWidget() or not session.is_idle():
+                continue
+            if now - self._last_used.get(session, now) >= minutes * 60 and session.offload_history():
+                self.update_tab(session)
+
+    def update_tab(self, session):
+        """ Show the name, state and overrides of a session in its tab. """
+        index = self.indexOf(session)
+        if index < 0:
+            return
+        busy = session.request_engine.is_busy()
+        self.setTabText(index, session.session_name + (" (queued)" if session.queued else ""))
+        state = "generating" if busy else "queued" if session.queued else \
+            "offloaded to disk" if session.offloaded else "idle"
+        self.setTabToolTip(index, f"{session.session_name}: {state}\n"
+                                  f"Model: {session.ai_client.model}, temperature {session.ai_client.temperature:g}, "
+                                  f"{session.ai_client.max_tokens} max tokens\n"
+                                  f"Document: {session.target_document or 'the active document'}")
+        self.tabBar().setTabTextColor(index, self.palette().color(QtGui.QPalette.Highlight)
+                                      if session in self._unseen else QtGui.QColor())
+        # An indeterminate progress bar on the side without the close button
+        side = QtWidgets.QTabBar.LeftSide if self.close_button_side() == QtWidgets.QTabBar.RightSide \
+            else QtWidgets.QTabBar.RightSide
+        indicator = self._indicators.get(session)
+        if busy and indicator is None:
+            indicator = QtWidgets.QProgressBar()
+            indicator.setRange(0, 0)
+            indicator.setTextVisible(False)
+            indicator.setFixedSize(24, 8)
+            self._indicators[session] = indicator
+            self.tabBar().setTabButton(index, side, indicator)
+        elif not busy and indicator is not None:
+            self.tabBar().setTabButton(index, side, None)
+            indicator.deleteLater()
+            del self._indicators[session]
@@ -0,0 +1,396 @@
+# SnippetIndex.py
+"""
+This module contains the SnippetIndex class, a local BM25 search index over the
+FreeCAD Python API (function signatures and docstrings) and the curated example
+scripts of the snippets folder. It does not depend on Qt and works offline.
+
+The most relevant entries for a prompt are sent to the model next to the
+pre-prompt, so it uses functions and object types that exist instead of
+inventing them. The index is cached on disk; each source (a snippet file, or
+the API of the installed FreeCAD version) is re-read only when it changed.
+"""
+import collections
+import inspect
+import json
+import math
+import os
+import re
+import threading
+
+import Log
+from ConversationContext import count_tokens
+
+INDEX_FILENAME = "AI3DGenerator_snippets.json"
+SNIPPET_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snippets")
+INDEX_VERSION = 1
+
+# Modules whose functions, classes and methods are indexed
+API_MODULES = ("FreeCAD", "Part", "Sketcher", "Draft", "Mesh", "MeshPart")
+API_SOURCE = "api:freecad"
+TYPES_SOURCE = "api:types"
+MAX_DOC_LENGTH = 600
+
+WORD_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+(?:\.\d+)?")
+CAMEL_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have if in into is it its of on or that the then this to "
+    "was were will with i me my you your we can please make create want need should".split()
+)
+
+REFERENCES_HEADER = ("FreeCAD API references and examples relevant to this request. "
+                     "Prefer these functions and object types over guessing:\n")
+
+
+def tokenize(text):
+    """
+    Split a text into lowercase search terms. Identifiers are kept whole and also
+    split into their parts, so "makeBox", "Part::Box" and "make box" all match.
+    """
+    terms = []
+    for word in WORD_PATTERN.findall(text):
+        lower = word.lower()
+        parts = [part.lower() for piece in word.split("_") for part in CAMEL_PATTERN.findall(piece)]
+        if lower not in STOPWORDS and len(lower) > 1:
+            terms.append(lower.replace("_", ""))
+        if len(parts) > 1:
+            terms.extend(part for part in parts if part not in STOPWORDS and len(part) > 1)
+    return terms
+
+
+def snippet_documents(path):
+    """
+    Read a curated snippet file: a Python script whose docstring describes it.
+
+    Returns:
+        list: A single document dict with the keys "id", "title" and "text".
+    """
+    with open(path, encoding="utf-8") as file:
+        text = file.read().strip()
+    match = re.match(r'\s*"""\s*(.*?)\s*"""', text, re.DOTALL)
+    title = match.group(1).splitlines()[0] if match else os.path.basename(path)
+    return [{"id": f"snippet:{os.path.basename(path)}", "title": title, "text": text, "kind": "example"}]
+
+
+def describe(name, obj):
+    """ Return the signature and the first paragraph of the docstring of an API object, or None. """
+    doc = inspect.getdoc(obj) or ""
+    doc = doc.split("\n\n")[0].strip()
+    if not doc:
+        return None
+    try:
+        signature = f"{name}{inspect.signature(obj)}"
+    except (TypeError, ValueError):  # Builtins of FreeCAD usually have their signature in the docstring
+        signature = name
+    text = doc if doc.startswith(name.rsplit(".", 1)[-1]) else f"{signature}\n{doc}"
+    return text[:MAX_DOC_LENGTH]
+
+
+def api_documents(modules=API_MODULES):
+    """
+    Introspect the FreeCAD modules: their functions, classes and public methods.
+
+    Returns:
+        list: Document dicts with the keys "id", "title" and "text".
+    """
+    documents = []
+    for module_name in modules:
+        try:
+            module = __import__(module_name)
+        except Exception:  # A module missing from this FreeCAD build, or needing the GUI
+            continue
+        for name in sorted(dir(module)):
+            if name.startswith("_"):
+                continue
+            obj = getattr(module, name, None)
+            owner = getattr(obj, "__module__", None) or module_name
+            if owner != module_name and owner.split(".")[0] in modules:
+                continue  # Re-exported from another indexed module, e.g. Draft.Vector
+            qualified = f"{module_name}.{name}"
+            if inspect.isclass(obj):
+                members = [member for member in sorted(vars(obj)) if not member.startswith("_")]
+                text = describe(qualified, obj) or qualified
+                if members:
+                    text += "\nMembers: " + ", ".join(members)
+                documents.append({"id": qualified, "title": qualified, "text": text[:MAX_DOC_LENGTH * 2], "kind": "api"})
+                for member in members:
+                    text = describe(f"{qualified}.{member}", getattr(obj, member, None))
+                    if text:
+                        documents.append({"id": f"{qualified}.{member}", "title": f"{qualified}.{member}", "text": text, "kind": "api"})
+            elif callable(obj):
+                text = describe(qualified, obj)
+                if text:
+                    documents.append({"id": qualified, "title": qualified, "text": text, "kind": "api"})
+    return documents
+
+
+def supported_types():
+    """ Return the object types supported by doc.addObject, or None if no document is open in FreeCAD. """
+    try:
+        import FreeCAD
+        return FreeCAD.ActiveDocument.supportedTypes()
+    except Exception:  # Not in FreeCAD, or no document
+        return None
+
+
+def object_type_documents(types):
+    """ List object types, one document per module (e.g. "PartDesign::Pad" in "PartDesign"). """
+    groups = collections.defaultdict(list)
+    for type_name in types:
+        groups[type_name.split("::")[0]].append(type_name)
+    return [{"id": f"types:{module}", "title": f"{module} object types for doc.addObject",
+             "text": f'doc.addObject("<type>", "<name>") supports the {module} types: ' + ", ".join(sorted(names)),
+             "kind": "api"}
+            for module, names in sorted(groups.items())]
+
+
+def api_fingerprint(modules=API_MODULES):
+    """ Return a fingerprint of the installed FreeCAD API, or None outside of FreeCAD. """
+    try:
+        import FreeCAD
+        version = FreeCAD.Version()[:4]
+    except (ImportError, AttributeError):
+        return None
+    return "|".join(str(part) for part in (version, modules))
+
+
+def with_references(messages, reference):
+    """ Insert a reference message after the leading system messages (the pre-prompt). """
+    if reference is None:
+        return messages
+    index = 0
+    while index < len(messages) and messages[index].get("role") == "system":
+        index += 1
+    return messages[:index] + [reference] + messages[index:]
+
+
+class SnippetIndex:
+    """
+    A BM25 index over FreeCAD API documentation and curated snippets.
+
+    The documents of each source are cached in a JSON file with their term
+    frequencies and the fingerprint of the source (size and modification time of
+    a snippet file, the FreeCAD version for the API, the list of object types for
+    the types supported by doc.addObject). update() re-reads only the changed
+    sources, then rebuilds the inverted index from the cached terms, which takes
+    milliseconds. Outside of FreeCAD, the API documents cached earlier are kept.
+
+    In the GUI, the FreeCAD modules are introspected on the GUI thread by
+    collect_api(), and update(introspect=False) reads the snippets and builds the
+    index on a worker thread. A search waits for an update in progress.
+
+    Attributes:
+        path (str): The JSON cache file, or None for no cache.
+        folders (list): The folders of the curated snippets.
+        api_modules (tuple): The FreeCAD modules whose API is indexed.
+        k1 (float): The BM25 term frequency saturation.
+        b (float): The BM25 document length normalization.
+        documents (list): The indexed documents.
+    """
+    def __init__(self, path=None, folders=(SNIPPET_FOLDER,), api_modules=API_MODULES, k1=1.2, b=0.75):
+        self.path = path
+        self.folders = list(folders)
+        self.api_modules = tuple(api_modules)
+        self.k1 = k1
+        self.b = b
+        self.documents = []
+        self._sources = {}
+        self._postings = {}
+        self._lengths = []
+        self._average_length = 0.0
+        self._loaded = False
+        self._api = {}
+        self._lock = threading.Lock()
+
+    def _load(self):
+        """ Read the sources cached on disk. """
+        if self.path and os.path.exists(self.path):
+            try:
+                with open(self.path, encoding="utf-8") as file:
+                    data = json.load(file)
+                if data.get("version") == INDEX_VERSION:
+                    self._sources = data["sources"]
+            except (OSError, ValueError, KeyError) as e:
+                Log.warning(f"Snippet index cache ignored ({self.path}): {e}\n")
+        # Set last: collect_api() compares the API with the cached sources
+        self._loaded = True
+
+    def _save(self):
+        """ Write the sources to the cache file. """
+        if not self.path:
+            return
+        temporary = f"{self.path}.tmp"
+        try:
+            with open(temporary, "w", encoding="utf-8") as file:
+                json.dump({"version": INDEX_VERSION, "sources": self._sources}, file)
+            os.replace(temporary, self.path)
+        except OSError as e:
+            Log.warning(f"Snippet index not cached ({self.path}): {e}\n")
+
+    def snippet_files(self):
+        """ Return the curated snippet files, as a dict of source key to path. """
+        files = {}
+        for folder in self.folders:
+            if not folder or not os.path.isdir(folder):
+                continue
+            for name in sorted(os.listdir(folder)):
+                if name.endswith(".py"):
+                    path = os.path.join(folder, name)
+                    files[f"file:{os.path.abspath(path)}"] = path
+        return files
+
+    def _api_sources(self):
+        """ Return the FreeCAD API sources as (key, fingerprint, reader of the documents) tuples. """
+        types = supported_types()
+        return (
+            (API_SOURCE, api_fingerprint(self.api_modules), lambda: api_documents(self.api_modules)),
+            (TYPES_SOURCE, str(len(types)) if types else None, lambda: object_type_documents(types)),
+        )
+
+    def collect_api(self):
+        """
+        Introspect the FreeCAD API sources that changed since they were indexed, for
+        the next update(introspect=False). Call it from the GUI thread, where the
+        FreeCAD modules can be imported. Does nothing until the cache is loaded.
+        """
+        if not self._loaded:
+            return
+        for key, fingerprint, read_documents in self._api_sources():
+            cached = self._sources.get(key)
+            if fingerprint is None or (cached is not None and cached["fingerprint"] == fingerprint):
+                continue
+            if self._api.get(key, (None,))[0] != fingerprint:
+                self._api[key] = (fingerprint, read_documents())
+
+    def warm_up(self):
+        """ Read the cache and the snippets and build the index on a background thread. """
+        threading.Thread(target=self.update, kwargs={"introspect": False}, name="Snippet index warm-up",
+                         daemon=True).start()
+
+    def update(self, introspect=True):
+        """
+        Bring the index up to date with the snippet files and the FreeCAD API,
+        re-reading only the sources that changed.
+
+        Args:
+            introspect (bool): Introspect the FreeCAD API here. When False, only the API
+                collected by collect_api() is indexed, so it can run on a worker thread.
+
+        Returns:
+            int: The number of sources re-read.
+        """
+        with self._lock:
+            return self._update(introspect)
+
+    def _update(self, introspect):
+        if not self._loaded:
+            self._load()
+        sources = {}
+        changed = 0
+        for key, path in self.snippet_files().items():
+            stat = os.stat(path)
+            fingerprint = f"{stat.st_size}:{stat.st_mtime_ns}"
+            cached = self._sources.get(key)
+            if cached is None or cached["fingerprint"] != fingerprint:
+                try:
+                    cached = self._source(fingerprint, snippet_documents(path))
+                except (OSError, UnicodeDecodeError) as e:
+                    Log.warning(f"Snippet {path} not indexed: {e}\n")
+                    continue
+                changed += 1
+            sources[key] = cached
+
+        if introspect:
+            dynamic_sources = self._api_sources()
+        else:
+            # The API collected on the GUI thread; the sources not collected are kept as cached
+            dynamic_sources = []
+            for key in (API_SOURCE, TYPES_SOURCE):
+                fingerprint, documents = self._api.pop(key, (None, None))
+                dynamic_sources.append((key, fingerprint, lambda documents=documents: documents))
+        for key, fingerprint, read_documents in dynamic_sources:
+            cached = self._sources.get(key)
+            if fingerprint is None:
+                if cached is not None:
+                    sources[key] = cached  # Not available now: keep what was indexed earlier
+            elif cached is None or cached["fingerprint"] != fingerprint:
+                sources[key] = self._source(fingerprint, read_documents())
+                changed += 1
+            else:
+                sources[key] = cached
+
+        removed = set(self._sources) - set(sources)
+        self._sources = sources
+        if changed or removed:
+            self._save()
+        if changed or removed or not self.documents:
+            self._build()
+        return changed
+
+    @staticmethod
+    def _source(fingerprint, documents):
+        for document in documents:
+            document["terms"] = dict(collections.Counter(tokenize(f"{document['title']}\n{document['text']}")))
+        return {"fingerprint": fingerprint, "documents": documents}
+
+    def _build(self):
+        """ Build the inverted index from the cached term frequencies. """
+        self.documents = [document for source in self._sources.values() for document in source["documents"]]
+        postings = collections.defaultdict(list)
+        self._lengths = []
+        for index, document in enumerate(self.documents):
+            for term, frequency in document["terms"].items():
+                postings[term].append((index, frequency))
+            self._lengths.append(sum(document["terms"].values()))
+        self._postings = dict(postings)
+        self._average_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0.0
+
+    def __len__(self):
+        return len(self.documents)
+
+    def search(self, query, k=4):
+        """
+        Return the k documents best matching a query, as (document, score) pairs, best first.
+        """
+        with self._lock:
+            return self._search(query, k)
+
+    def _search(self, query, k):
+        count = len(self.documents)
+        scores = collections.defaultdict(float)
+        for term, query_frequency in collections.Counter(tokenize(query)).items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for index, frequency in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[index] / self._average_length)
+                scores[index] += query_frequency * idf * frequency * (self.k1 + 1) / (frequency + norm)
+        best = sorted(scores.items(), key=lambda item: -item[1])[:k]
+        return [(self.documents[index], score) for index, score in best]
+
+    def references(self, query, token_budget=800, k=4):
+        """
+        Build the message holding the best documents for a query that fit in the token budget.
+
+        Returns:
+            dict: A system message, or None if nothing relevant fits.
+        """
+        if token_budget <= 0 or k <= 0:
+            return None
+        sections = []
+        tokens = count_tokens(REFERENCES_HEADER)
+        for document, score in self.search(query, k * 2):
+            if len(sections) == k:
+                break
+            if document.get("kind") == "example":
+                section = f"Example - {document['title']}\n```python\n{document['text']}\n```"
+            else:
+                section = f"{document['title']}:\n{document['text']}"
+            section_tokens = count_tokens(section)
+            if tokens + section_tokens > token_budget:
+                continue
+            sections.append(section)
+            tokens += section_tokens
+        if not sections:
+            return None
+        return {"role": "system", "content": REFERENCES_HEADER + "\n\n".join(sections)}
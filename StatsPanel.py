@@ -0,0 +1,177 @@
+# StatsPanel.py
+"""
+This module contains the StatsPanel class, a small panel showing the metrics of
+the last request or run and a summary of the session, with export buttons.
+"""
+import os
+
+from PySide2 import QtWidgets
+
+from Metrics import REQUEST, DEBUG, REPAIR, RUN, ROUTE, EXPORT
+
+STAGE_NAMES = (
+    ("queue_ms", "queue"),
+    ("ttft_ms", "first token"),
+    ("api_ms", "API"),
+    ("parse_ms", "parse"),
+    ("latency_ms", "total"),
+    ("validate_ms", "validate"),
+    ("exec_ms", "exec"),
+    ("recompute_ms", "recompute"),
+    ("merge_ms", "merge"),
+    ("restore_ms", "restore"),
+    ("serialize_ms", "serialize"),
+    ("tessellate_ms", "tessellate"),
+    ("write_ms", "write"),
+    ("thumbnail_ms", "thumbnail"),
+    ("total_ms", "total"),
+)
+
+
+def format_ms(value):
+    """ Format a duration in milliseconds for display. """
+    return f"{value / 1000:.2f} s" if value >= 1000 else f"{value:.0f} ms"
+
+
+def describe_entry(entry):
+    """ Describe a metrics entry in one line. """
+    kind = entry["kind"]
+    title = {REQUEST: "Request", DEBUG: f"Debug iteration {entry.get('iteration', '')}",
+             REPAIR: "Parallel repair", RUN: f"Run ({entry.get('mode', '')})",
+             ROUTE: f"Script of the {entry.get('tier', '')} tier", EXPORT: "Export"}.get(kind, kind)
+    parts = [f"{name} {format_ms(entry[key])}" for key, name in STAGE_NAMES if key in entry]
+    if "prompt_tokens" in entry or "completion_tokens" in entry:
+        parts.append(f"{entry.get('prompt_tokens', '?')} + {entry.get('completion_tokens', '?')} tokens")
+    if "tier" in entry and kind != ROUTE:
+        parts.append(f"{entry['tier']} tier ({entry.get('model', '?')})")
+    if entry.get("escalated"):
+        parts.append("escalated")
+    if kind == ROUTE:
+        parts.append("ran" if entry.get("ok") else "failed")
+        return f"{title}: " + ", ".join(parts)
+    if "repair_format" in entry:
+        parts.append(f"{entry['repair_format']} repair")
+    if entry.get("saved_tokens"):
+        parts.append(f"{entry['saved_tokens']} tokens saved")
+    if entry.get("retries"):
+        parts.append(f"{entry['retries']} retries")
+    if "steps_run" in entry and entry["steps_run"] < entry.get("steps", 0):
+        parts.append(f"{entry['steps_run']} of {entry['steps']} steps re-run")
+    if "triangles" in entry:
+        parts.append(f"{entry['triangles']} triangles")
+    if "rounds" in entry:
+        parts.append(f"{entry['rounds']} rounds")
+    if entry.get("cache_hit"):
+        parts.append("cache hit")
+    if not entry.get("ok", True):
+        parts.append("failed")
+    return f"{title}: " + ", ".join(parts)
+
+
+class StatsPanel(QtWidgets.QGroupBox):
+    """
+    Shows the metrics collected by a Metrics object.
+    The panel only refreshes while it is visible.
+
+    Attributes:
+        metrics (Metrics): The metrics shown.
+        folder (str): The folder proposed when exporting.
+        last_label (QtWidgets.QLabel): The metrics of the last entry.
+        summary_label (QtWidgets.QLabel): The summary of the session.
+    """
+    def __init__(self, metrics, folder="", parent=None):
+        super().__init__("Stats", parent)
+        self.metrics = metrics
+        self.folder = folder
+        self._stale = True
+
+        layout = QtWidgets.QVBoxLayout(self)
+        self.last_label = QtWidgets.QLabel()
+        self.last_label.setWordWrap(True)
+        layout.addWidget(self.last_label)
+        self.summary_label = QtWidgets.QLabel()
+        self.summary_label.setWordWrap(True)
+        self.summary_label.setStyleSheet("color: #666;")
+        layout.addWidget(self.summary_label)
+
+        button_layout = QtWidgets.QHBoxLayout()
+        json_button = QtWidgets.QPushButton("Export JSON")
+        json_button.clicked.connect(lambda: self.export("json"))
+        csv_button = QtWidgets.QPushButton("Export CSV")
+        csv_button.clicked.connect(lambda: self.export("csv"))
+        reset_button = QtWidgets.QPushButton("Reset")
+        reset_button.clicked.connect(self.reset)
+        button_layout.addWidget(json_button)
+        button_layout.addWidget(csv_button)
+        button_layout.addWidget(reset_button)
+        layout.addLayout(button_layout)
+
+        metrics.listeners.append(self.on_record)
+
+    def detach(self):
+        """ Stop listening to the metrics, which outlive the panel when they are shared by the sessions. """
+        if self.on_record in self.metrics.listeners:
+            self.metrics.listeners.remove(self.on_record)
+
+    def on_record(self, entry):
+        """ Refresh the panel for a new entry, or defer it while the panel is hidden. """
+        if self.isVisible():
+            self.refresh()
+        else:
+            self._stale = True
+
+    def showEvent(self, event):
+        if self._stale:
+            self.refresh()
+        super().showEvent(event)
+
+    def refresh(self):
+        """ Show the last entry and the session summary. """
+        self._stale = False
+        if not self.metrics.enabled:
+            self.last_label.setText("Metrics are disabled in the settings.")
+            self.summary_label.clear()
+            return
+        records = self.metrics.records()
+        self.last_label.setText(describe_entry(records[-1]) if records else "No requests yet.")
+        summary = self.metrics.summary()
+        text = (
+            f"Session: {summary['requests']} requests ({summary['cache_hits']} cache hits), "
+            f"{summary['debug_iterations']} debug iterations, {summary['runs']} runs "
+            f"({summary['failed_runs']} failed, {summary['restored_runs']} restored), {summary['prompt_tokens']} prompt + "
+            f"{summary['completion_tokens']} completion tokens."
+        )
+        latency = summary["stages"].get(REQUEST, {}).get("latency_ms")
+        if latency:
+            text += f" Request latency: median {format_ms(latency['median'])}, p95 {format_ms(latency['p95'])}."
+        formats = summary["repair_formats"]
+        if formats.get("patch") and formats.get("full"):
+            patch, full = formats["patch"], formats["full"]
+            text += (f" Fixes: patches {patch.get('completion_tokens', 0):.0f} completion tokens and "
+                     f"{format_ms(patch.get('latency_ms', 0))}, full scripts {full.get('completion_tokens', 0):.0f} and "
+                     f"{format_ms(full.get('latency_ms', 0))} on average.")
+        elif summary["saved_tokens"]:
+            text += f" Patches saved about {summary['saved_tokens']} tokens."
+        if summary["tiers"]:
+            tiers = [f"{name} {tier['requests']} requests ({format_ms(tier.get('latency_ms', 0))}), "
+                     f"{tier['succeeded']}/{tier['runs']} scripts ran" for name, tier in summary["tiers"].items()]
+            text += f" Tiers: {'; '.join(tiers)}; {summary['escalations']} escalations."
+        self.summary_label.setText(text)
+
+    def export(self, fmt):
+        """ Export the metrics to a JSON or CSV file chosen by the user. """
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Export Metrics", os.path.join(self.folder, f"AI3DGenerator_metrics.{fmt}"),
+            "JSON files (*.json)" if fmt == "json" else "CSV files (*.csv)"
+        )
+        if not path:
+            return
+        if fmt == "json":
+            self.metrics.export_json(path)
+        else:
+            self.metrics.export_csv(path)
+
+    def reset(self):
+        """ Forget the metrics of the session. """
+        self.metrics.clear()
+        self.refresh()
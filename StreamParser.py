@@ -0,0 +1,136 @@
+# StreamParser.py
+"""
+This module contains the FencedBlockParser class, which splits a markdown
+response into reasoning text and fenced code blocks while it is being streamed,
+and helpers to split a complete response the same way.
+"""
+
+FENCE = "```"
+CODE_LANGUAGES = ("python", "py", "")
+
+
+class FencedBlockParser:
+    """
+    An incremental parser for markdown with fenced code blocks.
+
+    Text is fed in arbitrary chunks (a fence may be split across chunks) and the
+    parser returns a list of events for each chunk:
+
+        ("text", text)         Reasoning text outside of a code block.
+        ("code_start", lang)   A fenced block was opened with the given language.
+        ("code", text)         Code inside the current block.
+        ("code_end", "")       The current block was closed.
+
+    Attributes:
+        in_code (bool): True while the parser is inside a fenced block.
+        language (str): The language of the current (or last) fenced block.
+    """
+    def __init__(self):
+        self.in_code = False
+        self.language = ""
+        self._buffer = ""
+
+    def feed(self, text):
+        """
+        Feed a chunk of text and return the events it completes.
+
+        Args:
+            text (str): The next chunk of the response.
+
+        Returns:
+            list: The (kind, text) events.
+        """
+        self._buffer += text
+        events = []
+        while self._buffer:
+            index = self._buffer.find(FENCE)
+            if index == -1:
+                # Hold back trailing backticks, they may be the start of a fence
+                keep = len(self._buffer) - len(self._buffer.rstrip("`"))
+                ready = self._buffer[:len(self._buffer) - keep]
+                self._buffer = self._buffer[len(ready):]
+                self._emit(events, ready)
+                break
+
+            self._emit(events, self._buffer[:index])
+            if self.in_code:
+                self.in_code = False
+                self._buffer = self._buffer[index + len(FENCE):]
+                events.append(("code_end", ""))
+                continue
+
+            # An opening fence needs its whole line to know the language
+            newline = self._buffer.find("\n", index)
+            if newline == -1:
+                self._buffer = self._buffer[index:]
+                break
+            self.language = self._buffer[index + len(FENCE):newline].strip().lower()
+            self.in_code = True
+            self._buffer = self._buffer[newline + 1:]
+            events.append(("code_start", self.language))
+        return events
+
+    def close(self):
+        """
+        Flush the remaining text at the end of the stream, closing an unterminated block.
+
+        Returns:
+            list: The (kind, text) events.
+        """
+        events = []
+        if self._buffer.startswith(FENCE) and not self.in_code and "\n" not in self._buffer:
+            # A dangling opening fence without any code
+            self._buffer = ""
+        self._emit(events, self._buffer)
+        self._buffer = ""
+        if self.in_code:
+            self.in_code = False
+            events.append(("code_end", ""))
+        return events
+
+    def _emit(self, events, text):
+        if text:
+            events.append(("code" if self.in_code else "text", text))
+
+
+def is_code_language(language):
+    """ Return True if a fenced block with this language holds a runnable script. """
+    return language in CODE_LANGUAGES
+
+
+def split_response(response):
+    """
+    Split a complete response into reasoning text and code blocks.
+
+    Args:
+        response (str): The AI response.
+
+    Returns:
+        tuple: The reasoning text and the list of (language, code) blocks.
+    """
+    parser = FencedBlockParser()
+    reasoning = []
+    blocks = []
+    for kind, text in parser.feed(response) + parser.close():
+        if kind == "text":
+            reasoning.append(text)
+        elif kind == "code_start":
+            blocks.append((text, []))
+        elif kind == "code":
+            blocks[-1][1].append(text)
+    return "".join(reasoning), [(language, "".join(code)) for language, code in blocks]
+
+
+def extract_reasoning_and_code(response):
+    """
+    Extract the reasoning and code from an AI response.
+    When the response holds several code blocks, they are joined in order.
+    When it holds none, the whole response is taken as code.
+
+    Returns:
+        tuple: The reasoning and the code.
+    """
+    reasoning, blocks = split_response(response)
+    code_blocks = [code.strip() for language, code in blocks if is_code_language(language)]
+    code = "\n\n".join(code_blocks) if code_blocks else response
+    return reasoning.strip(), code.strip()
@@ -0,0 +1,121 @@
+# Thumbnail.py
+"""
+This module renders the thumbnails of exported parts: a shaded axonometric view
+of a triangle mesh, written as a PNG file with a transparent background. It only
+uses the standard library, so the export workers can render thumbnails without
+a GUI or an OpenGL context.
+"""
+import math
+import struct
+import zlib
+
+VIEW_DIRECTION = (1.0, -1.0, 1.0)  # From the front right top, like FreeCAD's axonometric view
+LIGHT_DIRECTION = (0.4, -0.6, 1.0)
+BASE_COLOR = (204, 204, 216)
+MARGIN = 0.06  # Of the size, on each side
+
+
+def normalize(vector):
+    length = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return tuple(value / length for value in vector)
+
+
+def cross(a, b):
+    return (a[1] * b[2] - a[2] * b[1], a[2] * b[0] - a[0] * b[2], a[0] * b[1] - a[1] * b[0])
+
+
+def dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+def project(points, direction=VIEW_DIRECTION):
+    """
+    Project points on the screen plane of a view looking along -direction, with the
+    Z axis up. Returns the (x, y, depth) of each point; a larger depth is nearer.
+    """
+    depth_axis = normalize(direction)
+    right = normalize(cross((0.0, 0.0, 1.0), depth_axis))
+    up = cross(depth_axis, right)
+    return [(dot(point, right), dot(point, up), dot(point, depth_axis)) for point in points]
+
+
+def render(points, triangles, size=256):
+    """
+    Render a triangle mesh with flat shading and a depth buffer.
+
+    Args:
+        points (list): The (x, y, z) vertices of the mesh.
+        triangles (list): The (i, j, k) vertex indices of each triangle.
+        size (int): The width and height of the image, in pixels.
+
+    Returns:
+        bytearray: The RGBA pixels, row by row from the top.
+    """
+    pixels = bytearray(size * size * 4)
+    if not points or not triangles:
+        return pixels
+    projected = project(points)
+    xs = [point[0] for point in projected]
+    ys = [point[1] for point in projected]
+    extent = max(max(xs) - min(xs), max(ys) - min(ys)) or 1.0
+    scale = size * (1 - 2 * MARGIN) / extent
+    # Center the part in the image, Y going down
+    offset_x = size / 2 - (max(xs) + min(xs)) / 2 * scale
+    offset_y = size / 2 + (max(ys) + min(ys)) / 2 * scale
+    screen = [(x * scale + offset_x, offset_y - y * scale, depth) for x, y, depth in projected]
+    light = normalize(LIGHT_DIRECTION)
+    depths = [-math.inf] * (size * size)
+    for i, j, k in triangles:
+        normal = normalize(cross(tuple(points[j][axis] - points[i][axis] for axis in range(3)),
+                                 tuple(points[k][axis] - points[i][axis] for axis in range(3))))
+        # The orientation of the triangles is not reliable, light both sides
+        shade = 0.35 + 0.65 * abs(dot(normal, light))
+        color = bytes(min(255, int(channel * shade)) for channel in BASE_COLOR) + b"\xff"
+        fill_triangle(pixels, depths, size, screen[i], screen[j], screen[k], color)
+    return pixels
+
+
+def fill_triangle(pixels, depths, size, a, b, c, color):
+    """ Fill the pixels whose center is inside a screen triangle and nearer than what they show. """
+    area = (b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0])
+    if abs(area) < 1e-12:
+        return
+    min_x = max(0, int(math.floor(min(a[0], b[0], c[0]))))
+    max_x = min(size - 1, int(math.ceil(max(a[0], b[0], c[0]))))
+    min_y = max(0, int(math.floor(min(a[1], b[1], c[1]))))
+    max_y = min(size - 1, int(math.ceil(max(a[1], b[1], c[1]))))
+    for y in range(min_y, max_y + 1):
+        py = y + 0.5
+        for x in range(min_x, max_x + 1):
+            px = x + 0.5
+            # Barycentric weights; all of the sign of the area inside the triangle
+            w0 = ((b[0] - px) * (c[1] - py) - (b[1] - py) * (c[0] - px)) / area
+            w1 = ((c[0] - px) * (a[1] - py) - (c[1] - py) * (a[0] - px)) / area
+            w2 = 1.0 - w0 - w1
+            if w0 < 0 or w1 < 0 or w2 < 0:
+                continue
+            depth = w0 * a[2] + w1 * b[2] + w2 * c[2]
+            index = y * size + x
+            if depth > depths[index]:
+                depths[index] = depth
+                pixels[index * 4:index * 4 + 4] = color
+
+
+def encode_png(pixels, width, height):
+    """ Encode RGBA pixels as a PNG file. """
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff)
+    stride = width * 4
+    # Each row starts with its filter type, 0 for none
+    raw = b"".join(b"\x00" + bytes(pixels[row * stride:(row + 1) * stride]) for row in range(height))
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 9))
+            + chunk(b"IEND", b""))
+
+
+def write_thumbnail(path, points, triangles, size=256):
+    """ Render a triangle mesh and write it to a PNG file. Returns the path. """
+    with open(path, "wb") as file:
+        file.write(encode_png(render(points, triangles, size), size, size))
+    return path
@@ -0,0 +1,184 @@
+# MockOpenAIServer.py
+"""
+This module contains the MockOpenAIServer class, a local stand-in for the OpenAI
+chat completions endpoint, so the benchmarks run offline and reproducibly.
+
+Point the client at server.api_base (AIClient.api_base, or openai.api_base).
+"""
+import http.server
+import itertools
+import json
+import threading
+import time
+
+
+class MockOpenAIServer:
+    """
+    A local HTTP server answering POST /v1/chat/completions with canned responses.
+
+    Both plain and streamed (server-sent events) responses are supported; a
+    streamed response is sent in chunks of chunk_size characters. Errors such as
+    rate limits can be injected with fail_next().
+
+    Attributes:
+        latency (float): The delay before the first byte of each response, in seconds.
+        chunk_size (int): The number of characters per streamed chunk.
+        chunk_delay (float): The delay between streamed chunks, in seconds.
+        token_delay (float): The time to generate each completion token (four characters), in
+            seconds, so that long responses take longer like they do with a real model.
+        responder (callable): Called with the list of messages of a request; returns the response text.
+        requests (list): The bodies of the requests received, in order.
+        max_in_flight (int): The highest number of requests handled at the same time.
+        api_base (str): The base URL to give to the OpenAI client.
+    """
+    def __init__(self, responses="Hello", latency=0.0, chunk_size=16, chunk_delay=0.0, token_delay=0.0):
+        """
+        Args:
+            responses: A response text, a list of texts answered in turn (cycling),
+                or a callable taking the messages and returning the text.
+        """
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.token_delay = token_delay
+        self.requests = []
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._failures = []
+        self.set_responses(responses)
+        self._lock = threading.Lock()
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+        self.api_base = f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def set_responses(self, responses):
+        """ Replace the canned responses; see __init__. """
+        if callable(responses):
+            self.responder = responses
+        elif isinstance(responses, str):
+            self.responder = lambda messages: responses
+        else:
+            cycle = itertools.cycle(responses)
+            self.responder = lambda messages: next(cycle)
+
+    def fail_next(self, count=1, status=429, retry_after=None):
+        """ Answer the next count requests with an error status, optionally with a Retry-After header. """
+        with self._lock:
+            self._failures.extend([(status, retry_after)] * count)
+
+    def start(self):
+        """ Serve requests on a background thread. """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """ Stop the server. """
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _answer(self, body):
+        """ Return the error to send as (status, retry_after), or the response text. """
+        with self._lock:
+            self.requests.append(body)
+            if self._failures:
+                return self._failures.pop(0)
+            return self.responder(body.get("messages", []))
+
+    def _enter(self, delta):
+        with self._lock:
+            self._in_flight += delta
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; with Nagle's algorithm the body of a
+            # kept-alive connection would wait for the client's delayed ACK (~40 ms)
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                server._enter(1)
+                try:
+                    answer = server._answer(body)
+                    if server.latency:
+                        time.sleep(server.latency)
+                    if isinstance(answer, tuple):
+                        self._error(*answer)
+                    elif body.get("stream"):
+                        self._stream(body, answer)
+                    else:
+                        if server.token_delay:
+                            time.sleep(len(answer) // 4 * server.token_delay)
+                        self._complete(body, answer)
+                finally:
+                    server._enter(-1)
+
+            def _error(self, status, retry_after):
+                payload = json.dumps({"error": {"message": f"Mock error {status}", "type": "mock_error",
+                                                "code": None}}).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if retry_after is not None:
+                    self.send_header("Retry-After", str(retry_after))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _complete(self, body, text):
+                prompt_tokens = sum(len(message.get("content", "")) for message in body.get("messages", [])) // 4
+                payload = json.dumps({
+                    "id": "chatcmpl-mock",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "mock"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": text}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(text) // 4,
+                              "total_tokens": prompt_tokens + len(text) // 4},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, body, text):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                for start in range(0, len(text), server.chunk_size):
+                    chunk = text[start:start + server.chunk_size]
+                    self._event({"role": "assistant", "content": chunk}, body)
+                    if server.chunk_delay or server.token_delay:
+                        time.sleep(server.chunk_delay + len(chunk) / 4 * server.token_delay)
+                self._event({}, body, finish_reason="stop")
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def _event(self, delta, body, finish_reason=None):
+                chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": body.get("model", "mock"),
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
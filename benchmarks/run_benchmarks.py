@@ -0,0 +1,498 @@
+# run_benchmarks.py
+"""
+Offline benchmarks of the AI 3D Generator.
+
+The OpenAI API is replaced by a local MockOpenAIServer and FreeCAD by the stubs
+in benchmarks/stubs, so the benchmarks run without network access or FreeCAD.
+They need PySide2 and the openai package (below 1.0). Qt runs offscreen.
+
+Benchmarks:
+    startup     Workbench initialization and widget construction, in a fresh process.
+    end_to_end  prompt_ai -> get_openai_response -> extract_reasoning_and_code -> run_script,
+                with and without streaming.
+    chat        ChatWindow appending, painting and scrolling at 1k and 10k messages.
+    debug_loop  Time for the serial debugging loop to converge when the AI needs 1, 2
+                and 4 fix requests to return a working script.
+    commands    CommandHelper indexing and search with 1k and 5k registered commands.
+    geometry    Running a slow script, then restoring its document from the geometry cache.
+    repair      Fixing a one-line error in a long script with a patch and with a full rewrite:
+                tokens and latency of the fix request.
+
+Usage:
+    python benchmarks/run_benchmarks.py --output results.json
+    python benchmarks/run_benchmarks.py --only end_to_end --latency 0.2 --iterations 20
+
+The results are written as JSON: a "meta" object describing the run, and one
+object per benchmark with the timings in milliseconds.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path[:0] = [os.path.join(HERE, "stubs"), ROOT, HERE]
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide2 import QtCore, QtWidgets  # noqa: E402
+
+from MockOpenAIServer import MockOpenAIServer  # noqa: E402
+
+BENCHMARKS = ("startup", "end_to_end", "chat", "debug_loop", "commands", "geometry", "repair")
+
+SCRIPT = """import FreeCAD
+doc = FreeCAD.ActiveDocument or FreeCAD.newDocument("Benchmark")
+box = doc.addObject("Part::Box", "Box")
+box.Length, box.Width, box.Height = 20, 10, 5
+doc.recompute()
+"""
+FAILING_SCRIPT = """import FreeCAD
+doc = FreeCAD.ActiveDocument or FreeCAD.newDocument("Benchmark")
+doc.addObject("Part::Box", "Box").Radius = 5  # attempt {attempt}
+raise AttributeError("'Part.Box' object has no attribute 'Radius'")
+"""
+# Stands for a part whose booleans and fillets take a while to compute
+SLOW_SCRIPT = """import FreeCAD
+doc = FreeCAD.newDocument("Slow")
+for index in range({loops}):
+    if index % {every} == 0:
+        doc.addObject("Part::Box", "Box")
+doc.recompute()
+"""
+# A long script with a typo on one line, and the diff fixing it
+LONG_SCRIPT_HEAD = """import FreeCAD
+doc = FreeCAD.ActiveDocument or FreeCAD.newDocument("Benchmark")
+height = 5
+"""
+LONG_SCRIPT_PART = """box{index} = doc.addObject("Part::Box", "Box{index}")
+box{index}.Length, box{index}.Width = {length}, 10
+box{index}.Height = {height}
+box{index}.Label = "Part {index}"
+"""
+REASONING = "To create the part, I start with a box and set its dimensions. " * 8
+
+
+def ai_response(script):
+    return f"{REASONING}\n\n```python\n{script}```\n"
+
+
+def long_script(parts, typo):
+    """ Return a script building parts boxes, the middle one using the misspelled name typo, and the line of the typo. """
+    lines = [LONG_SCRIPT_HEAD]
+    for index in range(parts):
+        name = typo if index == parts // 2 else "height"
+        lines.append(LONG_SCRIPT_PART.format(index=index, length=20 + index, height=name))
+    script = "".join(lines) + "doc.recompute()\n"
+    return script, LONG_SCRIPT_HEAD.count("\n") + 4 * (parts // 2) + 3
+
+
+def summarize(samples):
+    """ Summarize a list of durations in seconds as milliseconds. """
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+        "min_ms": round(samples[0] * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+    }
+
+
+def wait_until(condition, timeout=60.0):
+    """ Run the Qt event loop until condition() is true. Raises TimeoutError after timeout seconds. """
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("The benchmark did not complete in time.")
+        QtCore.QCoreApplication.processEvents(QtCore.QEventLoop.AllEvents, 5)
+        time.sleep(0.0005)
+
+
+def isolate_settings(folder, **values):
+    """ Keep the plugin settings of the benchmarks in a temporary folder, away from the user's settings. """
+    QtCore.QSettings.setDefaultFormat(QtCore.QSettings.IniFormat)
+    QtCore.QSettings.setPath(QtCore.QSettings.IniFormat, QtCore.QSettings.UserScope, folder)
+    settings = QtCore.QSettings("FreeCAD", "AI3DGenerator")
+    settings.clear()
+    settings.setValue("save_folder", folder)
+    for key, value in values.items():
+        settings.setValue(key, value)
+    settings.sync()
+
+
+def make_widget(server, folder, stream):
+    """ Build an AI3DGeneratorWidget talking to the mock server, with the response cache off. """
+    from AI3DGeneratorWidget import AI3DGeneratorWidget
+    with open(os.path.join(ROOT, "pre_prompt_example.txt"), encoding="utf-8") as file:
+        pre_prompt = file.read()
+    isolate_settings(folder, api_key="mock-key", pre_prompt=pre_prompt, stream=stream,
+                     cache_mode="off", execution_mode="in_process", repair_mode="serial")
+    widget = AI3DGeneratorWidget()
+    widget.ai_client.api_base = server.api_base
+    return widget
+
+
+def bench_startup(args):
+    """ Run the startup probe in fresh processes, so the imports are not already cached. """
+    runs = []
+    for _ in range(args.startup_runs):
+        # The exit status is not checked: some PySide2 builds crash while tearing down Qt
+        probe = subprocess.run([sys.executable, os.path.abspath(__file__), "--startup-probe"],
+                               capture_output=True, text=True)
+        lines = probe.stdout.strip().splitlines()
+        if not lines:
+            raise RuntimeError(f"The startup probe failed:\n{probe.stderr}")
+        runs.append(json.loads(lines[-1]))
+    return {
+        "runs": len(runs),
+        "workbench": summarize([run["workbench_ms"] / 1000 for run in runs]),
+        "widget": summarize([run["widget_ms"] / 1000 for run in runs]),
+        "openai_imported_at_startup": any(run["openai_imported"] for run in runs),
+    }
+
+
+def startup_probe():
+    """ Initialize the workbench and open the widget once, then print the timings as JSON. """
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    with tempfile.TemporaryDirectory() as folder:
+        isolate_settings(folder)
+        import FreeCADGui
+        import InitGui  # noqa: F401 - registers the workbench
+        workbench = FreeCADGui._workbenches[-1]
+        workbench.Initialize()
+        import AI3DGenerator
+        openai_imported = "openai" in sys.modules
+        FreeCADGui._commands["AI3DGenerator"].Activated()
+        timings = AI3DGenerator.STARTUP_TIMINGS
+        print(json.dumps({"workbench_ms": timings["workbench"], "widget_ms": timings["widget"],
+                          "openai_imported": openai_imported}), flush=True)
+    app.quit()
+
+
+def bench_end_to_end(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as folder, MockOpenAIServer(
+            ai_response(SCRIPT), latency=args.latency, chunk_size=args.chunk_size, chunk_delay=args.chunk_delay) as server:
+        from StreamParser import extract_reasoning_and_code
+        for stream in (False, True):
+            widget = make_widget(server, folder, stream)
+            timings = {"response": [], "extract": [], "run_script": [], "total": []}
+            for iteration in range(args.warmup + args.iterations):
+                widget.clear_chat()
+                widget.prompt_input.setPlainText(f"Create a 20 x 10 x 5 mm box ({iteration})")
+                start = time.perf_counter()
+                widget.prompt_ai()
+                wait_until(lambda: len(widget.conversation_history) == 3 and not widget.request_engine.is_busy())
+                responded = time.perf_counter()
+                extract_start = time.perf_counter()
+                extract_reasoning_and_code(widget.conversation_history[-1]["content"])
+                extracted = time.perf_counter() - extract_start
+                run_start = time.perf_counter()
+                widget.run_script()
+                finished = time.perf_counter()
+                if iteration < args.warmup:
+                    continue
+                timings["response"].append(responded - start)
+                timings["extract"].append(extracted)
+                timings["run_script"].append(finished - run_start)
+                timings["total"].append(finished - start)
+            widget.session_store.close()
+            widget.deleteLater()
+            results["streaming" if stream else "blocking"] = {name: summarize(values) for name, values in timings.items()}
+            # The per-stage metrics collected by the widget itself
+            results["streaming" if stream else "blocking"]["stages"] = widget.metrics.summary()["stages"]
+    results["latency_s"] = args.latency
+    return results
+
+
+def bench_chat(args):
+    results = {}
+    from ChatWindow import ChatWindow
+    for count in args.chat_sizes:
+        chat = ChatWindow()
+        chat.resize(420, 700)
+        chat.show()
+        wait_until(lambda: chat.isVisible())
+        start = time.perf_counter()
+        for index in range(count):
+            user = index % 2 == 0
+            text = f"Message {index}: " + ("make the walls thicker" if user else REASONING[:40 + index % 400])
+            chat.add_message("User" if user else "AI", text, is_user=user)
+        appended = time.perf_counter() - start
+        start = time.perf_counter()
+        QtCore.QCoreApplication.processEvents()
+        chat.grab()
+        painted = time.perf_counter() - start
+
+        start = time.perf_counter()
+        chat.view.scrollToTop()
+        chat.grab()
+        chat.scroll_to_bottom()
+        chat.grab()
+        scrolled = time.perf_counter() - start
+
+        row = chat.add_message("AI", "")
+        start = time.perf_counter()
+        for _ in range(args.stream_chunks):
+            chat.append_to_message(row, "token ")
+            QtCore.QCoreApplication.processEvents()
+        streamed = time.perf_counter() - start
+        results[str(count)] = {
+            "append_ms": round(appended * 1000, 3),
+            "append_per_message_us": round(appended / count * 1e6, 3),
+            "first_paint_ms": round(painted * 1000, 3),
+            "scroll_top_bottom_ms": round(scrolled * 1000, 3),
+            "stream_chunks": args.stream_chunks,
+            "stream_append_ms": round(streamed * 1000, 3),
+        }
+        chat.close()
+        chat.deleteLater()
+        QtCore.QCoreApplication.processEvents()
+    return results
+
+
+def bench_debug_loop(args):
+    results = {}
+    state = {"fixes": 0, "needed": 0, "converged": None}
+
+    def respond(messages):
+        if "Please fix the code." not in messages[-1]["content"]:
+            return ai_response(FAILING_SCRIPT.format(attempt=0))
+        state["fixes"] += 1
+        if state["fixes"] < state["needed"]:
+            return ai_response(FAILING_SCRIPT.format(attempt=state["fixes"]))
+        return ai_response(SCRIPT)
+
+    # The debugging loop asks before each iteration and reports success in message boxes
+    question, information = QtWidgets.QMessageBox.question, QtWidgets.QMessageBox.information
+    QtWidgets.QMessageBox.question = lambda *a, **k: QtWidgets.QMessageBox.Yes
+    QtWidgets.QMessageBox.information = lambda *a, **k: state.update(converged=time.perf_counter())
+    try:
+        with tempfile.TemporaryDirectory() as folder, MockOpenAIServer(respond, latency=args.latency) as server:
+            widget = make_widget(server, folder, stream=False)
+            for needed in args.debug_fixes:
+                samples, requests = [], []
+                for iteration in range(args.warmup + args.debug_iterations):
+                    widget.clear_chat()
+                    state.update(fixes=0, needed=needed, converged=None)
+                    widget.prompt_input.setPlainText("Create a cylinder")
+                    widget.prompt_ai()
+                    wait_until(lambda: len(widget.conversation_history) == 3 and not widget.request_engine.is_busy())
+                    first_request = len(server.requests)
+                    errors = []
+                    original = widget.on_script_failed
+                    widget.on_script_failed = lambda script, error, tier=None: errors.append((script, error))
+                    widget.run_script()
+                    widget.on_script_failed = original
+                    script, error = errors[0]
+                    start = time.perf_counter()
+                    widget.debug_script(error, script)
+                    wait_until(lambda: state["converged"] is not None and not widget.request_engine.is_busy())
+                    if iteration >= args.warmup:
+                        samples.append(state["converged"] - start)
+                        requests.append(len(server.requests) - first_request)
+                results[f"{needed}_fix_requests"] = {
+                    "convergence": summarize(samples),
+                    "requests": statistics.mean(requests),
+                }
+            widget.session_store.close()
+    finally:
+        QtWidgets.QMessageBox.question, QtWidgets.QMessageBox.information = question, information
+    results["latency_s"] = args.latency
+    return results
+
+
+def bench_commands(args):
+    import FreeCADGui
+    from CommandHelper import CommandHelper
+    with open(os.path.join(ROOT, "pre_prompt_example.txt"), encoding="utf-8") as file:
+        pre_prompt = file.read()
+    workbenches = ("Part", "PartDesign", "Sketcher", "Draft", "Arch", "Fem", "Mesh", "Std", "TechDraw", "Path")
+    features = ("Box", "Cylinder", "Extrude", "Revolve", "Fillet", "Chamfer", "Pocket", "Pad", "Mirror",
+                "Pattern", "Boolean", "Cut", "Fuse", "Section", "Offset", "Loft", "Sweep", "Helix", "Constraint")
+    queries = ("/", "s", "sk", "/sket", "extrde", "fillet", "part box", "constraint", "zzzz")
+    results = {}
+    parent = QtWidgets.QWidget()
+    parent.prompt_input = QtWidgets.QTextEdit()
+    for count in args.command_counts:
+        FreeCADGui._commands.clear()
+        for index in range(count):
+            name = f"{workbenches[index % len(workbenches)]}_{features[index % len(features)]}" \
+                   f"{features[index // len(features) % len(features)]}{index}"
+            FreeCADGui._commands[name] = None
+        start = time.perf_counter()
+        helper = CommandHelper(parent, pre_prompt)
+        built = time.perf_counter() - start
+        slash_commands = [index for index, entry in enumerate(helper.index.entries) if entry.name.startswith("/")]
+        assert [index for index, _ in helper.index.search("/")] == slash_commands, "'/' did not list the slash commands."
+        helper.show()
+        samples = []
+        for _ in range(args.iterations):
+            for query in queries:
+                helper.filter_commands(query)
+                samples.append(helper.last_search_ms / 1000)
+        results[str(count)] = {"index_ms": round(built * 1000, 3), "search": summarize(samples)}
+        helper.close()
+        helper.deleteLater()
+        QtCore.QCoreApplication.processEvents()
+    FreeCADGui._commands.clear()
+    return results
+
+
+def bench_geometry(args):
+    # Calibrate the loop of SLOW_SCRIPT to the requested build times
+    start = time.perf_counter()
+    for index in range(1000000):
+        if index % 1000 == 0:
+            pass
+    loops_per_second = 1000000 / (time.perf_counter() - start)
+    results = {}
+    with tempfile.TemporaryDirectory() as folder, MockOpenAIServer(ai_response(SCRIPT)) as server:
+        widget = make_widget(server, folder, stream=False)
+        for seconds in args.geometry_build_seconds:
+            loops = int(loops_per_second * seconds)
+            script = SLOW_SCRIPT.format(loops=loops, every=max(1, loops // 50))
+            widget.geometry_cache.clear()
+            start = time.perf_counter()
+            widget.execute_script(script, lambda: None, lambda error: None)
+            built = time.perf_counter() - start
+            samples = []
+            for iteration in range(args.iterations):
+                # Comments and formatting do not change the cache key
+                start = time.perf_counter()
+                widget.execute_script(f"# run {iteration}\n{script}", lambda: None, lambda error: None)
+                samples.append(time.perf_counter() - start)
+            restored = widget.metrics.summary()["restored_runs"]
+            results[f"{seconds:g}_s"] = {"build_ms": round(built * 1000, 3), "restore": summarize(samples),
+                                         "restored_runs": restored}
+            widget.metrics.clear()
+        widget.session_store.close()
+        widget.deleteLater()
+    return results
+
+
+def bench_repair(args):
+    from ScriptPatch import PATCH_INSTRUCTIONS
+    results = {}
+    parts = args.repair_parts
+    broken, line = long_script(parts, "heigth")
+    fixed, _ = long_script(parts, "height")
+    broken_lines = broken.splitlines()
+    diff = (f"The variable name is misspelled.\n\n```diff\n@@ -{line - 2},5 +{line - 2},5 @@\n"
+            + "".join(f" {text}\n" for text in broken_lines[line - 3:line - 1])
+            + f"-{broken_lines[line - 1]}\n+{fixed.splitlines()[line - 1]}\n"
+            + "".join(f" {text}\n" for text in broken_lines[line:line + 2]) + "```\n")
+
+    def respond(messages):
+        return diff if PATCH_INSTRUCTIONS in messages[-1]["content"] else ai_response(fixed)
+
+    # The debugging loop asks before each iteration and reports success in message boxes
+    question, information = QtWidgets.QMessageBox.question, QtWidgets.QMessageBox.information
+    QtWidgets.QMessageBox.question = lambda *a, **k: QtWidgets.QMessageBox.Yes
+    QtWidgets.QMessageBox.information = lambda *a, **k: None
+    try:
+        with tempfile.TemporaryDirectory() as folder, \
+                MockOpenAIServer(respond, latency=args.latency, token_delay=args.token_delay) as server:
+            widget = make_widget(server, folder, stream=False)
+            for repair_format in ("patch", "rewrite"):
+                widget.repair_format = repair_format
+                widget.metrics.clear()
+                samples = []
+                for iteration in range(args.warmup + args.iterations):
+                    widget.code_editor.setPlainText(broken)
+                    errors = []
+                    widget.execute_script(broken, lambda: None, lambda error: errors.append(error))
+                    start = time.perf_counter()
+                    widget.run_debugging_loop(errors[0], broken)
+                    wait_until(lambda: not widget.request_engine.is_busy()
+                               and widget.code_editor.toPlainText() != broken)
+                    if iteration >= args.warmup:
+                        samples.append(time.perf_counter() - start)
+                entries = widget.metrics.records("debug")[args.warmup:]
+                assert widget.code_editor.toPlainText().strip() == fixed.strip(), "The fix was not applied."
+                results[repair_format] = {
+                    "fix": summarize(samples),
+                    "prompt_tokens": statistics.mean(entry["prompt_tokens"] for entry in entries),
+                    "completion_tokens": statistics.mean(entry["completion_tokens"] for entry in entries),
+                    "formats": sorted({entry.get("repair_format", "") for entry in entries}),
+                }
+            widget.session_store.close()
+            widget.deleteLater()
+    finally:
+        QtWidgets.QMessageBox.question, QtWidgets.QMessageBox.information = question, information
+    results["script_lines"] = len(broken_lines)
+    results["latency_s"] = args.latency
+    results["token_delay_s"] = args.token_delay
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the offline benchmarks of the AI 3D Generator.")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS), help="benchmarks to run")
+    parser.add_argument("--output", help="file receiving the JSON results (default: stdout)")
+    parser.add_argument("--iterations", type=int, default=10, help="measured iterations per case")
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured iterations per case")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock API latency, in seconds")
+    parser.add_argument("--chunk-size", type=int, default=16, help="characters per streamed chunk")
+    parser.add_argument("--chunk-delay", type=float, default=0.002, help="delay between streamed chunks, in seconds")
+    parser.add_argument("--chat-sizes", type=int, nargs="+", default=[1000, 10000], help="chat sizes to render")
+    parser.add_argument("--stream-chunks", type=int, default=500, help="chunks appended to the last chat message")
+    parser.add_argument("--debug-fixes", type=int, nargs="+", default=[1, 2, 4],
+                        help="number of fix requests needed for the debugging loop to converge")
+    parser.add_argument("--debug-iterations", type=int, default=5, help="measured runs of each debugging case")
+    parser.add_argument("--command-counts", type=int, nargs="+", default=[1000, 5000],
+                        help="numbers of registered FreeCAD commands indexed by the command helper")
+    parser.add_argument("--geometry-build-seconds", type=float, nargs="+", default=[1.0, 5.0],
+                        help="build times of the scripts restored from the geometry cache")
+    parser.add_argument("--repair-parts", type=int, default=40, help="boxes of the long script fixed by the repair benchmark")
+    parser.add_argument("--token-delay", type=float, default=0.01,
+                        help="mock time per completion token in the repair benchmark, in seconds")
+    parser.add_argument("--startup-runs", type=int, default=5, help="fresh processes measured for the startup")
+    parser.add_argument("--startup-probe", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.startup_probe:
+        startup_probe()
+        return 0
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    results = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "qt": QtCore.qVersion(),
+            "iterations": args.iterations,
+        },
+    }
+    for name in args.only:
+        sys.stderr.write(f"Running {name}...\n")
+        results[name] = globals()[f"bench_{name}"](args)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+    app.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# FreeCAD.py
+"""
+A minimal stand-in for the FreeCAD module, used by the benchmarks. It implements
+just enough of the document API for the plugin and simple generated scripts to
+run without FreeCAD. Console output is dropped unless AI3DGENERATOR_BENCH_VERBOSE is set.
+"""
+import os
+import sys
+
+
+class _Console:
+    verbose = bool(os.environ.get("AI3DGENERATOR_BENCH_VERBOSE"))
+
+    def _print(self, text):
+        if self.verbose:
+            sys.stderr.write(text)
+
+    PrintMessage = PrintWarning = PrintError = PrintLog = _print
+
+
+Console = _Console()
+
+
+class Vector:
+    def __init__(self, x=0.0, y=0.0, z=0.0):
+        self.x, self.y, self.z = float(x), float(y), float(z)
+
+    def __add__(self, other):
+        return Vector(self.x + other.x, self.y + other.y, self.z + other.z)
+
+    def __sub__(self, other):
+        return Vector(self.x - other.x, self.y - other.y, self.z - other.z)
+
+    def __repr__(self):
+        return f"Vector ({self.x}, {self.y}, {self.z})"
+
+
+class DocumentObject:
+    def __init__(self, document, type_id, name):
+        self.Document = document
+        self.TypeId = type_id
+        self.Name = name
+        self.Label = name
+        self.InList = []
+        self.OutList = []
+
+
+class Document:
+    def __init__(self, name):
+        self.Name = name
+        self.Objects = []
+        self.FileName = ""
+
+    def addObject(self, type_id, name=None):
+        name = name or type_id.split("::")[-1]
+        existing = {obj.Name for obj in self.Objects}
+        base, number = name, 1
+        while name in existing:
+            name = f"{base}{number:03d}"
+            number += 1
+        obj = DocumentObject(self, type_id, name)
+        self.Objects.append(obj)
+        return obj
+
+    def getObject(self, name):
+        return next((obj for obj in self.Objects if obj.Name == name), None)
+
+    def removeObject(self, name):
+        self.Objects = [obj for obj in self.Objects if obj.Name != name]
+
+    def recompute(self):
+        return len(self.Objects)
+
+    def mergeProject(self, path):
+        with open(path) as file:
+            for name in file.read().split():
+                self.addObject("Part::Feature", name)
+
+    def saveAs(self, path):
+        self.FileName = path
+        self.saveCopy(path)
+
+    def saveCopy(self, path):
+        with open(path, "w") as file:
+            file.write("\n".join(obj.Name for obj in self.Objects))
+
+
+_documents = {}
+ActiveDocument = None
+
+
+def newDocument(name="Unnamed"):
+    global ActiveDocument
+    base, number = name, 1
+    while name in _documents:
+        name = f"{base}{number}"
+        number += 1
+    ActiveDocument = _documents[name] = Document(name)
+    return ActiveDocument
+
+
+def getDocument(name):
+    return _documents[name]
+
+
+def setActiveDocument(name):
+    global ActiveDocument
+    ActiveDocument = _documents[name]
+
+
+def listDocuments():
+    return dict(_documents)
+
+
+def closeDocument(name):
+    global ActiveDocument
+    document = _documents.pop(name)
+    if ActiveDocument is document:
+        ActiveDocument = next(iter(_documents.values()), None)
+
+
+def Version():
+    return ["0", "21", "2", "stub"]
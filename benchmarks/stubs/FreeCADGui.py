@@ -0,0 +1,38 @@
+# FreeCADGui.py
+"""
+A minimal stand-in for the FreeCADGui module, used by the benchmarks.
+"""
+from PySide2 import QtWidgets
+
+ActiveDocument = None
+
+_commands = {}
+_workbenches = []
+_main_window = None
+
+
+class Workbench:
+    def appendToolbar(self, name, commands):
+        pass
+
+    def appendMenu(self, name, commands):
+        pass
+
+
+def getMainWindow():
+    global _main_window
+    if _main_window is None:
+        _main_window = QtWidgets.QMainWindow()
+    return _main_window
+
+
+def addCommand(name, command):
+    _commands[name] = command
+
+
+def listCommands():
+    return list(_commands)
+
+
+def addWorkbench(workbench):
+    _workbenches.append(workbench)
@@ -0,0 +1,22 @@
+"""
+Document basics: get or create the active document, add objects, recompute.
+
+Scripts may run without the GUI (FreeCADCmd), so only use FreeCADGui when it is loaded.
+"""
+import FreeCAD
+
+doc = FreeCAD.ActiveDocument or FreeCAD.newDocument("Model")
+
+box = doc.addObject("Part::Box", "Box")
+box.Length = 20  # mm
+box.Width = 10
+box.Height = 5
+box.Label = "Base plate"
+
+obj = doc.getObject("Box")          # by internal name
+same = doc.getObjectsByLabel("Base plate")[0]
+doc.recompute()                     # always recompute after changing properties
+
+if FreeCAD.GuiUp:
+    import FreeCADGui
+    FreeCADGui.SendMsgToActiveView("ViewFit")
@@ -0,0 +1,23 @@
+"""
+Repeated features: Draft rectangular and polar arrays, or plain Python loops over shapes.
+"""
+import FreeCAD
+import Draft
+import Part
+from FreeCAD import Vector
+
+doc = FreeCAD.ActiveDocument or FreeCAD.newDocument("Model")
+peg = doc.addObject("Part::Cylinder", "Peg")
+peg.Radius = 2
+peg.Height = 10
+
+grid = Draft.make_ortho_array(peg, v_x=Vector(10, 0, 0), v_y=Vector(0, 10, 0), v_z=Vector(0, 0, 10),
+                              n_x=4, n_y=3, n_z=1, use_link=False)
+ring = Draft.make_polar_array(peg, number=8, angle=360, center=Vector(50, 0, 0), use_link=False)
+
+# Without Draft: fuse or cut copies of a shape
+plate = Part.makeBox(60, 40, 5)
+for x in range(10, 60, 10):
+    plate = plate.cut(Part.makeCylinder(2, 5, Vector(x, 20, 0)))
+Part.show(plate, "PerforatedPlate")
+doc.recompute()
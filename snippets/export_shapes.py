@@ -0,0 +1,21 @@
+"""
+Export and import: STEP, IGES, BREP and STL files with Part and Mesh.
+"""
+import FreeCAD
+import Mesh
+import Part
+
+doc = FreeCAD.ActiveDocument or FreeCAD.newDocument("Model")
+obj = doc.addObject("Part::Box", "Box")
+doc.recompute()
+
+obj.Shape.exportStep("/tmp/box.step")
+obj.Shape.exportIges("/tmp/box.iges")
+obj.Shape.exportBrep("/tmp/box.brep")
+obj.Shape.exportStl("/tmp/box.stl")
+Part.export([obj], "/tmp/objects.step")
+Mesh.export([obj], "/tmp/objects.stl")
+
+shape = Part.read("/tmp/box.step")            # a Part.Shape
+Part.insert("/tmp/box.step", doc.Name)         # adds the objects to the document
+mesh = Mesh.Mesh("/tmp/box.stl")
@@ -0,0 +1,33 @@
+"""
+Extrude and revolve profiles: Face.extrude, Face.revolve, Part::Extrusion and Part::Revolution.
+"""
+import FreeCAD
+import Part
+from FreeCAD import Vector
+
+doc = FreeCAD.ActiveDocument or FreeCAD.newDocument("Model")
+
+profile = Part.Face(Part.makePolygon([Vector(0, 0, 0), Vector(20, 0, 0), Vector(20, 10, 0), Vector(0, 0, 0)]))
+prism = profile.extrude(Vector(0, 0, 15))                                  # a solid from a face
+Part.show(prism, "Prism")
+
+ring_profile = Part.Face(Part.makePolygon([Vector(10, 0, 0), Vector(15, 0, 0), Vector(15, 0, 5),
+                                           Vector(10, 0, 5), Vector(10, 0, 0)]))
+ring = ring_profile.revolve(Vector(0, 0, 0), Vector(0, 0, 1), 360)          # point, axis, degrees
+Part.show(ring, "Ring")
+
+# Parametric versions, based on a sketch or any 2D object
+sketch = doc.addObject("Sketcher::SketchObject", "Profile")
+extrusion = doc.addObject("Part::Extrusion", "Extrusion")
+extrusion.Base = sketch
+extrusion.DirMode = "Custom"
+extrusion.Dir = Vector(0, 0, 1)
+extrusion.LengthFwd = 10
+extrusion.Solid = True
+revolution = doc.addObject("Part::Revolution", "Revolution")
+revolution.Source = sketch
+revolution.Axis = Vector(0, 1, 0)
+revolution.Base = Vector(0, 0, 0)
+revolution.Angle = 360
+revolution.Solid = True
+doc.recompute()
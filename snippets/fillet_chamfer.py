@@ -0,0 +1,22 @@
+"""
+Fillets and chamfers: Shape.makeFillet, Shape.makeChamfer and the Part::Fillet object.
+"""
+import FreeCAD
+import Part
+
+doc = FreeCAD.ActiveDocument or FreeCAD.newDocument("Model")
+box = Part.makeBox(30, 20, 10)
+
+rounded = box.makeFillet(2, box.Edges)                     # radius, edges
+vertical_edges = [e for e in box.Edges if abs(e.tangentAt(e.FirstParameter).z) > 0.99]
+rounded_corners = box.makeFillet(3, vertical_edges)
+beveled = box.makeChamfer(1.5, box.Edges[:4])              # size, edges
+Part.show(rounded_corners, "RoundedBox")
+
+# Parametric fillet on an object: Edges holds (edge number, radius1, radius2), numbers start at 1
+base = doc.addObject("Part::Box", "Base")
+fillet = doc.addObject("Part::Fillet", "Fillet")
+fillet.Base = base
+fillet.Edges = [(i, 1.0, 1.0) for i in range(1, 13)]
+base.Visibility = False
+doc.recompute()
@@ -0,0 +1,20 @@
+"""
+Lofts, sweeps and helices: Part.makeLoft, Wire.makePipeShell and Part.makeHelix.
+"""
+import Part
+from FreeCAD import Vector
+
+bottom = Part.Wire(Part.makeCircle(10, Vector(0, 0, 0)))
+top = Part.Wire(Part.makeCircle(5, Vector(0, 0, 30)))
+loft = Part.makeLoft([bottom, top], True)                 # profiles, solid
+Part.show(loft, "Loft")
+
+path = Part.Wire(Part.makePolygon([Vector(0, 0, 0), Vector(0, 0, 20), Vector(0, 20, 40)]))
+profile = Part.Wire(Part.makeCircle(2, Vector(0, 0, 0), Vector(0, 0, 1)))
+pipe = path.makePipeShell([profile], True, True)          # profiles, solid, Frenet
+Part.show(pipe, "Pipe")
+
+helix = Part.makeHelix(3, 30, 10)                         # pitch, height, radius
+thread_profile = Part.Wire(Part.makeCircle(1, Vector(10, 0, 0), Vector(0, 1, 0)))
+spring = Part.Wire(helix).makePipeShell([thread_profile], True, True)
+Part.show(spring, "Spring")
@@ -0,0 +1,27 @@
+"""
+Boolean operations: cut, fuse (union) and common (intersection) of shapes and of objects.
+"""
+import FreeCAD
+import Part
+from FreeCAD import Vector
+
+doc = FreeCAD.ActiveDocument or FreeCAD.newDocument("Model")
+
+# On shapes: each call returns a new shape
+plate = Part.makeBox(40, 40, 5)
+hole = Part.makeCylinder(4, 5, Vector(20, 20, 0))
+drilled = plate.cut(hole)
+merged = plate.fuse(Part.makeBox(10, 10, 20))
+overlap = plate.common(Part.makeSphere(25, Vector(20, 20, 0)))
+many = plate.fuse([Part.makeBox(5, 5, 10), Part.makeBox(5, 5, 10, Vector(35, 35, 0))]).removeSplitter()
+Part.show(drilled, "DrilledPlate")
+
+# On document objects: parametric booleans
+base = doc.addObject("Part::Box", "Plate")
+tool = doc.addObject("Part::Cylinder", "Hole")
+cut = doc.addObject("Part::Cut", "Cut")
+cut.Base = base
+cut.Tool = tool
+union = doc.addObject("Part::MultiFuse", "Union")      # Part::MultiCommon for intersections
+union.Shapes = [doc.addObject("Part::Box", "A"), doc.addObject("Part::Box", "B")]
+doc.recompute()
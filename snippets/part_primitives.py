@@ -0,0 +1,27 @@
+"""
+Part primitives: parametric objects (Part::Box, Part::Cylinder, ...) and plain shapes (Part.makeBox, ...).
+
+Part::Box has Length/Width/Height, Part::Cylinder and Part::Cone have Radius/Height
+(Cone: Radius1/Radius2), Part::Sphere has Radius, Part::Torus has Radius1/Radius2.
+"""
+import FreeCAD
+import Part
+from FreeCAD import Vector
+
+doc = FreeCAD.ActiveDocument or FreeCAD.newDocument("Model")
+
+cylinder = doc.addObject("Part::Cylinder", "Cylinder")
+cylinder.Radius = 5
+cylinder.Height = 30
+
+# Plain shapes: Part.makeBox(length, width, height, [point, direction])
+box = Part.makeBox(20, 10, 5, Vector(0, 0, 0))
+cyl = Part.makeCylinder(5, 30, Vector(10, 5, 0), Vector(0, 0, 1))
+sphere = Part.makeSphere(8, Vector(0, 0, 20))
+cone = Part.makeCone(6, 2, 10)          # radius1, radius2, height
+torus = Part.makeTorus(20, 3)           # radius1, radius2
+
+Part.show(box, "BoxShape")              # adds a Part::Feature holding the shape
+feature = doc.addObject("Part::Feature", "Sphere")
+feature.Shape = sphere
+doc.recompute()
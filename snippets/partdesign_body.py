@@ -0,0 +1,32 @@
+"""
+PartDesign: a Body with a padded sketch and a pocket (PartDesign::Pad, PartDesign::Pocket).
+
+Features are created with body.newObject so they join the body. Pad and Pocket take
+a closed sketch as Profile; Type can be "Length" or "ThroughAll".
+"""
+import FreeCAD
+import Part
+from FreeCAD import Vector
+
+doc = FreeCAD.ActiveDocument or FreeCAD.newDocument("Model")
+body = doc.addObject("PartDesign::Body", "Body")
+
+base_sketch = body.newObject("Sketcher::SketchObject", "BaseSketch")
+points = [Vector(0, 0, 0), Vector(40, 0, 0), Vector(40, 30, 0), Vector(0, 30, 0)]
+for i in range(4):
+    base_sketch.addGeometry(Part.LineSegment(points[i], points[(i + 1) % 4]), False)
+pad = body.newObject("PartDesign::Pad", "Pad")
+pad.Profile = base_sketch
+pad.Length = 10
+
+hole_sketch = body.newObject("Sketcher::SketchObject", "HoleSketch")
+hole_sketch.Placement = FreeCAD.Placement(Vector(0, 0, 10), FreeCAD.Rotation())   # on the top face
+hole_sketch.addGeometry(Part.Circle(Vector(20, 15, 0), Vector(0, 0, 1), 5), False)
+pocket = body.newObject("PartDesign::Pocket", "Pocket")
+pocket.Profile = hole_sketch
+pocket.Type = "ThroughAll"
+
+base_sketch.Visibility = False
+hole_sketch.Visibility = False
+doc.recompute()
+solid = body.Shape                      # the result of the last feature (body.Tip)
@@ -0,0 +1,19 @@
+"""
+Placement, position and rotation of objects: FreeCAD.Vector, FreeCAD.Rotation, FreeCAD.Placement.
+"""
+import FreeCAD
+from FreeCAD import Vector, Rotation, Placement
+
+doc = FreeCAD.ActiveDocument or FreeCAD.newDocument("Model")
+box = doc.addObject("Part::Box", "Box")
+
+box.Placement.Base = Vector(10, 0, 0)                                    # move
+box.Placement = Placement(Vector(10, 0, 0), Rotation(Vector(0, 0, 1), 45))  # axis, angle in degrees
+box.Placement.Rotation = Rotation(0, 0, 90)                              # yaw, pitch, roll in degrees
+box.Placement = box.Placement.multiply(Placement(Vector(0, 0, 5), Rotation()))
+
+# Shapes have their own placement and can be moved or rotated in place
+shape = box.Shape.copy()
+shape.translate(Vector(0, 0, 10))
+shape.rotate(Vector(0, 0, 0), Vector(0, 0, 1), 30)                       # center, axis, degrees
+doc.recompute()
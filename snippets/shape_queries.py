@@ -0,0 +1,17 @@
+"""
+Inspecting shapes: volume, area, bounding box, center of mass, and selecting faces or edges.
+"""
+import Part
+from FreeCAD import Vector
+
+shape = Part.makeBox(30, 20, 10).fuse(Part.makeCylinder(5, 20, Vector(15, 10, 0)))
+
+print(shape.Volume, shape.Area, shape.isValid(), shape.ShapeType)   # "Solid", "Compound", ...
+box = shape.BoundBox
+print(box.XMin, box.XMax, box.XLength, box.Center)
+print(shape.Solids[0].CenterOfMass if shape.Solids else None)
+
+top_faces = [f for f in shape.Faces if abs(f.normalAt(0, 0).z - 1) < 1e-6]
+circular_edges = [e for e in shape.Edges if isinstance(e.Curve, Part.Circle)]
+highest = max(shape.Vertexes, key=lambda v: v.Point.z)
+refined = shape.removeSplitter()
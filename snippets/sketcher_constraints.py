@@ -0,0 +1,34 @@
+"""
+Sketcher: a fully constrained rectangle and a circle, with Sketcher.Constraint.
+
+Point positions in constraints: 1 = start, 2 = end, 3 = center. Geometry indexes
+follow the order of addGeometry; -1 is the horizontal axis, -2 the vertical axis
+and the root point is (-1, 1).
+"""
+import FreeCAD
+import Part
+import Sketcher
+from FreeCAD import Vector
+
+doc = FreeCAD.ActiveDocument or FreeCAD.newDocument("Model")
+sketch = doc.addObject("Sketcher::SketchObject", "Sketch")
+
+width, height = 40, 20
+corners = [Vector(0, 0, 0), Vector(width, 0, 0), Vector(width, height, 0), Vector(0, height, 0)]
+for i in range(4):
+    sketch.addGeometry(Part.LineSegment(corners[i], corners[(i + 1) % 4]), False)
+for i in range(4):
+    sketch.addConstraint(Sketcher.Constraint("Coincident", i, 2, (i + 1) % 4, 1))
+sketch.addConstraint(Sketcher.Constraint("Horizontal", 0))
+sketch.addConstraint(Sketcher.Constraint("Horizontal", 2))
+sketch.addConstraint(Sketcher.Constraint("Vertical", 1))
+sketch.addConstraint(Sketcher.Constraint("Vertical", 3))
+sketch.addConstraint(Sketcher.Constraint("Coincident", 0, 1, -1, 1))      # corner on the origin
+sketch.addConstraint(Sketcher.Constraint("DistanceX", 0, 1, 0, 2, width))
+sketch.addConstraint(Sketcher.Constraint("DistanceY", 1, 1, 1, 2, height))
+
+circle = sketch.addGeometry(Part.Circle(Vector(20, 10, 0), Vector(0, 0, 1), 4), False)
+sketch.addConstraint(Sketcher.Constraint("Radius", circle, 4))
+sketch.addConstraint(Sketcher.Constraint("DistanceX", -1, 1, circle, 3, 20))
+sketch.addConstraint(Sketcher.Constraint("DistanceY", -1, 1, circle, 3, 10))
+doc.recompute()
@@ -0,0 +1,19 @@
+"""
+2D geometry with Part: lines, polygons, circles and arcs, wires and faces.
+"""
+import Part
+from FreeCAD import Vector
+
+points = [Vector(0, 0, 0), Vector(30, 0, 0), Vector(30, 20, 0), Vector(0, 20, 0)]
+polygon = Part.makePolygon(points + [points[0]])             # repeat the first point to close it
+face = Part.Face(polygon)
+
+line = Part.LineSegment(Vector(0, 0, 0), Vector(10, 0, 0)).toShape()
+circle = Part.makeCircle(5, Vector(15, 10, 0), Vector(0, 0, 1))            # radius, center, normal
+arc = Part.Arc(Vector(0, 0, 0), Vector(5, 5, 0), Vector(10, 0, 0)).toShape()  # three points
+wire = Part.Wire([line, Part.LineSegment(Vector(10, 0, 0), Vector(0, 0, 0)).toShape()])
+
+# A face with a hole: outer wire first, then the inner wires
+disc = Part.Face(Part.Wire(circle))
+plate_with_hole = face.cut(disc)
+Part.show(plate_with_hole, "Profile")
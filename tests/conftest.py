@@ -0,0 +1,6 @@
+# conftest.py
+""" Make the plugin modules, which live at the root of the repository, importable by the tests. """
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
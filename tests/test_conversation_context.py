@@ -0,0 +1,35 @@
+# test_conversation_context.py
+import threading
+
+import ConversationContext
+from ConversationContext import count_tokens
+
+
+def test_count_during_the_warm_up_estimates_instead_of_waiting(monkeypatch):
+    loading = threading.Event()
+    release = threading.Event()
+
+    class Encoding:
+        def encode(self, text):
+            return text.split()
+
+    def load_encoding():
+        loading.set()
+        release.wait(5)
+        return Encoding()
+
+    monkeypatch.setattr(ConversationContext, "_encoding_state", {"loaded": False, "encoding": None})
+    monkeypatch.setattr(ConversationContext, "_load_encoding", load_encoding)
+    ConversationContext._count_encoded.cache_clear()
+    ConversationContext.warm_up()
+    assert loading.wait(5)
+
+    text = "one two three four five six seven eight"
+    assert count_tokens(text) == (len(text) + 3) // 4
+    release.set()
+    for _ in range(500):
+        if ConversationContext._encoding_state["loaded"]:
+            break
+        threading.Event().wait(0.01)
+    assert count_tokens(text) == 8
+    ConversationContext._count_encoded.cache_clear()
@@ -0,0 +1,95 @@
+# test_incremental_runner.py
+from IncrementalRunner import IncrementalRunner
+
+
+class FakeDocument:
+    """ A document recording the objects added in each transaction, newest transaction first. """
+    def __init__(self, app, name):
+        self.app = app
+        self.Name = name
+        self.UndoMode = 1
+        self.UndoNames = []
+        self.Objects = []
+        self._transactions = []
+
+    def addObject(self, type_name, name=None):
+        obj = type("Object", (), {"TypeId": type_name, "Name": name or type_name})()
+        self.Objects.append(obj)
+        self.app.pending.setdefault(self.Name, []).append(obj)
+        return obj
+
+    def undo(self):
+        self.UndoNames.pop(0)
+        for obj in self._transactions.pop(0):
+            self.Objects.remove(obj)
+
+    def recompute(self):
+        pass
+
+
+class FakeApp:
+    """ The part of the FreeCAD module used by IncrementalRunner. """
+    def __init__(self):
+        self.pending = {}
+        self.transaction = None
+        self.ActiveDocument = FakeDocument(self, "Unnamed")
+        self.documents = {"Unnamed": self.ActiveDocument}
+
+    def listDocuments(self):
+        return dict(self.documents)
+
+    def setActiveTransaction(self, name):
+        self.transaction = name
+        self.pending = {}
+
+    def closeActiveTransaction(self, abort=False):
+        for name, objects in self.pending.items():
+            document = self.documents[name]
+            if abort:
+                for obj in objects:
+                    document.Objects.remove(obj)
+            elif document.UndoMode:
+                document.UndoNames.insert(0, self.transaction)
+                document._transactions.insert(0, objects)
+        self.pending = {}
+
+    def closeDocument(self, name):
+        del self.documents[name]
+
+
+def run(runner, app, script):
+    return runner.run(script, {"doc": app.ActiveDocument})
+
+
+def test_revision_changing_the_first_step_replaces_the_last_run():
+    app = FakeApp()
+    runner = IncrementalRunner(app)
+    assert run(runner, app, "box = doc.addObject('Part::Box')\nbox.Length = 10\ncylinder = doc.addObject('Part::Cylinder')").ok
+    assert len(app.ActiveDocument.Objects) == 2
+
+    result = run(runner, app, "box = doc.addObject('Part::Box', 'Wide')\nbox.Length = 10\ncylinder = doc.addObject('Part::Cylinder')")
+
+    assert result.ok and result.first_step == 0
+    assert [obj.Name for obj in app.ActiveDocument.Objects] == ["Wide", "Part::Cylinder"]
+
+
+def test_revision_of_a_later_step_reuses_the_shared_prefix():
+    app = FakeApp()
+    runner = IncrementalRunner(app)
+    run(runner, app, "box = doc.addObject('Part::Box')\ncylinder = doc.addObject('Part::Cylinder')")
+
+    result = run(runner, app, "box = doc.addObject('Part::Box')\ncone = doc.addObject('Part::Cone')")
+
+    assert result.ok and result.first_step == 1
+    assert [obj.Name for obj in app.ActiveDocument.Objects] == ["Part::Box", "Part::Cone"]
+
+
+def test_new_model_runs_next_to_the_last_run():
+    app = FakeApp()
+    runner = IncrementalRunner(app)
+    run(runner, app, "import math\nbox = doc.addObject('Part::Box')")
+
+    result = run(runner, app, "import math\nsphere = doc.addObject('Part::Sphere')")
+
+    assert result.ok and result.first_step == 0
+    assert [obj.Name for obj in app.ActiveDocument.Objects] == ["Part::Box", "Part::Sphere"]
@@ -0,0 +1,53 @@
+# test_parallel_repair.py
+import pytest
+
+QtCore = pytest.importorskip("PySide2.QtCore")
+
+from ParallelRepair import ParallelRepair  # noqa: E402
+from ScriptExecutor import ExecutionResult  # noqa: E402
+
+
+class SyncEngine:
+    """ A request engine running each job at once on the calling thread. """
+    class Request:
+        cancel_event = None
+
+    def submit(self, fn, timeout=None, on_finished=None, on_failed=None):
+        request = self.Request()
+        on_finished(request, fn(request))
+        return request
+
+    def cancel(self, request=None):
+        pass
+
+
+class InfrastructureExecutor:
+    """ A sandbox whose workers never become available. """
+    def __init__(self):
+        self.runs = 0
+
+    def execute(self, script, cancel_event=None):
+        self.runs += 1
+        return ExecutionResult(False, traceback="No sandbox worker became available in time.", infrastructure=True)
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+def test_infrastructure_failure_stops_the_repair(app):
+    fixes = []
+    executor = InfrastructureExecutor()
+    repair = ParallelRepair(SyncEngine(), executor,
+                            lambda script, error, request, candidate: fixes.append(error) or "fixed = True",
+                            candidates=2, max_rounds=3)
+    reasons = []
+    repair.failed.connect(reasons.append)
+    repair.start("broken", "NameError")
+
+    assert len(reasons) == 1 and "No sandbox worker became available" in reasons[0]
+    assert repair.rounds() == 1
+    assert executor.runs == 1
+    # The sandbox error was never sent to the model as the error of a script
+    assert all(error == "NameError" for error in fixes)
@@ -0,0 +1,37 @@
+# test_session_store.py
+import atexit
+import json
+
+from JsonlWriter import JsonlWriter
+from SessionStore import SessionStore
+
+
+def read_records(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file]
+
+
+def test_write_after_close_is_dropped(tmp_path, monkeypatch):
+    registered = []
+    monkeypatch.setattr(atexit, "register", registered.append)
+    monkeypatch.setattr(atexit, "unregister", registered.remove)
+    writer = JsonlWriter(str(tmp_path / "records.jsonl"))
+    writer.write({"n": 1})
+    assert len(registered) == 1
+    writer.close()
+    assert not registered
+
+    writer.write({"n": 2})
+    assert writer.is_closed()
+    assert read_records(writer.path) == [{"n": 1}]
+
+
+def test_artifacts_of_a_closed_session_are_appended_once(tmp_path):
+    store = SessionStore(str(tmp_path), "test")
+    run = store.record_run([{"role": "user", "content": "A box"}], "box = 1", "model", 0.5, 1000)
+    store.close()
+
+    store.record_artifacts(run, {"step": "box.step"})
+    records = read_records(store.path)
+    assert [record["type"] for record in records] == ["session", "message", "script", "run", "artifacts"]
+    assert records[-1]["run"] == run
@@ -0,0 +1,33 @@
+# test_snippet_index.py
+import SnippetIndex as snippet_index
+from SnippetIndex import SnippetIndex
+
+
+def test_api_collected_on_the_gui_thread_is_indexed_by_a_worker_update(tmp_path, monkeypatch):
+    folder = tmp_path / "snippets"
+    folder.mkdir()
+    (folder / "box.py").write_text('"""\nA box on a sketch.\n"""\nimport Part\n')
+    introspected = []
+
+    def api_documents(modules):
+        introspected.append(modules)
+        return [{"id": "Part.makeCylinder", "title": "Part.makeCylinder", "text": "makeCylinder(radius, height)", "kind": "api"}]
+
+    monkeypatch.setattr(snippet_index, "api_fingerprint", lambda modules: "1.0")
+    monkeypatch.setattr(snippet_index, "api_documents", api_documents)
+    monkeypatch.setattr(snippet_index, "supported_types", lambda: None)
+    index = SnippetIndex(str(tmp_path / "index.json"), folders=[str(folder)])
+
+    index.collect_api()  # The cache is not loaded yet
+    index.update(introspect=False)
+    assert not introspected
+    assert len(index) == 1
+
+    index.collect_api()
+    assert len(introspected) == 1
+    index.update(introspect=False)
+    assert len(index) == 2
+    assert index.search("cylinder radius", k=1)[0][0]["id"] == "Part.makeCylinder"
+
+    index.collect_api()  # Indexed for this fingerprint
+    assert len(introspected) == 1